@@ -1,21 +1,123 @@
-import os
+import sys
 import asyncio
+import argparse
 import asyncpg
-from dotenv import load_dotenv
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+from db import DATABASE_URL, is_sqlite
+from cache import ALL_BOTS
+from sqlite_backend import connect as sqlite_connect, sqlite_path
 
-async def add_admin(chat_id: str):
-    conn = await asyncpg.connect(DATABASE_URL)
+async def connect():
+    if is_sqlite():
+        return await sqlite_connect(sqlite_path(DATABASE_URL))
+    return await asyncpg.connect(DATABASE_URL)
+
+async def add_admin(chat_id: str, bot_id: int = ALL_BOTS):
+    conn = await connect()
     await conn.execute("""
-        INSERT INTO admins(chat_id)
-        VALUES($1)
-        ON CONFLICT (chat_id) DO NOTHING
-    """, chat_id)
+        INSERT INTO admins(bot_id, chat_id)
+        VALUES($1, $2)
+        ON CONFLICT (bot_id, chat_id) DO NOTHING
+    """, bot_id, chat_id)
     await conn.close()
     print(f"Администратор {chat_id} добавлен (или уже существует).")
 
+def read_chat_ids(source) -> list:
+    """chat_id по одному в строке; пустые строки и комментарии # пропускаются."""
+    ids = []
+    for line in source:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            ids.append(line)
+    return list(dict.fromkeys(ids))
+
+class _DryRun(Exception):
+    """Откатывает транзакцию apply_admins в режиме --dry-run."""
+
+async def apply_admins(chat_ids: list, mode: str, dry_run: bool = False, bot_id: int = ALL_BOTS) -> dict:
+    """
+    Применяет список администраторов бота bot_id одним соединением и одной транзакцией.
+
+    mode: add — добавить, remove — удалить, sync — привести администраторов
+    этого бота в точное соответствие со списком (строки других ботов не
+    трогаются). Список загружается через COPY во временную таблицу, а
+    изменения вычисляются на стороне базы.
+    Возвращает {"added": [...], "removed": [...], "unchanged": N}.
+    """
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        async with conn.transaction():
+            await conn.execute("CREATE TEMP TABLE admin_import (chat_id TEXT PRIMARY KEY) ON COMMIT DROP")
+            await conn.copy_records_to_table("admin_import", records=[(c,) for c in chat_ids])
+            added, removed = [], []
+            if mode in ("add", "sync"):
+                added = [r["chat_id"] for r in await conn.fetch("""
+                    INSERT INTO admins(bot_id, chat_id)
+                    SELECT $1, chat_id FROM admin_import
+                    ON CONFLICT (bot_id, chat_id) DO NOTHING
+                    RETURNING chat_id
+                """, bot_id)]
+            if mode == "remove":
+                removed = [r["chat_id"] for r in await conn.fetch("""
+                    DELETE FROM admins a USING admin_import i
+                    WHERE a.bot_id = $1 AND a.chat_id = i.chat_id
+                    RETURNING a.chat_id
+                """, bot_id)]
+            elif mode == "sync":
+                removed = [r["chat_id"] for r in await conn.fetch("""
+                    DELETE FROM admins a
+                    WHERE a.bot_id = $1
+                      AND NOT EXISTS (SELECT 1 FROM admin_import i WHERE i.chat_id = a.chat_id)
+                    RETURNING a.chat_id
+                """, bot_id)]
+            if dry_run:
+                raise _DryRun
+    except _DryRun:
+        pass
+    finally:
+        await conn.close()
+    unchanged = len(chat_ids) - len(added) if mode != "remove" else len(chat_ids) - len(removed)
+    return {"added": sorted(added), "removed": sorted(removed), "unchanged": unchanged}
+
+def print_diff(diff: dict, dry_run: bool):
+    prefix = "[dry-run] " if dry_run else ""
+    for chat_id in diff["added"]:
+        print(f"{prefix}+ {chat_id}")
+    for chat_id in diff["removed"]:
+        print(f"{prefix}- {chat_id}")
+    print(f"{prefix}Добавлено: {len(diff['added'])}, удалено: {len(diff['removed'])}, "
+          f"без изменений: {diff['unchanged']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Управление таблицей admins")
+    parser.add_argument("file", nargs="?",
+                        help="файл с chat_id по одному в строке, «-» — стандартный ввод; "
+                             "без аргумента chat_id запрашивается интерактивно")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--remove", action="store_true", help="удалить перечисленных администраторов")
+    group.add_argument("--sync", action="store_true", help="оставить в admins ровно перечисленных")
+    parser.add_argument("--dry-run", action="store_true", help="показать изменения и откатить транзакцию")
+    parser.add_argument("--bot-id", type=int, default=ALL_BOTS,
+                        help="id бота из BOT_TOKENS (число до «:» в токене); по умолчанию — все боты")
+    args = parser.parse_args()
+
+    if args.file is None:
+        chat_id = input("Введите ваш chat_id: ").strip()
+        asyncio.run(add_admin(chat_id, args.bot_id))
+        return
+
+    if args.file == "-":
+        chat_ids = read_chat_ids(sys.stdin)
+    else:
+        with open(args.file, encoding="utf-8") as f:
+            chat_ids = read_chat_ids(f)
+    if is_sqlite():
+        parser.error("пакетный режим (COPY во временную таблицу) работает только с PostgreSQL")
+    if args.sync and not chat_ids:
+        parser.error("--sync с пустым списком удалил бы всех администраторов")
+    mode = "remove" if args.remove else "sync" if args.sync else "add"
+    diff = asyncio.run(apply_admins(chat_ids, mode, args.dry_run, args.bot_id))
+    print_diff(diff, args.dry_run)
+
 if __name__ == "__main__":
-    chat_id = input("Введите ваш chat_id: ").strip()
-    asyncio.run(add_admin(chat_id))
+    main()
@@ -0,0 +1,162 @@
+import re
+import json
+import asyncio
+import logging
+from bisect import bisect_left
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from cache import NotifiedCache
+from conversion import parse_amount
+
+logger = logging.getLogger(__name__)
+
+ALERTS_CHANNEL = "rate_alerts_changed"
+# «USD > 100» — курс поднялся выше порога, «USD < 90» — опустился ниже
+ALERT_RE = re.compile(r"^([A-Z0-9]+)\s*([<>])\s*(\d+(?:[.,]\d+)?)$")
+ABOVE, BELOW = "above", "below"
+
+# Ключ (порог, id) больше любого ключа с тем же порогом: граница bisect справа
+_AFTER = float("inf")
+
+
+class Alert(NamedTuple):
+    id: int
+    bot_id: int
+    chat_id: str
+    currency_name: str
+    direction: str
+    threshold: Decimal
+
+
+def parse_alert(text: str) -> Optional[tuple]:
+    """Разбирает «USD > 100» в (валюта, направление, порог) или возвращает None."""
+    match = ALERT_RE.match(text.strip().upper())
+    if match is None:
+        return None
+    name, sign, value = match.groups()
+    try:
+        threshold = parse_amount(value)
+    except ArithmeticError:
+        return None
+    return name, ABOVE if sign == ">" else BELOW, threshold
+
+
+class AlertIndex(NotifiedCache):
+    """
+    Уведомления о курсах в памяти процесса.
+
+    Для каждой пары (валюта, направление) хранится отсортированный список
+    ключей (порог, id), поэтому изменение курса с old на new находит только
+    пересечённые пороги двумя bisect, не перебирая все уведомления:
+    «выше» срабатывает для порогов из [old, new), «ниже» — из (new, old].
+    Загружается целиком при старте и поддерживается уведомлениями триггера
+    rate_alerts_notify, как кэши курсов и администраторов.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._keys: Dict[tuple, list] = {}
+        self._alerts: Dict[int, Alert] = {}
+        # (bot_id, chat_id) → id уведомлений: в каждом боте у чата свой список
+        self._by_chat: Dict[tuple, set] = {}
+        self.fired = 0
+
+    async def _fetch(self, repo):
+        return await repo.list_alerts()
+
+    def _replace(self, rows):
+        self._keys, self._alerts, self._by_chat = {}, {}, {}
+        for row in rows:
+            self.add(Alert(**dict(row)))
+
+    def add(self, alert: Alert):
+        if alert.id in self._alerts:
+            return
+        keys = self._keys.setdefault((alert.currency_name, alert.direction), [])
+        key = (alert.threshold, alert.id)
+        keys.insert(bisect_left(keys, key), key)
+        self._alerts[alert.id] = alert
+        self._by_chat.setdefault((alert.bot_id, alert.chat_id), set()).add(alert.id)
+
+    def remove(self, alert_id: int):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        group = (alert.currency_name, alert.direction)
+        keys = self._keys[group]
+        del keys[bisect_left(keys, (alert.threshold, alert.id))]
+        if not keys:
+            del self._keys[group]
+        chat = self._by_chat[alert.bot_id, alert.chat_id]
+        chat.discard(alert_id)
+        if not chat:
+            del self._by_chat[alert.bot_id, alert.chat_id]
+
+    def crossed(self, name: str, old: Decimal, new: Decimal) -> List[Alert]:
+        """Уведомления валюты name, пороги которых пересечены при переходе курса old → new."""
+        if new > old:
+            keys = self._keys.get((name, ABOVE), ())
+            found = keys[bisect_left(keys, (old,)):bisect_left(keys, (new,))]
+        elif new < old:
+            keys = self._keys.get((name, BELOW), ())
+            found = keys[bisect_left(keys, (new, _AFTER)):bisect_left(keys, (old, _AFTER))]
+        else:
+            return []
+        return [self._alerts[alert_id] for _, alert_id in found]
+
+    def for_chat(self, bot_id: int, chat_id: str) -> List[Alert]:
+        return sorted((self._alerts[i] for i in self._by_chat.get((bot_id, chat_id), ())),
+                      key=lambda a: (a.currency_name, a.threshold))
+
+    def _apply(self, payload: str):
+        """Применяет уведомление триггера: {"op", "id", ...поля строки для INSERT}."""
+        event = json.loads(payload, parse_float=Decimal)
+        if event["op"] == "DELETE":
+            self.remove(event["id"])
+        else:
+            self.add(Alert(event["id"], event["bot_id"], event["chat_id"], event["currency_name"],
+                           event["direction"], Decimal(event["threshold"])))
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._alerts),
+            "chats": len(self._by_chat),
+            "fired": self.fired,
+            "reloads": self.reloads,
+        }
+
+
+def format_alert(alert: Alert, rate: Decimal) -> str:
+    word = "выше" if alert.direction == ABOVE else "ниже"
+    return f"Курс {alert.currency_name} {word} {alert.threshold}: сейчас {rate}"
+
+
+async def deliver_alerts(bot: Bot, alerts: List[Alert], rate: Decimal,
+                         concurrency: int = 20, batch_size: int = 1000) -> tuple:
+    """
+    Рассылает сработавшие уведомления не более чем concurrency запросами
+    к Bot API одновременно. Задачи создаются порциями по batch_size, чтобы
+    сотни тысяч получателей не превращались в сотни тысяч задач сразу.
+    Возвращает (доставлено, не доставлено).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    sent = failed = 0
+
+    async def send(alert: Alert):
+        nonlocal sent, failed
+        async with semaphore:
+            try:
+                await bot.send_message(alert.chat_id, format_alert(alert, rate))
+                sent += 1
+            except TelegramAPIError as e:
+                # Пользователь мог заблокировать бота — уведомление всё равно одноразовое
+                logger.warning(f"Уведомление {alert.id} для {alert.chat_id} не доставлено: {e}")
+                failed += 1
+
+    for start in range(0, len(alerts), batch_size):
+        await asyncio.gather(*(send(a) for a in alerts[start:start + batch_size]))
+    return sent, failed
@@ -0,0 +1,116 @@
+"""
+Сравнение бэкендов SQLite и PostgreSQL на смеси запросов бота.
+
+Для каждого бэкенда замеряется холодный старт (init_db, пул, загрузка
+кэшей), затем --workers конкурентных задач выполняют --requests запросов
+через CurrencyRepository в пропорциях MIX. Печатаются пропускная
+способность и отчёт репозитория по каждому запросу.
+
+    python bench_backends.py --pg postgresql://postgres@localhost/postgres
+    python bench_backends.py --requests 20000 --workers 50
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from decimal import Decimal
+
+from db import init_db, is_sqlite
+from repository import connect
+
+PREFIX = "BENCH"
+# Доля операций в смеси: страницы /get_currencies и проверки преобладают,
+# курсы для /convert обслуживает кэш, поэтому чтение курса здесь редкое
+MIX = {
+    "page": 50,
+    "currency_exists": 15,
+    "update_rate": 15,
+    "get_rate": 10,
+    "add_delete": 10,
+}
+
+
+async def seed(repo, rows: int):
+    async with repo.pool.acquire() as conn:
+        await conn.executemany(
+            "INSERT INTO currencies(currency_name, rate) VALUES($1, $2) ON CONFLICT (currency_name) DO NOTHING",
+            [(f"{PREFIX}{i:05d}", Decimal(random.randint(100, 20000)) / 100) for i in range(rows)],
+        )
+
+
+async def cleanup(repo):
+    async with repo.pool.acquire() as conn:
+        await conn.execute("DELETE FROM currencies WHERE currency_name LIKE $1", PREFIX + "%")
+
+
+def render(row) -> str:
+    return f"{row['currency_name']}: {row['rate']}"
+
+
+async def operation(repo, kind: str, rows: int, worker: int, step: int):
+    name = f"{PREFIX}{random.randrange(rows):05d}"
+    if kind == "page":
+        anchor = f"{PREFIX}{random.randrange(rows):05d}"
+        await repo.page_currencies(PREFIX, anchor, random.random() < 0.8, 50, 3500, render)
+    elif kind == "currency_exists":
+        await repo.currency_exists(name)
+    elif kind == "update_rate":
+        await repo.update_rate(name, Decimal(random.randint(100, 20000)) / 100)
+    elif kind == "get_rate":
+        await repo.get_rate(name)
+    else:
+        temp = f"{PREFIX}T{worker:03d}{step:06d}"
+        await repo.add_currency(temp, Decimal("1.5"))
+        await repo.delete_currency(temp)
+
+
+async def run(dsn: str, rows: int, requests: int, workers: int):
+    started = time.perf_counter()
+    await init_db(dsn)
+    repo = await connect(dsn)
+    await repo.list_currencies()
+    await repo.list_admins()
+    cold_start = time.perf_counter() - started
+    try:
+        await seed(repo, rows)
+        kinds = random.choices(list(MIX), weights=list(MIX.values()), k=requests)
+        queue = iter(enumerate(kinds))
+
+        async def worker(n: int):
+            for step, kind in queue:
+                await operation(repo, kind, rows, n, step)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(workers)))
+        elapsed = time.perf_counter() - started
+        print(f"холодный старт: {cold_start * 1000:.1f} мс")
+        print(f"{requests} операций за {elapsed:.2f} с — {requests / elapsed:.0f} в секунду")
+        print(repo.report())
+    finally:
+        await cleanup(repo)
+        await repo.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pg", help="DSN PostgreSQL; без него сравнивается только SQLite")
+    parser.add_argument("--rows", type=int, default=2000, help="валют в таблице")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [("SQLite", f"sqlite:///{os.path.join(tmp, 'bench.db')}")]
+        if args.pg:
+            if is_sqlite(args.pg):
+                parser.error("--pg ожидает DSN PostgreSQL")
+            backends.append(("PostgreSQL", args.pg))
+        for title, dsn in backends:
+            print(f"\n== {title} ==")
+            await run(dsn, args.rows, args.requests, args.workers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
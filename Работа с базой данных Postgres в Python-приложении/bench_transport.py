@@ -0,0 +1,113 @@
+"""
+Сравнение задержки «обновление → ответ» в режимах polling и webhook.
+
+Бот работает против локальной заглушки Bot API (fake_telegram), поэтому
+сеть и токен не нужны. Обработчик имитирует работу с базой задержкой
+--handler-delay. Пример:
+
+    python bench_transport.py --chats 200 --messages 20 --handler-delay 0.02
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from fake_telegram import FakeTelegram
+from webhook import WebhookHandler, dispatcher_feed
+
+TOKEN = "42:bench"
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def build_dispatcher(delay: float) -> Dispatcher:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message: types.Message):
+        await asyncio.sleep(delay)
+        await message.reply("pong")
+
+    return dp
+
+
+async def drive(fake: FakeTelegram, chats: int, messages: int) -> tuple:
+    latencies = []
+
+    async def user(chat_id: int):
+        for _ in range(messages):
+            sent_at = await fake.send(chat_id, "ping")
+            reply = await fake.reply(chat_id)
+            latencies.append(reply["received_at"] - sent_at)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(1000 + i) for i in range(chats)))
+    return latencies, time.perf_counter() - started
+
+
+async def run_mode(mode: str, args) -> dict:
+    fake = FakeTelegram(port=args.api_port)
+    await fake.start()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(fake.url)))
+    dp = build_dispatcher(args.handler_delay)
+    runner = None
+    polling = None
+    try:
+        if mode == "webhook":
+            app = web.Application()
+            handler = WebhookHandler(dispatcher_feed(dp, bot), concurrency=args.concurrency)
+            handler.register(app, "/webhook")
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", args.webhook_port).start()
+            await bot.set_webhook(f"http://127.0.0.1:{args.webhook_port}/webhook")
+        else:
+            polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+            await asyncio.sleep(0.5)
+        latencies, elapsed = await drive(fake, args.chats, args.messages)
+    finally:
+        if polling is not None:
+            await dp.stop_polling()
+            await polling
+        if runner is not None:
+            await runner.cleanup()
+        await bot.session.close()
+        await fake.close()
+    return {
+        "mode": mode,
+        "updates": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "mean": statistics.mean(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--handler-delay", type=float, default=0.01)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8082)
+    args = parser.parse_args()
+
+    print(f"{'режим':<9}{'обновл.':>9}{'в сек':>9}{'mean,мс':>9}{'p50,мс':>9}{'p95,мс':>9}{'p99,мс':>9}")
+    for mode in ("polling", "webhook"):
+        r = await run_mode(mode, args)
+        print(f"{r['mode']:<9}{r['updates']:>9}{r['throughput']:>9.0f}"
+              f"{r['mean'] * 1000:>9.1f}{r['p50'] * 1000:>9.1f}{r['p95'] * 1000:>9.1f}{r['p99'] * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,18 +1,72 @@
 import os
 import asyncio
+import logging
+from decimal import Decimal, InvalidOperation
 from dotenv import load_dotenv
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command, StateFilter
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
+from aiogram.webhook.aiohttp_server import setup_application
 
-import asyncpg
-from db import init_db, get_pool
+from db import DATABASE_URL, init_db, is_sqlite, require_database_url
+from sqlite_backend import SqliteListener, sqlite_path
+from repository import CurrencyRepository, connect
+from cache import PgListener, RateCache, AdminCache, RATES_CHANNEL, ADMINS_CHANNEL
+from fsm_storage import PgStorage
+from memory_storage import BoundedMemoryStorage
+from webhook import WebhookHandler, dispatcher_feed
+from currency_import import parse_rates, upsert_rates
+from conversion import parse_amount, parse_rate, parse_request, convert_many
+from throttling import ThrottlingMiddleware, parse_limits
+from scheduler import ChatScheduler
+from alerts import AlertIndex, Alert, ALERTS_CHANNEL, ABOVE, parse_alert, deliver_alerts
 
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Несколько ботов в одном процессе: токены через запятую (вместо BOT_TOKEN).
+# Боты делят пул соединений, кэш курсов и хранилище FSM, администраторы у каждого свои
+BOT_TOKENS = [t.strip() for t in os.getenv("BOT_TOKENS", "").split(",") if t.strip()] or [BOT_TOKEN]
+# memory — состояния в процессе, postgres — общие для нескольких экземпляров бота
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+# Брошенные разговоры в памяти: сколько секунд простоя хранить и сколько всего записей
+FSM_TTL = float(os.getenv("FSM_TTL", "900"))
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", "100000"))
+# polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "100"))
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+# Ограничение размера файла для массового импорта курсов
+MAX_IMPORT_SIZE = int(os.getenv("MAX_IMPORT_SIZE", str(5 * 1024 * 1024)))
+# Период записи статистики запросов в лог, секунды (0 — только при остановке)
+DB_STATS_INTERVAL = float(os.getenv("DB_STATS_INTERVAL", "0"))
+# Размер страницы /get_currencies: строк и символов (лимит сообщения — 4096)
+PAGE_ROWS = int(os.getenv("PAGE_ROWS", "50"))
+PAGE_CHARS = int(os.getenv("PAGE_CHARS", "3500"))
+# Сколько секунд Telegram может отдавать закэшированный ответ на inline-запрос
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "60"))
+# Лимиты запросов «вид=скорость/ёмкость»: на чат и общие на весь бот
+THROTTLE_PER_CHAT = parse_limits(os.getenv(
+    "THROTTLE_PER_CHAT", "convert=1/5,get_currencies=0.5/3,callback=2/5,inline=2/10,message=3/10"))
+THROTTLE_GLOBAL = parse_limits(os.getenv("THROTTLE_GLOBAL", "convert=500/1000,get_currencies=100/200"))
+# Сколько обновлений обрабатывается одновременно (обновления одного чата — строго по очереди)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "50"))
+# Уведомления о курсах: лимит на чат и параллельность рассылки
+ALERTS_PER_CHAT = int(os.getenv("ALERTS_PER_CHAT", "20"))
+ALERTS_CONCURRENCY = int(os.getenv("ALERTS_CONCURRENCY", "20"))
+# Адрес собственного сервера Bot API (например, fake_telegram для бенчмарков)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+logger = logging.getLogger(__name__)
 
 class CurrencyStates(StatesGroup):
     action = State()
@@ -21,53 +75,129 @@ class CurrencyStates(StatesGroup):
     del_name = State()
     upd_name = State()
     upd_rate = State()
+    bulk = State()
 
 class ConvertStates(StatesGroup):
     name = State()
     amount = State()
 
-storage = MemoryStorage()
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=storage)
+class CurrencyPage(CallbackData, prefix="cur"):
+    forward: bool
+    anchor: str
+    prefix: str
+
+require_database_url()
+if FSM_STORAGE == "postgres" and is_sqlite():
+    raise ValueError("FSM_STORAGE=postgres требует DATABASE_URL на PostgreSQL")
+if FSM_STORAGE == "postgres":
+    storage = PgStorage()
+else:
+    storage = BoundedMemoryStorage(ttl=FSM_TTL, max_entries=FSM_MAX_ENTRIES)
+def make_bot(token: str) -> Bot:
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+        return Bot(token=token, session=session)
+    return Bot(token=token)
+
+bots = [make_bot(token) for token in BOT_TOKENS]
+# Первый бот — основной: через него идут вебхук-режим с одним ботом и sharding.py
+bot = bots[0]
+bots_by_id = {b.id: b for b in bots}
+if len(bots_by_id) != len(bots):
+    raise ValueError("В BOT_TOKENS повторяется бот")
+# Очередь чата берётся до чтения состояния FSM из хранилища
+scheduler = ChatScheduler(concurrency=UPDATE_CONCURRENCY)
+dp = Dispatcher(storage=storage, events_isolation=scheduler)
+throttling = ThrottlingMiddleware(THROTTLE_PER_CHAT, THROTTLE_GLOBAL)
+dp.update.outer_middleware(throttling)
 
 manage_kb = types.ReplyKeyboardMarkup(
     keyboard=[[
         types.KeyboardButton(text="Добавить валюту"),
         types.KeyboardButton(text="Удалить валюту"),
         types.KeyboardButton(text="Изменить курс валюты"),
+    ], [
+        types.KeyboardButton(text="Импорт списком"),
     ]],
     resize_keyboard=True,
     one_time_keyboard=True
 )
 
-pool: asyncpg.Pool
+repo: CurrencyRepository
+rates = RateCache()
+admins = AdminCache()
+# У SQLite нет LISTEN/NOTIFY: кэши перечитываются по PRAGMA data_version
+listener = SqliteListener(sqlite_path(DATABASE_URL)) if is_sqlite() else PgListener()
+alerts = AlertIndex()
+# Ссылки на фоновые рассылки, чтобы задачи не собрал сборщик мусора
+deliveries = set()
+# Периодическая запись статистики запросов (DB_STATS_INTERVAL)
+stats_task = None
 
-async def is_admin(chat_id: str) -> bool:
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT 1 FROM admins WHERE chat_id = $1", chat_id)
-    return row is not None
+def is_admin(chat_id: str, bot_id: int) -> bool:
+    return admins.check(chat_id, bot_id)
 
 @dp.startup()
 async def on_startup():
-    global pool
-    pool = await get_pool()
+    global repo, stats_task
+    # Таблицы должны существовать до того, как пул подготовит запросы
     await init_db()
+    repo = await connect()
+    # Сначала подписка, затем загрузка: уведомления, пришедшие во время загрузки,
+    # кэши применяют повторно к загруженному (NotifiedCache)
+    listener.subscribe(RATES_CHANNEL, rates.apply, reload=lambda: rates.load(repo))
+    listener.subscribe(ADMINS_CHANNEL, admins.apply, reload=lambda: admins.load(repo))
+    listener.subscribe(ALERTS_CHANNEL, alerts.apply, reload=lambda: alerts.load(repo))
+    if isinstance(storage, PgStorage):
+        await storage.connect(repo.pool, listener)
+    await listener.start()
+    await rates.load(repo)
+    await admins.load(repo)
+    await alerts.load(repo)
+    if DB_STATS_INTERVAL > 0:
+        stats_task = asyncio.create_task(log_db_stats())
+
+async def log_db_stats():
+    while True:
+        await asyncio.sleep(DB_STATS_INTERVAL)
+        logger.info(f"Статистика запросов:\n{repo.report()}")
+
+@dp.shutdown()
+async def on_shutdown():
+    logger.info(f"Кэш курсов: {rates.stats()}")
+    logger.info(f"Кэш администраторов: {admins.stats()}")
+    logger.info(f"Троттлинг: {throttling.stats()}")
+    logger.info(f"Уведомления о курсах: {alerts.stats()}")
+    logger.info(f"Очереди обновлений: {scheduler.stats()}")
+    if stats_task is not None:
+        stats_task.cancel()
+        await asyncio.gather(stats_task, return_exceptions=True)
+    if deliveries:
+        await asyncio.gather(*deliveries, return_exceptions=True)
+    logger.info(f"Хранилище FSM: {storage.stats()}")
+    logger.info(f"Статистика запросов:\n{repo.report()}")
+    await listener.close()
+    await repo.close()
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
     uid = str(message.from_user.id)
-    if await is_admin(uid):
-        commands = ["/start", "/manage_currency", "/get_currencies", "/convert"]
+    if is_admin(uid, message.bot.id):
+        commands = ["/start", "/manage_currency", "/get_currencies", "/convert", "/alert", "/db_stats"]
     else:
-        commands = ["/start", "/get_currencies", "/convert"]
+        commands = ["/start", "/get_currencies", "/convert", "/alert"]
     await message.reply("Доступные команды:\n" + "\n".join(commands))
 
 @dp.message(Command("manage_currency"))
-async def cmd_manage(message: types.Message, state: FSMContext):
+async def cmd_manage(message: types.Message, state: FSMContext, command: CommandObject):
     uid = str(message.from_user.id)
-    if not await is_admin(uid):
+    if not is_admin(uid, message.bot.id):
         await message.reply("Нет доступа к команде")
         return
+    if command.args:
+        # /manage_currency с многострочным списком «USD 92.1» — сразу импорт
+        await import_rates(message, command.args)
+        return
     await message.reply("Выберите действие:", reply_markup=manage_kb)
     await state.set_state(CurrencyStates.action)
 
@@ -83,6 +213,9 @@ async def process_action(message: types.Message, state: FSMContext):
     elif text == "Изменить курс валюты":
         await message.reply("Введите название валюты")
         await state.set_state(CurrencyStates.upd_name)
+    elif text == "Импорт списком":
+        await message.reply("Отправьте файл CSV или JSON либо сообщение со строками вида «USD 92.1»")
+        await state.set_state(CurrencyStates.bulk)
     else:
         await message.reply("Операция отменена")
         await state.clear()
@@ -90,9 +223,7 @@ async def process_action(message: types.Message, state: FSMContext):
 @dp.message(StateFilter(CurrencyStates.add_name))
 async def add_name(message: types.Message, state: FSMContext):
     name = message.text.strip().upper()
-    async with pool.acquire() as conn:
-        exists = await conn.fetchval("SELECT 1 FROM currencies WHERE currency_name = $1", name)
-    if exists:
+    if await repo.currency_exists(name):
         await message.reply("Данная валюта уже существует")
         await state.clear()
         return
@@ -105,23 +236,20 @@ async def add_rate(message: types.Message, state: FSMContext):
     data = await state.get_data()
     name = data["currency_name"]
     try:
-        rate = float(message.text.replace(",", "."))
-    except ValueError:
-        await message.reply("Неверный формат. Введите число.")
+        rate = parse_rate(message.text)
+    except InvalidOperation:
+        await message.reply("Неверный формат. Введите положительное число.")
         return
-    async with pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO currencies(currency_name, rate) VALUES($1, $2)",
-            name, rate
-        )
+    await repo.add_currency(name, rate)
+    rates.put(name, rate)
     await message.reply(f"Валюта {name} успешно добавлена")
     await state.clear()
 
 @dp.message(StateFilter(CurrencyStates.del_name))
 async def del_name(message: types.Message, state: FSMContext):
     name = message.text.strip().upper()
-    async with pool.acquire() as conn:
-        await conn.execute("DELETE FROM currencies WHERE currency_name = $1", name)
+    await repo.delete_currency(name)
+    rates.discard(name)
     await message.reply(f"Валюта {name} удалена (если была).")
     await state.clear()
 
@@ -137,38 +265,219 @@ async def upd_rate(message: types.Message, state: FSMContext):
     data = await state.get_data()
     name = data["currency_name"]
     try:
-        rate = float(message.text.replace(",", "."))
-    except ValueError:
-        await message.reply("Неверный формат. Введите число.")
+        rate = parse_rate(message.text)
+    except InvalidOperation:
+        await message.reply("Неверный формат. Введите положительное число.")
         return
-    async with pool.acquire() as conn:
-        await conn.execute(
-            "UPDATE currencies SET rate = $1 WHERE currency_name = $2",
-            rate, name
-        )
+    old = await repo.update_rate(name, rate)
+    if old is not None:
+        rates.put(name, rate)
+        fire_alerts(name, old, rate)
     await message.reply(f"Курс валюты {name} обновлён.")
     await state.clear()
 
-@dp.message(Command("get_currencies"))
-async def cmd_get_currencies(message: types.Message):
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT currency_name, rate FROM currencies")
+def fire_alerts(name: str, old: Decimal, new: Decimal):
+    """
+    Находит по индексу уведомления, пороги которых пересечены изменением
+    курса, и запускает их удаление и рассылку в фоне, не задерживая ответ
+    администратору.
+    """
+    candidates = alerts.crossed(name, old, new)
+    if not candidates:
+        return
+    task = asyncio.create_task(send_alerts(candidates, new))
+    deliveries.add(task)
+    task.add_done_callback(deliveries.discard)
+
+async def send_alerts(candidates: list, rate: Decimal):
+    # Рассылаются только строки, удалённые этим запросом: если курс одновременно
+    # меняют два процесса, каждое уведомление уйдёт один раз
+    try:
+        fired = [Alert(**dict(r)) for r in await repo.delete_alerts([a.id for a in candidates])]
+    except Exception as e:
+        logger.error(f"Не удалось удалить сработавшие уведомления: {e}")
+        return
+    for alert in fired:
+        alerts.remove(alert.id)
+    alerts.fired += len(fired)
+    by_bot = {}
+    for alert in fired:
+        # Уведомления, созданные до BOT_TOKENS (bot_id = 0), доставляет основной бот
+        by_bot.setdefault(bots_by_id.get(alert.bot_id, bot), []).append(alert)
+    results = await asyncio.gather(*(
+        deliver_alerts(b, items, rate, concurrency=ALERTS_CONCURRENCY) for b, items in by_bot.items()
+    ))
+    sent, failed = sum(r[0] for r in results), sum(r[1] for r in results)
+    logger.info(f"Уведомления о курсе: доставлено {sent}, не доставлено {failed}")
+
+async def import_rates(message: types.Message, text: str):
+    records, rejected = parse_rates(text)
+    inserted = updated = 0
+    if records:
+        inserted, updated = await upsert_rates(repo.pool, records)
+        for name, rate in records:
+            rates.put(name, rate)
+    lines = [
+        f"Добавлено: {inserted}",
+        f"Обновлено: {updated}",
+        f"Без изменений: {len(records) - inserted - updated}",
+        f"Отклонено: {len(rejected)}",
+    ]
+    if rejected:
+        lines.append("Отклонённые строки:\n" + "\n".join(rejected[:10]))
+    await message.reply("\n".join(lines))
+
+@dp.message(StateFilter(CurrencyStates.bulk))
+async def bulk_import(message: types.Message, state: FSMContext):
+    if message.document:
+        if message.document.file_size and message.document.file_size > MAX_IMPORT_SIZE:
+            await message.reply("Файл слишком большой")
+            await state.clear()
+            return
+        content = await message.bot.download(message.document)
+        text = content.read().decode("utf-8-sig", errors="replace")
+    else:
+        text = message.text or ""
+    await import_rates(message, text)
+    await state.clear()
+
+@dp.message(Command("db_stats"))
+async def cmd_db_stats(message: types.Message):
+    if not is_admin(str(message.from_user.id), message.bot.id):
+        await message.reply("Нет доступа к команде")
+        return
+    await message.reply(
+        f"{repo.report()}\n"
+        f"кэш курсов: {rates.stats()}\n"
+        f"кэш администраторов: {admins.stats()}\n"
+        f"троттлинг: {throttling.stats()}\n"
+        f"уведомления о курсах: {alerts.stats()}\n"
+        f"хранилище FSM: {storage.stats()}\n"
+        f"очереди обновлений: {scheduler.stats()}\n"
+        f"очередь этого чата: {scheduler.chat_stats(message.chat.id)}"
+    )
+
+def format_alerts(items: list) -> str:
+    lines = []
+    for alert in items:
+        sign = ">" if alert.direction == ABOVE else "<"
+        lines.append(f"{alert.currency_name} {sign} {alert.threshold}")
+    return "\n".join(lines)
+
+@dp.message(Command("alert"))
+async def cmd_alert(message: types.Message, command: CommandObject):
+    bot_id, chat_id = message.bot.id, str(message.chat.id)
+    args = (command.args or "").strip()
+    if not args:
+        own = alerts.for_chat(bot_id, chat_id)
+        usage = "Формат: /alert USD > 100 или /alert USD < 90, /alert clear — удалить все"
+        await message.reply(f"Ваши уведомления:\n{format_alerts(own)}\n\n{usage}" if own else usage)
+        return
+    if args.lower() == "clear":
+        await repo.delete_chat_alerts(bot_id, chat_id)
+        for alert in alerts.for_chat(bot_id, chat_id):
+            alerts.remove(alert.id)
+        await message.reply("Уведомления удалены.")
+        return
+    request = parse_alert(args)
+    if request is None:
+        await message.reply("Формат: /alert USD > 100 или /alert USD < 90")
+        return
+    name, direction, threshold = request
+    rate = rates.get(name)
+    if rate is None:
+        await message.reply("Валюта не найдена.")
+        return
+    if (rate > threshold) if direction == ABOVE else (rate < threshold):
+        await message.reply(f"Курс {name} уже {'выше' if direction == ABOVE else 'ниже'} {threshold}: {rate}")
+        return
+    if len(alerts.for_chat(bot_id, chat_id)) >= ALERTS_PER_CHAT:
+        await message.reply(f"Не больше {ALERTS_PER_CHAT} уведомлений на чат.")
+        return
+    alert_id = await repo.add_alert(bot_id, chat_id, name, direction, threshold)
+    alerts.add(Alert(alert_id, bot_id, chat_id, name, direction, threshold))
+    await message.reply(f"Сообщу, когда курс {name} станет {'выше' if direction == ABOVE else 'ниже'} {threshold}.")
+
+def render_currency(row) -> str:
+    return f"{row['currency_name']}: {row['rate']}"
+
+def page_button(text: str, forward: bool, anchor: str, prefix: str):
+    try:
+        data = CurrencyPage(forward=forward, anchor=anchor, prefix=prefix).pack()
+    except ValueError:
+        # Не влезает в 64 байта callback_data или содержит разделитель
+        return None
+    return types.InlineKeyboardButton(text=text, callback_data=data)
+
+async def render_page(prefix: str, anchor: str, forward: bool):
+    rows, has_more = await repo.page_currencies(prefix, anchor, forward, PAGE_ROWS, PAGE_CHARS, render_currency)
     if not rows:
-        await message.reply("Нет сохранённых валют.")
+        return None, None
+    # Вперёд: предыдущая страница есть, если якорь не пустой; назад — наоборот
+    has_prev = has_more if not forward else anchor != ""
+    has_next = has_more if forward else True
+    buttons = []
+    if has_prev:
+        buttons.append(page_button("« Назад", False, rows[0]["currency_name"], prefix))
+    if has_next:
+        buttons.append(page_button("Далее »", True, rows[-1]["currency_name"], prefix))
+    buttons = [b for b in buttons if b is not None]
+    markup = types.InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return "\n".join(render_currency(r) for r in rows), markup
+
+@dp.message(Command("get_currencies"))
+async def cmd_get_currencies(message: types.Message, command: CommandObject):
+    prefix = (command.args or "").strip().upper()
+    text, markup = await render_page(prefix, "", True)
+    if text is None:
+        await message.reply(f"Нет валют, начинающихся на {prefix}." if prefix else "Нет сохранённых валют.")
         return
-    text = "\n".join(f"{r['currency_name']}: {r['rate']}" for r in rows)
-    await message.reply(text)
+    await message.reply(text, reply_markup=markup)
+
+@dp.callback_query(CurrencyPage.filter())
+async def currency_page(query: types.CallbackQuery, callback_data: CurrencyPage):
+    text, markup = await render_page(callback_data.prefix, callback_data.anchor, callback_data.forward)
+    if text is None:
+        await query.answer("Страница пуста")
+        return
+    await query.message.edit_text(text, reply_markup=markup)
+    await query.answer()
+
+def format_conversion(amount: Decimal, source: str, results: list) -> str:
+    lines = []
+    for target, value in results:
+        if value is None:
+            lines.append(f"{target}: валюта не найдена")
+        else:
+            lines.append(f"{amount} {source} = {value} {target}")
+    return "\n".join(lines)
 
 @dp.message(Command("convert"))
-async def cmd_convert(message: types.Message, state: FSMContext):
+async def cmd_convert(message: types.Message, state: FSMContext, command: CommandObject):
+    if command.args:
+        # Однострочная форма: /convert USD 100 [EUR ...]
+        request = parse_request(command.args)
+        if request is None:
+            await message.reply("Формат: /convert USD 100 [EUR ...]")
+            return
+        amount, source, targets = request
+        try:
+            found, results = convert_many(rates, amount, source, targets)
+        except ArithmeticError:
+            await message.reply("Не удалось пересчитать: слишком большая сумма или нулевой курс.")
+            return
+        if not found:
+            await message.reply("Валюта не найдена.")
+            return
+        await message.reply(format_conversion(amount, source, results))
+        return
     await message.reply("Введите название валюты")
     await state.set_state(ConvertStates.name)
 
 @dp.message(StateFilter(ConvertStates.name))
 async def conv_name(message: types.Message, state: FSMContext):
     name = message.text.strip().upper()
-    async with pool.acquire() as conn:
-        rate = await conn.fetchval("SELECT rate FROM currencies WHERE currency_name = $1", name)
+    rate = rates.get(name)
     if rate is None:
         await message.reply("Валюта не найдена.")
         await state.clear()
@@ -181,16 +490,78 @@ async def conv_name(message: types.Message, state: FSMContext):
 async def conv_amount(message: types.Message, state: FSMContext):
     data = await state.get_data()
     try:
-        amt = float(message.text.replace(",", "."))
-    except ValueError:
+        amt = parse_amount(message.text)
+    except InvalidOperation:
         await message.reply("Неверный формат. Введите число.")
         return
     rub = amt * data["rate"]
     await message.reply(f"{amt} × {data['rate']} = {rub:.2f} ₽")
     await state.clear()
 
+@dp.inline_query()
+async def inline_convert(query: types.InlineQuery):
+    request = parse_request(query.query)
+    results = []
+    if request is not None:
+        amount, source, targets = request
+        try:
+            found, converted = convert_many(rates, amount, source, targets)
+        except ArithmeticError:
+            text = "Не удалось пересчитать: слишком большая сумма или нулевой курс."
+            converted = []
+            results.append(types.InlineQueryResultArticle(
+                id="error",
+                title=text,
+                input_message_content=types.InputTextMessageContent(message_text=text),
+            ))
+        for target, value in converted:
+            if value is None:
+                continue
+            text = f"{amount} {source} = {value} {target}"
+            results.append(types.InlineQueryResultArticle(
+                id=target,
+                title=text,
+                input_message_content=types.InputTextMessageContent(message_text=text),
+            ))
+    # Ответ не зависит от пользователя, поэтому Telegram может отдавать его всем
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
+
+def webhook_path(b: Bot) -> str:
+    # С несколькими ботами у каждого свой адрес вебхука
+    return WEBHOOK_PATH if len(bots) == 1 else f"{WEBHOOK_PATH}/{b.id}"
+
+async def run_webhook():
+    app = web.Application()
+    for b in bots:
+        handler = WebhookHandler(
+            dispatcher_feed(dp, b),
+            concurrency=WEBHOOK_CONCURRENCY,
+            secret_token=WEBHOOK_SECRET,
+        )
+        handler.register(app, webhook_path(b))
+    setup_application(app, dp, bot=bot, bots=bots)
+
+    async def set_webhook(app: web.Application):
+        for b in bots:
+            await b.set_webhook(WEBHOOK_URL + webhook_path(b), secret_token=WEBHOOK_SECRET)
+
+    app.on_startup.append(set_webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        for b in bots:
+            await b.session.close()
+
 async def main():
-    await dp.start_polling(bot)
+    if BOT_MODE == "webhook":
+        await run_webhook()
+    else:
+        # Один опрос getUpdates на токен, общий диспетчер, startup и пул
+        await dp.start_polling(*bots)
 
 if __name__ == "__main__":
     asyncio.run(main())
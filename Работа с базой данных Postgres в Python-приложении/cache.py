@@ -0,0 +1,263 @@
+import json
+import asyncio
+import logging
+from decimal import Decimal
+from typing import Optional
+
+import asyncpg
+
+from db import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+RATES_CHANNEL = "currencies_changed"
+ADMINS_CHANNEL = "admins_changed"
+# bot_id строки admins, которая даёт права во всех ботах процесса
+ALL_BOTS = 0
+
+
+class PgListener:
+    """
+    Выделенное соединение LISTEN для уведомлений PostgreSQL.
+
+    Уведомления раздаются подписчикам по каналам. При обрыве соединения
+    слушатель переподключается, заново подписывается на каналы и вызывает
+    reload-колбэки: пока соединения не было, уведомления могли потеряться,
+    поэтому кэши перечитывают свои таблицы целиком.
+    """
+
+    def __init__(self, dsn: str = DATABASE_URL, retry_delay: float = 1.0, keepalive: float = 30.0):
+        self._dsn = dsn
+        self._retry_delay = retry_delay
+        self._keepalive = keepalive
+        self._handlers = {}
+        self._reloads = []
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    def subscribe(self, channel: str, handler, reload=None):
+        """
+        handler(payload) вызывается на каждое уведомление канала,
+        reload() — корутина полной перезагрузки после переподключения.
+        """
+        self._handlers.setdefault(channel, []).append(handler)
+        if reload is not None:
+            self._reloads.append(reload)
+
+    async def start(self):
+        await self._connect()
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+    async def _connect(self):
+        self._lost.clear()
+        self._conn = await asyncpg.connect(self._dsn)
+        self._conn.add_termination_listener(lambda conn: self._lost.set())
+        for channel in self._handlers:
+            await self._conn.add_listener(channel, self._dispatch)
+
+    def _dispatch(self, conn, pid, channel, payload):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Ошибка обработки уведомления {channel}: {e}")
+
+    async def _alive(self) -> bool:
+        try:
+            await asyncio.wait_for(self._lost.wait(), timeout=self._keepalive)
+            return False
+        except asyncio.TimeoutError:
+            pass
+        # Полуоткрытое соединение не присылает termination, проверяем сами
+        try:
+            await self._conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    async def _watch(self):
+        while True:
+            if await self._alive():
+                continue
+            logger.warning("Соединение LISTEN потеряно, переподключение...")
+            if not self._conn.is_closed():
+                self._conn.terminate()
+            while True:
+                try:
+                    await self._connect()
+                    break
+                except (OSError, asyncpg.PostgresError) as e:
+                    logger.error(f"Не удалось переподключиться: {e}")
+                    await asyncio.sleep(self._retry_delay)
+            self.reconnects += 1
+            for reload in self._reloads:
+                try:
+                    await reload()
+                except Exception as e:
+                    logger.error(f"Ошибка полной перезагрузки кэша: {e}")
+                    await asyncio.sleep(self._retry_delay)
+                    self._lost.set()
+
+
+class NotifiedCache:
+    """
+    Основа кэшей, которые загружаются из базы целиком и затем
+    поддерживаются уведомлениями.
+
+    Уведомление, пришедшее, пока load ждёт ответа на SELECT, применяется к
+    старому содержимому, которое сразу после этого заменяется загруженным.
+    Если его запись закоммичена после снимка SELECT, изменение потерялось
+    бы до следующего. Поэтому на время загрузки уведомления ещё и копятся,
+    а после замены применяются к новому содержимому в порядке прихода.
+    Уведомление несёт итоговое состояние строки, так что повтор изменения,
+    которое SELECT уже видел, ничего не портит.
+
+    Наследник реализует _fetch(repo) → загруженное состояние,
+    _replace(state) и _apply(payload).
+    """
+
+    def __init__(self):
+        self._pending: Optional[list] = None
+        self._load_lock = asyncio.Lock()
+        self.reloads = 0
+
+    async def load(self, repo):
+        async with self._load_lock:
+            self._pending = []
+            try:
+                state = await self._fetch(repo)
+                self._replace(state)
+                for payload in self._pending:
+                    self._apply_logged(payload)
+            finally:
+                self._pending = None
+            self.reloads += 1
+
+    def apply(self, payload: str):
+        if self._pending is not None:
+            self._pending.append(payload)
+        self._apply(payload)
+
+    def _apply_logged(self, payload: str):
+        try:
+            self._apply(payload)
+        except Exception as e:
+            logger.error(f"Ошибка повторного применения уведомления: {e}")
+
+
+class RateCache(NotifiedCache):
+    """
+    Курсы валют в памяти процесса.
+
+    Загружается целиком при старте и затем поддерживается уведомлениями
+    триггера currencies_notify, поэтому чтение курса не обращается к пулу.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._rates = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def _fetch(self, repo):
+        return await repo.list_currencies()
+
+    def _replace(self, rows):
+        self._rates = {r["currency_name"]: r["rate"] for r in rows}
+
+    def get(self, name: str) -> Optional[Decimal]:
+        rate = self._rates.get(name)
+        if rate is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return rate
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rates
+
+    def put(self, name: str, rate: Decimal):
+        self._rates[name] = rate
+
+    def discard(self, name: str):
+        self._rates.pop(name, None)
+
+    def _apply(self, payload: str):
+        """Применяет уведомление триггера: {"op", "currency_name", "old_name", "rate"}."""
+        event = json.loads(payload, parse_float=Decimal, parse_int=Decimal)
+        old_name = event.get("old_name")
+        if old_name and old_name != event["currency_name"]:
+            self.discard(old_name)
+        if event["op"] == "DELETE":
+            self.discard(event["currency_name"])
+        else:
+            self.put(event["currency_name"], event["rate"])
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._rates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
+
+
+class AdminCache(NotifiedCache):
+    """
+    Множество пар (bot_id, chat_id) администраторов в памяти процесса.
+
+    Таблица admins загружается целиком, поэтому отсутствие пары в
+    множестве — это закэшированный отрицательный ответ, и проверка прав
+    не обращается к базе ни в одном из случаев. Права выдаются отдельно
+    для каждого бота, строка с bot_id = ALL_BOTS действует во всех.
+    Изменения (в том числе из add_admin.py) приходят уведомлениями
+    триггера admins_notify.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._admins = set()
+        self.allowed = 0
+        self.denied = 0
+
+    async def _fetch(self, repo):
+        return await repo.list_admins()
+
+    def _replace(self, rows):
+        self._admins = set(rows)
+
+    def check(self, chat_id: str, bot_id: int = ALL_BOTS) -> bool:
+        if (bot_id, chat_id) in self._admins or (ALL_BOTS, chat_id) in self._admins:
+            self.allowed += 1
+            return True
+        self.denied += 1
+        return False
+
+    def _apply(self, payload: str):
+        """Применяет уведомление триггера: {"op", "bot_id", "chat_id"}."""
+        event = json.loads(payload)
+        key = (event["bot_id"], event["chat_id"])
+        if event["op"] == "DELETE":
+            self._admins.discard(key)
+        else:
+            self._admins.add(key)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._admins),
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "reloads": self.reloads,
+        }
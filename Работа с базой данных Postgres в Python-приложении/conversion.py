@@ -0,0 +1,72 @@
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+# Курсы в таблице currencies заданы к рублю
+BASE_CURRENCY = "RUB"
+CENT = Decimal("0.01")
+AMOUNT_RE = re.compile(r"^\d+(?:[.,]\d+)?$")
+# Больше 28 значащих цифр результат не округлить до копеек: quantize падает
+MAX_AMOUNT = Decimal("1e15")
+
+
+def parse_amount(text: str) -> Decimal:
+    """Сумма из текста пользователя; запятая допускается как разделитель."""
+    amount = Decimal(text.strip().replace(",", "."))
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT:
+        raise InvalidOperation(text)
+    return amount
+
+
+def parse_rate(text: str) -> Decimal:
+    """Курс к рублю: конечное положительное число, иначе InvalidOperation."""
+    rate = Decimal(str(text).strip().replace(",", "."))
+    if not rate.is_finite() or rate <= 0:
+        raise InvalidOperation(text)
+    return rate
+
+
+def parse_request(text: str) -> Optional[tuple]:
+    """
+    Разбирает «USD 100 [EUR ...]» или «100 USD [EUR ...]».
+    Возвращает (сумма, исходная валюта, [целевые валюты]) или None.
+    """
+    tokens = text.upper().split()
+    if len(tokens) < 2:
+        return None
+    first, second, *targets = tokens
+    if AMOUNT_RE.match(first) and not AMOUNT_RE.match(second):
+        first, second = second, first
+    if not AMOUNT_RE.match(second):
+        return None
+    try:
+        amount = parse_amount(second)
+    except InvalidOperation:
+        return None
+    # Повторы целевых валют отбрасываются, порядок сохраняется
+    return amount, first, list(dict.fromkeys(targets)) or [BASE_CURRENCY]
+
+
+def rate_to_base(rates, name: str) -> Optional[Decimal]:
+    if name == BASE_CURRENCY:
+        return Decimal(1)
+    return rates.get(name)
+
+
+def convert_many(rates, amount: Decimal, source: str, targets: list) -> tuple:
+    """
+    Переводит amount из source в каждую валюту targets через курс к рублю.
+    Возвращает (найден ли курс source, [(валюта, результат или None)]).
+    Слишком большой результат или нулевой курс — ArithmeticError.
+    """
+    source_rate = rate_to_base(rates, source)
+    if source_rate is None:
+        return False, []
+    results = []
+    for target in targets:
+        target_rate = rate_to_base(rates, target)
+        if target_rate is None:
+            results.append((target, None))
+        else:
+            results.append((target, (amount * source_rate / target_rate).quantize(CENT)))
+    return True, results
@@ -0,0 +1,115 @@
+import re
+import json
+from decimal import Decimal, InvalidOperation
+
+import asyncpg
+
+from conversion import parse_rate
+from sqlite_backend import SqlitePool
+
+# «USD 92.1», «USD;92,1», «USD: 92.1», строка CSV «USD,92.1»
+LINE_RE = re.compile(r"^\s*([^\s,;:=]+)\s*[\s,;:=\t]\s*(\d+(?:[.,]\d+)?)\s*$")
+HEADER_RE = re.compile(r"^\s*currency(_name)?\s*[,;\t]\s*rate\s*$", re.IGNORECASE)
+MAX_NAME_LENGTH = 50
+
+
+def _add(records: dict, rejected: list, name, value, source: str):
+    name = str(name).strip().upper()
+    try:
+        rate = parse_rate(value)
+    except (InvalidOperation, ValueError):
+        rejected.append(source)
+        return
+    if not name or len(name) > MAX_NAME_LENGTH:
+        rejected.append(source)
+        return
+    # Повтор валюты в одном файле: побеждает последняя строка
+    records.pop(name, None)
+    records[name] = rate
+
+
+def parse_rates(text: str):
+    """
+    Разбирает список курсов из JSON ([{"currency_name", "rate"}] или
+    {"USD": 92.1}), CSV или многострочного сообщения «USD 92.1».
+    Возвращает ([(валюта, курс)], [отклонённые строки]).
+    """
+    records, rejected = {}, []
+    text = text.strip()
+    if text[:1] in ("[", "{"):
+        try:
+            payload = json.loads(text, parse_float=Decimal)
+        except ValueError:
+            return [], [text[:100]]
+        if isinstance(payload, dict):
+            payload = [{"currency_name": k, "rate": v} for k, v in payload.items()]
+        for item in payload:
+            if isinstance(item, dict) and "currency_name" in item and "rate" in item:
+                _add(records, rejected, item["currency_name"], item["rate"], json.dumps(item, default=str))
+            else:
+                rejected.append(json.dumps(item, default=str))
+    else:
+        for line in text.splitlines():
+            if not line.strip() or HEADER_RE.match(line):
+                continue
+            match = LINE_RE.match(line)
+            if match is None:
+                rejected.append(line.strip())
+                continue
+            _add(records, rejected, match.group(1), match.group(2), line.strip())
+    return list(records.items()), rejected
+
+
+async def upsert_rates(pool: asyncpg.Pool, records: list):
+    """
+    Загружает курсы через COPY во временную таблицу и сливает их в
+    currencies одним INSERT ... ON CONFLICT в одной транзакции.
+    Возвращает (добавлено, обновлено); совпадающие курсы не переписываются.
+    """
+    if isinstance(pool, SqlitePool):
+        return await _upsert_rates_sqlite(pool, records)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE currency_import (
+                    currency_name TEXT NOT NULL,
+                    rate NUMERIC NOT NULL
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table(
+                "currency_import", records=records, columns=["currency_name", "rate"]
+            )
+            row = await conn.fetchrow("""
+                WITH merged AS (
+                    INSERT INTO currencies(currency_name, rate)
+                    SELECT currency_name, rate FROM currency_import
+                    ON CONFLICT (currency_name) DO UPDATE SET rate = EXCLUDED.rate
+                        WHERE currencies.rate IS DISTINCT FROM EXCLUDED.rate
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted) AS inserted,
+                       count(*) FILTER (WHERE NOT inserted) AS updated
+                FROM merged
+            """)
+    return row["inserted"], row["updated"]
+
+
+async def _upsert_rates_sqlite(pool: SqlitePool, records: list):
+    """
+    То же для SQLite, где нет COPY и xmax: текущие курсы читаются одним
+    запросом, и в той же транзакции executemany пишет только новые и
+    изменившиеся строки.
+    """
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            existing = dict(await conn.fetch(
+                "SELECT currency_name, rate FROM currencies WHERE currency_name IN (SELECT value FROM json_each($1))",
+                [name for name, _ in records],
+            ))
+            changed = [(name, rate) for name, rate in records if existing.get(name) != rate]
+            await conn.executemany("""
+                INSERT INTO currencies(currency_name, rate) VALUES($1, $2)
+                ON CONFLICT (currency_name) DO UPDATE SET rate = excluded.rate
+            """, changed)
+    inserted = sum(1 for name, _ in changed if name not in existing)
+    return inserted, len(changed) - inserted
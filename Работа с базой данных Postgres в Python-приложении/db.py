@@ -1,38 +1,66 @@
 import os
+from typing import Optional
+
 import asyncpg
 from dotenv import load_dotenv
 
+from sqlite_backend import SqlitePool, sqlite_path
+from migrations import migrate_pg, migrate_sqlite
+
 load_dotenv()
 
+# postgresql://… — PostgreSQL через asyncpg, sqlite:///путь.db — встроенный SQLite
+# (поставляемый database.db — sqlite:///database.db из каталога бота).
+# SQLite выбирается только явно: без DATABASE_URL бот не запускается
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_SQLITE_MMAP_SIZE = int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
 
 
-async def init_db():
-    """
-    Создаёт таблицы currencies и admins в PostgreSQL.
-    """
-    conn = await asyncpg.connect(DATABASE_URL)
+def require_database_url(dsn: Optional[str] = DATABASE_URL) -> str:
+    if not dsn:
+        raise ValueError("DATABASE_URL не найден в переменных окружения "
+                         "(postgresql://… или sqlite:///database.db)")
+    return dsn
 
-    await conn.execute("""
-        CREATE TABLE IF NOT EXISTS currencies (
-            id SERIAL PRIMARY KEY,
-            currency_name TEXT NOT NULL UNIQUE,
-            rate NUMERIC NOT NULL
-        );
-    """)
 
-    await conn.execute("""
-        CREATE TABLE IF NOT EXISTS admins (
-            id SERIAL PRIMARY KEY,
-            chat_id TEXT NOT NULL UNIQUE
-        );
-    """)
+def is_sqlite(dsn: Optional[str] = DATABASE_URL) -> bool:
+    return require_database_url(dsn).startswith("sqlite:")
 
-    await conn.close()
+
+async def init_db(dsn: str = DATABASE_URL):
+    """
+    Приводит схему к последней версии из migrations. На актуальной базе это
+    одно соединение и один запрос версии: DDL выполняется, только если
+    появились новые миграции.
+    """
+    if is_sqlite(dsn):
+        await migrate_sqlite(sqlite_path(dsn))
+    else:
+        await migrate_pg(dsn)
 
 
-async def get_pool():
+async def get_pool(dsn: str = DATABASE_URL, **kwargs):
     """
-    Создаёт и возвращает пул соединений.
+    Создаёт и возвращает пул соединений; бэкенд выбирается по схеме dsn.
+    Размеры пула и кэша запросов задаются переменными окружения,
+    kwargs передаются в asyncpg.create_pool (init, connection_class и т. п.),
+    для SQLite из них используется только init.
     """
-    return await asyncpg.create_pool(DATABASE_URL)
+    if is_sqlite(dsn):
+        return await SqlitePool(
+            sqlite_path(dsn),
+            size=DB_POOL_MAX_SIZE,
+            mmap_size=DB_SQLITE_MMAP_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            init=kwargs.get("init"),
+        ).start()
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        **kwargs
+    )
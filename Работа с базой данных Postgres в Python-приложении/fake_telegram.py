@@ -0,0 +1,136 @@
+import json
+import time
+import asyncio
+import itertools
+from collections import defaultdict
+
+from aiohttp import web, ClientSession
+
+# Бот обращается к заглушке через TELEGRAM_API_URL=http://127.0.0.1:<port>
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+class FakeTelegram:
+    """
+    Локальная заглушка Telegram Bot API для бенчмарков и нагрузочных тестов.
+
+    Поддерживает getUpdates (long polling), setWebhook/deleteWebhook и
+    sendMessage; остальные методы отвечают True. Каждое отправленное
+    обновление помечается временем, а каждый ответ бота — временем
+    получения, чтобы считать задержку «обновление → ответ».
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.host = host
+        self.port = port
+        self.webhook_url = None
+        self._updates = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._client = None
+        self._runner = None
+        self.replies = defaultdict(asyncio.Queue)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._client = ClientSession()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def message_update(self, chat_id: int, text: str) -> dict:
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+                "text": text,
+            },
+        }
+
+    async def push(self, update: dict) -> float:
+        """
+        Отдаёт обновление боту: через вебхук, если он установлен, иначе в
+        очередь getUpdates. Возвращает момент отправки (time.perf_counter).
+        """
+        sent_at = time.perf_counter()
+        if self.webhook_url:
+            async with self._client.post(self.webhook_url, json=update) as resp:
+                await resp.read()
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+        return sent_at
+
+    async def send(self, chat_id: int, text: str) -> float:
+        return await self.push(self.message_update(chat_id, text))
+
+    async def reply(self, chat_id: int, timeout: float = 10.0) -> dict:
+        """Ждёт очередной ответ бота в чат chat_id."""
+        return await asyncio.wait_for(self.replies[chat_id].get(), timeout)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        if method == "getupdates":
+            result = await self._get_updates(params)
+        elif method == "getme":
+            result = BOT_USER
+        elif method == "setwebhook":
+            self.webhook_url = params.get("url")
+            result = True
+        elif method == "deletewebhook":
+            self.webhook_url = None
+            result = True
+        elif method in ("sendmessage", "editmessagetext"):
+            result = self._record_reply(params)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset", 0))
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit", 100))
+        return self._updates[:limit]
+
+    def _record_reply(self, params: dict) -> dict:
+        chat_id = int(params["chat_id"])
+        reply_to = None
+        if params.get("reply_parameters"):
+            reply_to = json.loads(params["reply_parameters"])["message_id"]
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        self.replies[chat_id].put_nowait({
+            "received_at": time.perf_counter(),
+            "text": message["text"],
+            "reply_to": reply_to,
+            "reply_markup": json.loads(params["reply_markup"]) if params.get("reply_markup") else None,
+        })
+        return message
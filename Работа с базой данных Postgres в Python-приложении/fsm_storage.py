@@ -0,0 +1,362 @@
+import uuid
+import struct
+import asyncio
+import logging
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Mapping, Optional
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+FSM_CHANNEL = "fsm_changed"
+
+# Теги компактного бинарного формата данных FSM
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR, _BYTES, _DECIMAL, _LIST, _DICT = range(10)
+_DOUBLE = struct.Struct("<d")
+
+
+def _write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf: bytes, pos: int):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_text(out: bytearray, text: str):
+    raw = text.encode()
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _encode_value(out: bytearray, value: Any):
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        # zigzag: отрицательные числа тоже занимают мало байт
+        _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        out.append(_STR)
+        _write_text(out, value)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(_BYTES)
+        _write_varint(out, len(value))
+        out += value
+    elif isinstance(value, Decimal):
+        out.append(_DECIMAL)
+        _write_text(out, str(value))
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode_value(out, item)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for k, v in value.items():
+            _write_text(out, k)
+            _encode_value(out, v)
+    else:
+        raise TypeError(f"Тип {type(value).__name__} нельзя сохранить в данных FSM")
+
+
+def _decode_value(buf: bytes, pos: int):
+    tag = buf[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _INT:
+        n, pos = _read_varint(buf, pos)
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + _DOUBLE.size
+    if tag in (_STR, _DECIMAL, _BYTES):
+        size, pos = _read_varint(buf, pos)
+        raw = bytes(buf[pos:pos + size])
+        pos += size
+        if tag == _STR:
+            return raw.decode(), pos
+        if tag == _DECIMAL:
+            return Decimal(raw.decode()), pos
+        return raw, pos
+    if tag == _LIST:
+        size, pos = _read_varint(buf, pos)
+        items = []
+        for _ in range(size):
+            item, pos = _decode_value(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        size, pos = _read_varint(buf, pos)
+        result = {}
+        for _ in range(size):
+            key_size, pos = _read_varint(buf, pos)
+            key = bytes(buf[pos:pos + key_size]).decode()
+            pos += key_size
+            result[key], pos = _decode_value(buf, pos)
+        return result, pos
+    raise ValueError(f"Неизвестный тег {tag} в данных FSM")
+
+
+def encode_data(data: Mapping[str, Any]) -> bytes:
+    """Кодирует словарь данных FSM; пустой словарь занимает 0 байт."""
+    if not data:
+        return b""
+    out = bytearray()
+    _encode_value(out, dict(data))
+    return bytes(out)
+
+
+def decode_data(raw: Optional[bytes]) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    return _decode_value(raw, 0)[0]
+
+
+class _Record:
+    __slots__ = ("state", "data", "version", "dirty", "changes")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], version: int):
+        self.state = state
+        self.data = data
+        self.version = version
+        self.dirty = False
+        # Счётчик изменений: по нему flush узнаёт, менялась ли запись, пока шла пачка
+        self.changes = 0
+
+
+class PgStorage(BaseStorage):
+    """
+    Хранилище FSM в PostgreSQL, общее для нескольких процессов бота.
+
+    Чтение и запись идут в локальный горячий слой; изменённые записи
+    сбрасываются в таблицу fsm_states пачками раз в flush_interval
+    одним запросом. Каждая запись несёт версию: пачка обновляет строку,
+    только если её версия в базе не изменилась, иначе запись считается
+    конфликтной и отбрасывается из локального слоя. После записи другим
+    процессам уходит NOTIFY, и они сбрасывают устаревшие копии.
+    """
+
+    def __init__(self, flush_interval: float = 0.05, batch_size: int = 500, local_size: int = 100_000):
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._local_size = local_size
+        self._local: "OrderedDict[str, _Record]" = OrderedDict()
+        self._dirty = set()
+        self._inflight = set()
+        self._wakeup = asyncio.Event()
+        self._pool: Optional[asyncpg.Pool] = None
+        self._task: Optional[asyncio.Task] = None
+        self._origin = uuid.uuid4().hex[:12]
+        self.loads = 0
+        self.flushes = 0
+        self.written = 0
+        self.conflicts = 0
+
+    async def connect(self, pool: asyncpg.Pool, listener=None):
+        """Привязывает хранилище к пулу и, если передан PgListener, к уведомлениям."""
+        self._pool = pool
+        if listener is not None:
+            listener.subscribe(FSM_CHANNEL, self._on_notify, reload=self._drop_clean)
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            await self.flush()
+
+    def _key(self, key: StorageKey) -> str:
+        return self._key_builder.build(key)
+
+    async def _record(self, key: StorageKey) -> _Record:
+        skey = self._key(key)
+        record = self._local.get(skey)
+        if record is not None:
+            self._local.move_to_end(skey)
+            return record
+        async with self._pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT state, data, version FROM fsm_states WHERE key = $1", skey)
+        self.loads += 1
+        # Пока шёл запрос, запись могла появиться локально — она свежее
+        record = self._local.get(skey)
+        if record is None:
+            if row is None:
+                record = _Record(None, {}, 0)
+            else:
+                record = _Record(row["state"], decode_data(row["data"]), row["version"])
+            self._local[skey] = record
+            self._evict()
+        return record
+
+    def _evict(self):
+        while len(self._local) > self._local_size:
+            for skey, record in self._local.items():
+                if not record.dirty:
+                    del self._local[skey]
+                    break
+            else:
+                return
+
+    def _touch(self, key: StorageKey, record: _Record):
+        record.dirty = True
+        record.changes += 1
+        self._dirty.add(self._key(key))
+        if len(self._dirty) >= self._batch_size:
+            self._wakeup.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        record = await self._record(key)
+        record.data = dict(data)
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._record(key)).data)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи состояний FSM: {e}")
+                await asyncio.sleep(self._flush_interval)
+
+    async def flush(self):
+        """
+        Сбрасывает накопленные изменения одной пачкой.
+
+        Сначала кодируются все записи пачки; запись, данные которой не
+        кодируются, отбрасывается из локального слоя и не мешает остальным.
+        Записи остаются грязными, пока пачка не закоммичена: при ошибке они
+        уйдут в следующую, а изменённые за время записи — тем более.
+        """
+        if not self._dirty:
+            return
+        keys, states, blobs, versions, changes = [], [], [], [], []
+        for skey in list(self._dirty):
+            # Запись из пачки, которая ещё пишется, уйдёт следующей
+            if skey in self._inflight:
+                continue
+            self._dirty.discard(skey)
+            record = self._local.get(skey)
+            if record is None or not record.dirty:
+                continue
+            try:
+                blob = encode_data(record.data)
+            except Exception as e:
+                logger.error(f"Данные FSM для {skey} не кодируются, локальная копия отброшена: {e}")
+                self._local.pop(skey, None)
+                continue
+            keys.append(skey)
+            states.append(record.state)
+            blobs.append(blob)
+            versions.append(record.version + 1)
+            changes.append(record.changes)
+        if not keys:
+            return
+        self._inflight.update(keys)
+        try:
+            async with self._pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    WITH written AS (
+                        INSERT INTO fsm_states AS s (key, state, data, version)
+                        SELECT * FROM unnest($1::text[], $2::text[], $3::bytea[], $4::bigint[])
+                        ON CONFLICT (key) DO UPDATE
+                            SET state = EXCLUDED.state, data = EXCLUDED.data, version = EXCLUDED.version
+                            WHERE s.version = EXCLUDED.version - 1
+                        RETURNING s.key, s.version
+                    )
+                    SELECT w.key FROM written w, LATERAL pg_notify($5, $6 || ' ' || w.version || ' ' || w.key)
+                """, keys, states, blobs, versions, FSM_CHANNEL, self._origin)
+        except Exception:
+            for skey in keys:
+                if skey in self._local:
+                    self._dirty.add(skey)
+            raise
+        finally:
+            self._inflight.difference_update(keys)
+        self.flushes += 1
+        self.written += len(rows)
+        accepted = {r["key"] for r in rows}
+        for skey, version, seen in zip(keys, versions, changes):
+            record = self._local.get(skey)
+            if record is None:
+                continue
+            if skey in accepted:
+                record.version = version
+                # Изменённая во время записи запись остаётся грязной и уже лежит в _dirty
+                if record.changes == seen:
+                    record.dirty = False
+            else:
+                # Строку уже изменил другой процесс: его версия главнее
+                self.conflicts += 1
+                logger.warning(f"Конфликт версий FSM для {skey}, локальная копия отброшена")
+                self._local.pop(skey, None)
+                self._dirty.discard(skey)
+
+    def _on_notify(self, payload: str):
+        origin, version, skey = payload.split(" ", 2)
+        if origin == self._origin or skey in self._inflight:
+            return
+        record = self._local.get(skey)
+        if record is not None and not record.dirty and record.version < int(version):
+            del self._local[skey]
+
+    async def _drop_clean(self):
+        for skey in [k for k, r in self._local.items() if not r.dirty]:
+            del self._local[skey]
+
+    def stats(self) -> dict:
+        return {
+            "local": len(self._local),
+            "dirty": len(self._dirty),
+            "loads": self.loads,
+            "flushes": self.flushes,
+            "written": self.written,
+            "conflicts": self.conflicts,
+        }
@@ -0,0 +1,247 @@
+"""
+Нагрузочный тест bot.py против локальной заглушки Telegram Bot API.
+
+Поднимает fake_telegram, при необходимости временный кластер PostgreSQL
+(--pg-bin, каталог с initdb и pg_ctl; запускать не от root), наполняет
+базу и прогоняет сценарии пользователей через настоящие обработчики
+bot.py. В конце печатает p50/p95/p99 по обработчикам и шагам сценариев,
+время ожидания соединения пула и пропускную способность.
+
+    python loadtest.py --users 1000 --rate 200 --iterations 3
+    python loadtest.py --pg-bin /usr/lib/postgresql/16/bin --mode webhook
+    python loadtest.py --workers 4    # через sharding.py; время обработчиков не замеряется
+    python loadtest.py --throttle     # с лимитами троттлинга bot.py
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+from fake_telegram import FakeTelegram
+
+ADMIN_SHARE = 0.1
+CURRENCIES = [f"L{i:03d}" for i in range(200)]
+
+# Сценарии: последовательность сообщений пользователя
+SCENARIOS = {
+    "convert_dialog": lambda: ["/convert", random.choice(CURRENCIES), str(random.randint(1, 1000))],
+    "convert_oneshot": lambda: [f"/convert {random.choice(CURRENCIES)} {random.randint(1, 1000)} USD"],
+    "get_currencies": lambda: ["/get_currencies"],
+    "start": lambda: ["/start"],
+}
+ADMIN_SCENARIOS = {
+    "update_rate": lambda: ["/manage_currency", "Изменить курс валюты",
+                            random.choice(CURRENCIES), f"{random.uniform(1, 200):.2f}"],
+}
+# Без --throttle лимиты бота поднимаются выше нагрузки: отброшенное
+# троттлингом обновление не получает ответа и выглядело бы как ошибка
+UNTHROTTLED = ",".join(f"{kind}=1000000/1000000" for kind in
+                       ("convert", "get_currencies", "start", "manage_currency", "callback", "inline", "message"))
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalPostgres:
+    """Временный кластер PostgreSQL в каталоге tmp, удаляется после теста."""
+
+    def __init__(self, bin_dir: str):
+        self.bin_dir = bin_dir
+        self.port = free_port()
+        self.data_dir = tempfile.mkdtemp(prefix="loadtest-pg-")
+
+    @property
+    def url(self) -> str:
+        return f"postgresql://postgres@127.0.0.1:{self.port}/postgres"
+
+    def _run(self, tool: str, *args):
+        subprocess.run([os.path.join(self.bin_dir, tool), *args], check=True, stdout=subprocess.DEVNULL)
+
+    def start(self):
+        self._run("initdb", "-D", self.data_dir, "-U", "postgres", "--auth=trust")
+        self._run("pg_ctl", "-D", self.data_dir, "-w", "-l", os.path.join(self.data_dir, "server.log"),
+                  "-o", f"-p {self.port} -k {self.data_dir} -c max_connections=200", "start")
+
+    def stop(self):
+        self._run("pg_ctl", "-D", self.data_dir, "-m", "fast", "-w", "stop")
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+class Recorder:
+    def __init__(self):
+        self.handlers = defaultdict(list)
+        self.steps = defaultdict(list)
+        self.updates = 0
+        self.errors = 0
+        self.throttled = defaultdict(int)
+
+    async def timing_middleware(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.handlers[data["handler"].callback.__name__].append(time.perf_counter() - started)
+            self.updates += 1
+
+
+async def seed(url: str, users: int):
+    import asyncpg
+    from db import init_db
+    await init_db()
+    conn = await asyncpg.connect(url)
+    await conn.executemany(
+        "INSERT INTO currencies(currency_name, rate) VALUES($1, $2) ON CONFLICT DO NOTHING",
+        [(name, random.uniform(1, 200)) for name in CURRENCIES + ["USD"]],
+    )
+    admins = [str(1_000_000 + i) for i in range(int(users * ADMIN_SHARE))]
+    await conn.executemany("INSERT INTO admins(chat_id) VALUES($1) ON CONFLICT DO NOTHING", [(a,) for a in admins])
+    await conn.close()
+
+
+async def run_user(fake: FakeTelegram, recorder: Recorder, chat_id: int, is_admin: bool,
+                   iterations: int, pacer):
+    scenarios = {**SCENARIOS, **ADMIN_SCENARIOS} if is_admin else SCENARIOS
+    for _ in range(iterations):
+        await pacer()
+        name = random.choice(list(scenarios))
+        for step, text in enumerate(scenarios[name]()):
+            sent_at = await fake.send(chat_id, text)
+            try:
+                reply = await fake.reply(chat_id, timeout=30)
+            except asyncio.TimeoutError:
+                recorder.errors += 1
+                break
+            if reply.get("throttled"):
+                recorder.throttled[f"{name}[{step}]"] += 1
+                break
+            recorder.steps[f"{name}[{step}]"].append(reply["received_at"] - sent_at)
+
+
+def make_pacer(rate: float):
+    """Не больше rate стартов сценариев в секунду на всех пользователей."""
+    interval = 1.0 / rate
+    state = {"next": time.perf_counter()}
+
+    async def pace():
+        now = time.perf_counter()
+        slot = max(now, state["next"])
+        state["next"] = slot + interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    return pace
+
+
+def print_table(title: str, samples: dict):
+    print(f"\n{title}")
+    print(f"{'':<28}{'n':>8}{'p50,мс':>10}{'p95,мс':>10}{'p99,мс':>10}")
+    for name in sorted(samples):
+        values = samples[name]
+        print(f"{name:<28}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200, help="стартов сценариев в секунду")
+    parser.add_argument("--iterations", type=int, default=3, help="сценариев на пользователя")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--pg-bin", help="каталог initdb/pg_ctl для временного PostgreSQL")
+    parser.add_argument("--workers", type=int, default=0, help="запустить бота через sharding.py с N обработчиками")
+    parser.add_argument("--throttle", action="store_true",
+                        help="оставить лимиты троттлинга bot.py; отброшенные шаги считаются отдельно")
+    args = parser.parse_args()
+
+    postgres = None
+    if args.pg_bin:
+        postgres = LocalPostgres(args.pg_bin)
+        postgres.start()
+        os.environ["DATABASE_URL"] = postgres.url
+    if not os.getenv("DATABASE_URL"):
+        sys.exit("Нужен --pg-bin или DATABASE_URL")
+
+    fake = FakeTelegram(port=free_port())
+    await fake.start()
+    webhook_port = free_port()
+    os.environ.update({
+        "BOT_TOKEN": "42:loadtest",
+        "TELEGRAM_API_URL": fake.url,
+        "BOT_MODE": args.mode,
+        "WEBHOOK_URL": f"http://127.0.0.1:{webhook_port}",
+        "WEBAPP_HOST": "127.0.0.1",
+        "WEBAPP_PORT": str(webhook_port),
+    })
+    if not args.throttle:
+        os.environ.update({"THROTTLE_PER_CHAT": UNTHROTTLED, "THROTTLE_GLOBAL": ""})
+    # bot.py читает окружение при импорте
+    await seed(os.environ["DATABASE_URL"], args.users)
+    import bot
+
+    recorder = Recorder()
+    if args.workers:
+        import sharding
+        ready = asyncio.Event()
+        bot_task = asyncio.create_task(sharding.run_front(args.workers, ready))
+        await ready.wait()
+    else:
+        bot.dp.message.middleware(recorder.timing_middleware)
+        bot.dp.callback_query.middleware(recorder.timing_middleware)
+        # Отброшенное обновление сразу завершает шаг, не дожидаясь таймаута ответа
+        bot.throttling.on_throttled = lambda chat_id, kind: fake.replies[chat_id].put_nowait({"throttled": True})
+        bot_task = asyncio.create_task(bot.main())
+        await asyncio.sleep(1.0)
+
+    pacer = make_pacer(args.rate)
+    admins = int(args.users * ADMIN_SHARE)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            run_user(fake, recorder, 1_000_000 + i, i < admins, args.iterations, pacer)
+            for i in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+        answered = sum(len(values) for values in recorder.steps.values())
+        if recorder.handlers:
+            print_table("Обработчики (время внутри обработчика)", recorder.handlers)
+        print_table("Шаги сценариев (обновление → ответ)", recorder.steps)
+        if not args.workers:
+            print(f"\nОжидание соединения пула: {bot.repo.pool_wait.summary()}")
+        print(f"Ответов: {answered}, за {elapsed:.1f} с — {answered / elapsed:.0f} в секунду")
+        print(f"Шагов без ответа: {recorder.errors}")
+        if args.throttle:
+            if args.workers:
+                print("С --workers отброшенные троттлингом шаги входят в шаги без ответа")
+            else:
+                print(f"Отброшено троттлингом: {dict(recorder.throttled) or 0}")
+    finally:
+        if args.mode == "polling" and not args.workers:
+            await bot.dp.stop_polling()
+            await bot_task
+        else:
+            bot_task.cancel()
+            try:
+                await bot_task
+            except asyncio.CancelledError:
+                pass
+        await fake.close()
+        if postgres is not None:
+            postgres.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
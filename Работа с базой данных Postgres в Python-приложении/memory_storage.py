@@ -0,0 +1,122 @@
+# Общий модуль двух приложений: одинаковые копии лежат в «Работа с базой данных
+# Postgres в Python-приложении» и «Реализация микросервисного приложения».
+# Каталоги приложений запускаются и разворачиваются отдельно, без общего пакета,
+# поэтому каждое держит свою копию. Менять обе вместе: расхождение ловит
+# test_shared_modules.py микросервисного приложения.
+
+import sys
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+class _Entry:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, touched: float):
+        self.state: Optional[str] = None
+        # Плоский кортеж (ключ, значение, ключ, значение, ...) вместо словаря; None — данных нет
+        self.data: Optional[tuple] = None
+        self.touched = touched
+
+
+def _compact(key: StorageKey) -> tuple:
+    # Кортеж в несколько раз меньше экземпляра датакласса StorageKey со словарём атрибутов
+    return key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """
+    Хранилище FSM в памяти процесса с ограниченным размером.
+
+    Записи лежат в LRU-словаре в порядке последнего обращения. Простой
+    (idle) TTL одинаков для всех записей, поэтому самая старая по времени
+    обращения запись всегда в голове словаря: истёкшие снимаются с головы
+    при каждом обращении за амортизированное O(1), как из кучи по сроку.
+    Сверх max_entries вытесняются самые давние разговоры.
+
+    Запись без состояния и данных удаляется сразу, поэтому завершённый
+    state.clear() разговор не занимает памяти. Имена состояний интернируются
+    (одна строка на состояние на весь процесс), данные хранятся плоским кортежем,
+    а ключ StorageKey — кортежем его полей.
+    """
+
+    def __init__(self, ttl: float = 900.0, max_entries: int = 100_000):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float):
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry.touched < self._ttl:
+                break
+            del entries[key]
+            self.expired += 1
+
+    def _get(self, key: tuple) -> Optional[_Entry]:
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.touched = now
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: tuple) -> _Entry:
+        entry = self._get(key)
+        if entry is None:
+            while len(self._entries) >= self._max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            entry = self._entries[key] = _Entry(time.monotonic())
+        return entry
+
+    def _drop_if_empty(self, key: tuple, entry: _Entry):
+        if entry.state is None and entry.data is None:
+            del self._entries[key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        state = state.state if isinstance(state, State) else state
+        key = _compact(key)
+        if state is None and key not in self._entries:
+            return
+        entry = self._put(key)
+        entry.state = sys.intern(state) if state is not None else None
+        self._drop_if_empty(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._get(_compact(key))
+        return entry.state if entry is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        key = _compact(key)
+        if not data and key not in self._entries:
+            return
+        entry = self._put(key)
+        entry.data = tuple(chain.from_iterable(data.items())) if data else None
+        self._drop_if_empty(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._get(_compact(key))
+        if entry is None or entry.data is None:
+            return {}
+        items = iter(entry.data)
+        return dict(zip(items, items))
+
+    async def close(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._entries),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,274 @@
+"""
+Версионированные миграции схемы бота.
+
+Номер версии схемы хранится в таблице schema_version. На старте init_db
+читает его одним запросом и, если все миграции уже применены, больше
+ничего не делает; DDL выполняется, только когда есть новые миграции.
+
+PostgreSQL: миграции применяются в одной транзакции под
+pg_advisory_xact_lock, поэтому одновременно стартующие экземпляры не
+выполняют DDL наперегонки — первый применяет, остальные дожидаются
+блокировки, перечитывают версию и ничего не делают. SQLite: ту же роль
+играет блокировка записи BEGIN IMMEDIATE.
+
+Новая миграция добавляется в конец списка со следующим номером;
+применённые миграции не меняются.
+"""
+import logging
+import sqlite3
+from typing import Awaitable, Callable, List, NamedTuple, Union
+
+import asyncpg
+
+from sqlite_backend import SqliteConnection, connect as sqlite_connect
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_xact_lock: одно и то же число во всех экземплярах бота
+MIGRATION_LOCK = 7_210_018
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    # Текст SQL или корутина apply(conn) для шагов, которые не выразить одним скриптом
+    apply: Union[str, Callable[..., Awaitable[None]]]
+
+
+PG_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+# Версия 1 — схема, которую до появления миграций init_db создавал на каждом
+# старте. Она идемпотентна, поэтому на базе без schema_version, созданной
+# прежним init_db, применяется без ошибок и только проставляет версию
+PG_MIGRATIONS: List[Migration] = [
+    Migration(1, "исходная схема: курсы, администраторы, уведомления, FSM", """
+    CREATE TABLE IF NOT EXISTS currencies (
+        id SERIAL PRIMARY KEY,
+        currency_name TEXT NOT NULL UNIQUE,
+        rate NUMERIC NOT NULL
+    );
+
+    -- Уведомление об изменении курса для кэшей в процессах бота
+    CREATE OR REPLACE FUNCTION notify_currencies_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('currencies_changed', json_build_object(
+                'op', TG_OP, 'currency_name', OLD.currency_name
+            )::text);
+            RETURN OLD;
+        END IF;
+        PERFORM pg_notify('currencies_changed', json_build_object(
+            'op', TG_OP,
+            'currency_name', NEW.currency_name,
+            'old_name', CASE WHEN TG_OP = 'UPDATE' THEN OLD.currency_name END,
+            'rate', NEW.rate
+        )::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS currencies_notify ON currencies;
+    CREATE TRIGGER currencies_notify
+        AFTER INSERT OR UPDATE OR DELETE ON currencies
+        FOR EACH ROW EXECUTE FUNCTION notify_currencies_change();
+
+    CREATE TABLE IF NOT EXISTS admins (
+        id SERIAL PRIMARY KEY,
+        chat_id TEXT NOT NULL
+    );
+
+    -- Администраторы отдельно для каждого бота из BOT_TOKENS; bot_id = 0 — всех ботов.
+    -- Таблица, созданная до этого, получает столбец, а уникальность chat_id
+    -- заменяется уникальностью пары
+    ALTER TABLE admins ADD COLUMN IF NOT EXISTS bot_id BIGINT NOT NULL DEFAULT 0;
+    ALTER TABLE admins DROP CONSTRAINT IF EXISTS admins_chat_id_key;
+    CREATE UNIQUE INDEX IF NOT EXISTS admins_bot_id_chat_id ON admins(bot_id, chat_id);
+
+    CREATE OR REPLACE FUNCTION notify_admins_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM pg_notify('admins_changed', json_build_object(
+                'op', 'DELETE', 'bot_id', OLD.bot_id, 'chat_id', OLD.chat_id
+            )::text);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM pg_notify('admins_changed', json_build_object(
+                'op', 'INSERT', 'bot_id', NEW.bot_id, 'chat_id', NEW.chat_id
+            )::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS admins_notify ON admins;
+    CREATE TRIGGER admins_notify
+        AFTER INSERT OR UPDATE OR DELETE ON admins
+        FOR EACH ROW EXECUTE FUNCTION notify_admins_change();
+
+    -- Одноразовые уведомления о пересечении курсом порога (alerts.AlertIndex)
+    CREATE TABLE IF NOT EXISTS rate_alerts (
+        id SERIAL PRIMARY KEY,
+        chat_id TEXT NOT NULL,
+        currency_name TEXT NOT NULL,
+        direction TEXT NOT NULL CHECK (direction IN ('above', 'below')),
+        threshold NUMERIC NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS rate_alerts_chat_id ON rate_alerts(chat_id);
+
+    -- Уведомление доставляет тот бот, в котором его создали; 0 — первый из BOT_TOKENS
+    ALTER TABLE rate_alerts ADD COLUMN IF NOT EXISTS bot_id BIGINT NOT NULL DEFAULT 0;
+
+    CREATE OR REPLACE FUNCTION notify_rate_alerts_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('rate_alerts_changed', json_build_object(
+                'op', TG_OP, 'id', OLD.id
+            )::text);
+            RETURN NULL;
+        END IF;
+        PERFORM pg_notify('rate_alerts_changed', json_build_object(
+            'op', TG_OP,
+            'id', NEW.id,
+            'bot_id', NEW.bot_id,
+            'chat_id', NEW.chat_id,
+            'currency_name', NEW.currency_name,
+            'direction', NEW.direction,
+            'threshold', NEW.threshold::text
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS rate_alerts_notify ON rate_alerts;
+    CREATE TRIGGER rate_alerts_notify
+        AFTER INSERT OR DELETE ON rate_alerts
+        FOR EACH ROW EXECUTE FUNCTION notify_rate_alerts_change();
+
+    -- Общие состояния FSM для нескольких процессов бота (fsm_storage.PgStorage)
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data BYTEA NOT NULL,
+        version BIGINT NOT NULL
+    );
+    """),
+]
+
+SQLITE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+async def _columns(conn: SqliteConnection, table: str) -> set:
+    return {row["name"] for row in await conn.fetch(f"PRAGMA table_info({table})")}
+
+
+async def _sqlite_baseline(conn: SqliteConnection):
+    await conn.script("""
+        CREATE TABLE IF NOT EXISTS currencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            currency_name TEXT NOT NULL UNIQUE,
+            rate NUMERIC NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bot_id INTEGER NOT NULL DEFAULT 0,
+            chat_id TEXT NOT NULL,
+            UNIQUE (bot_id, chat_id)
+        );
+        CREATE TABLE IF NOT EXISTS rate_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bot_id INTEGER NOT NULL DEFAULT 0,
+            chat_id TEXT NOT NULL,
+            currency_name TEXT NOT NULL,
+            direction TEXT NOT NULL CHECK (direction IN ('above', 'below')),
+            threshold NUMERIC NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS rate_alerts_chat_id ON rate_alerts(chat_id);
+    """)
+    # Файлы, созданные до появления bot_id (в том числе поставляемый database.db).
+    # Ограничение UNIQUE (chat_id) в SQLite не удалить, поэтому admins пересоздаётся
+    if "bot_id" not in await _columns(conn, "admins"):
+        await conn.script("""
+            CREATE TABLE admins_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bot_id INTEGER NOT NULL DEFAULT 0,
+                chat_id TEXT NOT NULL,
+                UNIQUE (bot_id, chat_id)
+            );
+            INSERT INTO admins_new(id, chat_id) SELECT id, chat_id FROM admins;
+            DROP TABLE admins;
+            ALTER TABLE admins_new RENAME TO admins;
+        """)
+    if "bot_id" not in await _columns(conn, "rate_alerts"):
+        await conn.script("ALTER TABLE rate_alerts ADD COLUMN bot_id INTEGER NOT NULL DEFAULT 0;")
+
+
+# Те же таблицы, что и в PostgreSQL, без триггеров уведомлений
+SQLITE_MIGRATIONS: List[Migration] = [
+    Migration(1, "исходная схема: курсы, администраторы, уведомления", _sqlite_baseline),
+]
+
+
+async def _version(conn, missing_table: type) -> int:
+    try:
+        return await conn.fetchval("SELECT max(version) FROM schema_version") or 0
+    except missing_table:
+        return 0
+
+
+async def _apply(conn, migrations: List[Migration], version: int, run_script) -> int:
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+        logger.info(f"Миграция схемы {migration.version}: {migration.description}")
+        if isinstance(migration.apply, str):
+            await run_script(migration.apply)
+        else:
+            await migration.apply(conn)
+        await conn.execute("INSERT INTO schema_version(version, description) VALUES($1, $2)",
+                           migration.version, migration.description)
+        version = migration.version
+    return version
+
+
+async def migrate_pg(dsn: str, migrations: List[Migration] = PG_MIGRATIONS) -> int:
+    """Применяет недостающие миграции PostgreSQL и возвращает версию схемы."""
+    conn = await asyncpg.connect(dsn)
+    try:
+        version = await _version(conn, asyncpg.UndefinedTableError)
+        if version >= migrations[-1].version:
+            return version
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK)
+            await conn.execute(PG_SCHEMA_VERSION)
+            # Пока ждали блокировку, миграции мог применить другой экземпляр
+            version = await _version(conn, asyncpg.UndefinedTableError)
+            return await _apply(conn, migrations, version, conn.execute)
+    finally:
+        await conn.close()
+
+
+async def migrate_sqlite(path: str, migrations: List[Migration] = SQLITE_MIGRATIONS) -> int:
+    """Применяет недостающие миграции SQLite и возвращает версию схемы."""
+    conn = await sqlite_connect(path)
+    try:
+        version = await _version(conn, sqlite3.OperationalError)
+        if version >= migrations[-1].version:
+            return version
+        async with conn.transaction():
+            await conn.script(SQLITE_SCHEMA_VERSION)
+            version = await _version(conn, sqlite3.OperationalError)
+            return await _apply(conn, migrations, version, conn.script)
+    finally:
+        await conn.close()
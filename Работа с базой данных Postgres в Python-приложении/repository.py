@@ -0,0 +1,236 @@
+import time
+import bisect
+from decimal import Decimal
+from typing import Optional
+
+import asyncpg
+
+from db import DATABASE_URL, get_pool, is_sqlite
+
+# Все запросы бота; каждый готовится один раз на соединение в init-хуке пула
+STATEMENTS = {
+    "get_rate": "SELECT rate FROM currencies WHERE currency_name = $1",
+    "currency_exists": "SELECT EXISTS(SELECT 1 FROM currencies WHERE currency_name = $1)",
+    "list_currencies": "SELECT currency_name, rate FROM currencies ORDER BY currency_name",
+    "add_currency": "INSERT INTO currencies(currency_name, rate) VALUES($1, $2) RETURNING id",
+    # Возвращает курс до изменения: по нему ищутся пересечённые пороги уведомлений
+    "update_rate": """
+        UPDATE currencies c SET rate = $1
+        FROM (SELECT id, rate FROM currencies WHERE currency_name = $2 FOR UPDATE) old
+        WHERE c.id = old.id
+        RETURNING old.rate
+    """,
+    "delete_currency": "DELETE FROM currencies WHERE currency_name = $1 RETURNING id",
+    "list_admins": "SELECT bot_id, chat_id FROM admins",
+    "list_alerts": "SELECT id, bot_id, chat_id, currency_name, direction, threshold FROM rate_alerts",
+    "add_alert": """
+        INSERT INTO rate_alerts(bot_id, chat_id, currency_name, direction, threshold)
+        VALUES($1, $2, $3, $4, $5) RETURNING id
+    """,
+    "delete_alerts": """
+        DELETE FROM rate_alerts WHERE id = ANY($1::int[])
+        RETURNING id, bot_id, chat_id, currency_name, direction, threshold
+    """,
+    "delete_chat_alerts": "DELETE FROM rate_alerts WHERE bot_id = $1 AND chat_id = $2",
+    # Keyset-пагинация: страница после/до якоря, отфильтрованная по префиксу
+    "page_forward": """
+        SELECT currency_name, rate FROM currencies
+        WHERE currency_name > $1 AND currency_name LIKE $2 ESCAPE '\\'
+        ORDER BY currency_name LIMIT $3
+    """,
+    "page_backward": """
+        SELECT currency_name, rate FROM currencies
+        WHERE currency_name < $1 AND currency_name LIKE $2 ESCAPE '\\'
+        ORDER BY currency_name DESC LIMIT $3
+    """,
+}
+
+# В SQLite нет массивов и FOR UPDATE, а RETURNING видит только новые значения
+SQLITE_STATEMENTS = {
+    **STATEMENTS,
+    "update_rate": "UPDATE currencies SET rate = $1 WHERE currency_name = $2",
+    "delete_alerts": """
+        DELETE FROM rate_alerts WHERE id IN (SELECT value FROM json_each($1))
+        RETURNING id, bot_id, chat_id, currency_name, direction, threshold
+    """,
+}
+
+# Верхние границы корзин гистограммы, мс
+BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля (мс) по верхней границе корзины."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return BUCKETS_MS[-1]
+
+    def summary(self) -> str:
+        if not self.count:
+            return "0 вызовов"
+        return (f"{self.count} вызовов, среднее {self.total / self.count:.2f} мс, "
+                f"p50≤{self.percentile(0.5)} p95≤{self.percentile(0.95)} p99≤{self.percentile(0.99)} мс")
+
+
+class RepoConnection(asyncpg.Connection):
+    """
+    Соединение пула, которое при создании готовит все запросы STATEMENTS.
+
+    Каждый запрос проходит через кэш подготовленных запросов соединения
+    вызовом executemany без аргументов: запрос разбирается на сервере и
+    остаётся в кэше, но не выполняется. Ошибка в тексте запроса или
+    несовпадение со схемой видны сразу при подключении, а fetch/fetchval
+    обработчиков с тем же текстом берут готовый запрос из кэша без
+    повторного разбора (Parse) на сервере.
+    """
+
+    async def prepare_statements(self):
+        for sql in STATEMENTS.values():
+            await self.executemany(sql, [])
+
+
+async def prepare_statements(conn: RepoConnection):
+    await conn.prepare_statements()
+
+
+class CurrencyRepository:
+    """
+    Доступ к таблицам бота через подготовленные запросы.
+
+    Для каждого запроса считается число вызовов и гистограмма задержек,
+    отдельно — время ожидания свободного соединения в пуле.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, statements: dict = STATEMENTS, sqlite: bool = False):
+        self.pool = pool
+        self.statements = statements
+        # В SQLite другой набор запросов и нет FOR UPDATE
+        self.sqlite = sqlite
+        self.timings = {name: Histogram() for name in statements}
+        self.pool_wait = Histogram()
+
+    async def _run(self, name: str, method: str, *args):
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            acquired = time.perf_counter()
+            result = await getattr(conn, method)(self.statements[name], *args)
+        self.timings[name].observe(time.perf_counter() - acquired)
+        self.pool_wait.observe(acquired - started)
+        return result
+
+    async def get_rate(self, name: str) -> Optional[Decimal]:
+        return await self._run("get_rate", "fetchval", name)
+
+    async def currency_exists(self, name: str) -> bool:
+        return await self._run("currency_exists", "fetchval", name)
+
+    async def list_currencies(self) -> list:
+        return await self._run("list_currencies", "fetch")
+
+    async def add_currency(self, name: str, rate: Decimal) -> int:
+        return await self._run("add_currency", "fetchval", name, rate)
+
+    async def update_rate(self, name: str, rate: Decimal) -> Optional[Decimal]:
+        """Меняет курс и возвращает прежний; None, если валюты нет."""
+        if not self.sqlite:
+            return await self._run("update_rate", "fetchval", rate, name)
+        # SQLite: прежний курс читается в той же пишущей транзакции
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            acquired = time.perf_counter()
+            async with conn.transaction():
+                old = await conn.fetchval(self.statements["get_rate"], name)
+                if old is not None:
+                    await conn.execute(self.statements["update_rate"], rate, name)
+        self.timings["update_rate"].observe(time.perf_counter() - acquired)
+        self.pool_wait.observe(acquired - started)
+        return old
+
+    async def delete_currency(self, name: str) -> bool:
+        return await self._run("delete_currency", "fetchval", name) is not None
+
+    async def page_currencies(self, prefix: str, anchor: str, forward: bool,
+                              max_rows: int, max_chars: int, render) -> tuple:
+        """
+        Читает через курсор одну страницу валют после (или до) anchor.
+
+        Строки идут с сервера порциями, и чтение останавливается, как только
+        страница набрала max_rows строк или max_chars символов в render(row),
+        поэтому память не зависит от размера таблицы. Возвращает
+        (строки страницы в порядке currency_name, есть ли ещё строки дальше).
+        """
+        name = "page_forward" if forward else "page_backward"
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows, size, has_more = [], 0, False
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            acquired = time.perf_counter()
+            async with conn.transaction(readonly=True):
+                cursor = conn.cursor(self.statements[name], anchor, pattern, max_rows + 1, prefetch=min(max_rows + 1, 100))
+                async for row in cursor:
+                    line = render(row)
+                    if len(rows) == max_rows or (rows and size + len(line) + 1 > max_chars):
+                        has_more = True
+                        break
+                    rows.append(row)
+                    size += len(line) + 1
+        self.timings[name].observe(time.perf_counter() - acquired)
+        self.pool_wait.observe(acquired - started)
+        if not forward:
+            rows.reverse()
+        return rows, has_more
+
+    async def list_admins(self) -> list:
+        """Пары (bot_id, chat_id); bot_id = 0 — администратор всех ботов."""
+        return [(r["bot_id"], r["chat_id"]) for r in await self._run("list_admins", "fetch")]
+
+    async def list_alerts(self) -> list:
+        return await self._run("list_alerts", "fetch")
+
+    async def add_alert(self, bot_id: int, chat_id: str, name: str, direction: str, threshold: Decimal) -> int:
+        return await self._run("add_alert", "fetchval", bot_id, chat_id, name, direction, threshold)
+
+    async def delete_alerts(self, ids: list) -> list:
+        """Удаляет уведомления и возвращает строки, которые действительно были удалены."""
+        return await self._run("delete_alerts", "fetch", ids)
+
+    async def delete_chat_alerts(self, bot_id: int, chat_id: str):
+        await self._run("delete_chat_alerts", "execute", bot_id, chat_id)
+
+    def report(self) -> str:
+        lines = [f"pool: размер {self.pool.get_size()}, свободно {self.pool.get_idle_size()}",
+                 f"ожидание соединения: {self.pool_wait.summary()}"]
+        for name, histogram in self.timings.items():
+            lines.append(f"{name}: {histogram.summary()}")
+        return "\n".join(lines)
+
+    async def close(self):
+        await self.pool.close()
+
+
+async def connect(dsn: str = DATABASE_URL) -> CurrencyRepository:
+    if is_sqlite(dsn):
+        # Кэш подготовленных запросов SQLite заполняется при первом выполнении
+        return CurrencyRepository(await get_pool(dsn), SQLITE_STATEMENTS, sqlite=True)
+    pool = await get_pool(dsn, connection_class=RepoConnection, init=prepare_statements)
+    return CurrencyRepository(pool)
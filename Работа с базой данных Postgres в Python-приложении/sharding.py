@@ -0,0 +1,319 @@
+"""
+Запуск bot.py в нескольких процессах с разбиением обновлений по чатам.
+
+Фронтальный процесс получает обновления (polling или webhook, как
+BOT_MODE в bot.py) и, не разбирая их в модели aiogram, отправляет каждое
+в процесс-обработчик по chat_id по модулю числа обработчиков. Обработчики —
+это тот же bot.py со своим диспетчером и своей долей пула соединений;
+обновления приходят им построчно в JSON через stdin, а раз в
+SHARD_REPORT_INTERVAL секунд они пишут в stdout счётчики, из которых
+фронт собирает нагрузку по обработчикам.
+
+Все обновления одного чата попадают в один процесс и одну трубу, а внутри
+процесса порядок держит ChatScheduler, поэтому порядок в чате сохраняется.
+
+    python sharding.py --workers 4
+"""
+import os
+import sys
+import json
+import signal
+import asyncio
+import logging
+import argparse
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 1)))
+SHARD_REPORT_INTERVAL = float(os.getenv("SHARD_REPORT_INTERVAL", "5"))
+# Сколько обновлений обработчик держит в работе, прежде чем перестать читать трубу
+SHARD_MAX_IN_FLIGHT = int(os.getenv("SHARD_MAX_IN_FLIGHT", "1000"))
+# Обновление Telegram может быть больше лимита строки StreamReader по умолчанию
+LINE_LIMIT = 16 * 1024 * 1024
+START = b"START\n"
+
+
+def route_key(data: dict) -> int:
+    """
+    chat_id обновления (или id пользователя, если чата нет) прямо из JSON —
+    тот же ключ, по которому aiogram выбирает контекст FSM.
+    """
+    for field, event in data.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat is not None:
+            return chat["id"]
+        user = event.get("from") or event.get("user")
+        if user is not None:
+            return user["id"]
+    return data.get("update_id", 0)
+
+
+class Worker:
+    """Процесс-обработчик и счётчики фронта по нему."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.routed = 0
+        self.report = {}
+        self.restarts = 0
+
+    @property
+    def backlog(self) -> int:
+        return self.routed - self.report.get("processed", 0) - self.report.get("failed", 0)
+
+    def stats(self) -> dict:
+        return {
+            "routed": self.routed,
+            "processed": self.report.get("processed", 0),
+            "failed": self.report.get("failed", 0),
+            "in_flight": self.report.get("in_flight", 0),
+            "backlog": self.backlog,
+            "pipe_bytes": self.process.stdin.transport.get_write_buffer_size() if self.process else 0,
+            "restarts": self.restarts,
+        }
+
+
+class ShardRouter:
+    """
+    Фронт: запускает обработчики и раскладывает обновления по их трубам.
+    Процессы стартуют параллельно, но startup (init_db, загрузка кэшей)
+    проходят по очереди: обработчик ждёт строку START из stdin, чтобы
+    init_db не выполнялся конкурентно. Обработчику достаётся
+    DB_POOL_MAX_SIZE / workers соединений, чтобы вместе они не превышали
+    настроенный размер пула.
+    """
+
+    def __init__(self, workers: int):
+        self.workers: List[Worker] = [Worker(i) for i in range(workers)]
+        self._readers = []
+        self._closing = False
+
+    def _worker_env(self) -> dict:
+        from db import DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+        max_size = max(1, DB_POOL_MAX_SIZE // len(self.workers))
+        return {
+            **os.environ,
+            "DB_POOL_MAX_SIZE": str(max_size),
+            "DB_POOL_MIN_SIZE": str(min(DB_POOL_MIN_SIZE, max_size)),
+        }
+
+    async def _spawn(self, worker: Worker):
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--worker",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=self._worker_env(),
+            limit=LINE_LIMIT,
+        )
+
+    async def _start_worker(self, worker: Worker):
+        worker.process.stdin.write(START)
+        line = await worker.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Обработчик {worker.index} завершился при запуске")
+        worker.report = json.loads(line)
+        self._readers.append(asyncio.create_task(self._read_reports(worker, worker.process)))
+
+    async def start(self):
+        await asyncio.gather(*(self._spawn(worker) for worker in self.workers))
+        for worker in self.workers:
+            await self._start_worker(worker)
+        logger.info(f"Запущено обработчиков: {len(self.workers)}")
+
+    async def _read_reports(self, worker: Worker, process: asyncio.subprocess.Process):
+        while line := await process.stdout.readline():
+            worker.report = json.loads(line)
+        if process.returncode is None:
+            await process.wait()
+        if process is worker.process and not self._closing:
+            # Обновления, оставшиеся в трубе упавшего процесса, потеряны
+            logger.error(f"Обработчик {worker.index} завершился с кодом {process.returncode}, перезапуск")
+            worker.restarts += 1
+            worker.routed = worker.report.get("processed", 0) + worker.report.get("failed", 0)
+            await self._spawn(worker)
+            await self._start_worker(worker)
+
+    async def route(self, data: dict):
+        """
+        Пишет обновление в трубу обработчика. Запись в буфер синхронна,
+        поэтому обновления уходят в трубу в порядке вызовов route, а drain
+        притормаживает приём, если обработчик не успевает.
+        """
+        worker = self.workers[route_key(data) % len(self.workers)]
+        stdin = worker.process.stdin
+        stdin.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode() + b"\n")
+        worker.routed += 1
+        try:
+            await stdin.drain()
+        except ConnectionResetError:
+            logger.error(f"Обработчик {worker.index} недоступен, обновление {data.get('update_id')} потеряно")
+
+    def stats(self) -> dict:
+        return {worker.index: worker.stats() for worker in self.workers}
+
+    def log_stats(self):
+        for index, stats in self.stats().items():
+            logger.info(f"Обработчик {index}: {stats}")
+
+    async def close(self):
+        """Закрывает stdin обработчиков: они дорабатывают принятое и выходят."""
+        self._closing = True
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                worker.process.stdin.close()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+        for worker in self.workers:
+            if worker.process is not None:
+                await worker.process.wait()
+
+
+async def poll(bot, router: ShardRouter, timeout: int = 30):
+    """Длинный опрос getUpdates без разбора обновлений в модели aiogram."""
+    url = bot.session.api.api_url(token=bot.token, method="getUpdates")
+    offset = None
+    async with aiohttp.ClientSession() as session:
+        while True:
+            params = {"timeout": timeout}
+            if offset is not None:
+                params["offset"] = offset
+            try:
+                async with session.post(url, data=params, timeout=aiohttp.ClientTimeout(total=timeout + 10)) as resp:
+                    payload = await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Не удалось получить обновления: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not payload.get("ok"):
+                logger.error(f"getUpdates: {payload.get('description')}")
+                await asyncio.sleep(1)
+                continue
+            for data in payload["result"]:
+                await router.route(data)
+                offset = data["update_id"] + 1
+
+
+async def report_loop(router: ShardRouter):
+    while True:
+        await asyncio.sleep(SHARD_REPORT_INTERVAL)
+        router.log_stats()
+
+
+async def run_front(workers: int, ready: Optional[asyncio.Event] = None):
+    import bot as app
+    from webhook import WebhookHandler
+
+    if len(app.bots) > 1:
+        raise ValueError("sharding.py раскладывает обновления одного бота: задайте BOT_TOKEN, а не BOT_TOKENS")
+    router = ShardRouter(workers)
+    await router.start()
+    if ready is not None:
+        ready.set()
+    reporter = asyncio.create_task(report_loop(router))
+    runner = None
+    try:
+        if app.BOT_MODE == "webhook":
+            web_app = web.Application()
+            handler = WebhookHandler(router.route, concurrency=app.WEBHOOK_CONCURRENCY,
+                                     secret_token=app.WEBHOOK_SECRET)
+            handler.register(web_app, app.WEBHOOK_PATH)
+            runner = web.AppRunner(web_app)
+            await runner.setup()
+            await web.TCPSite(runner, app.WEBAPP_HOST, app.WEBAPP_PORT).start()
+            await app.bot.set_webhook(app.WEBHOOK_URL + app.WEBHOOK_PATH, secret_token=app.WEBHOOK_SECRET)
+            await asyncio.Event().wait()
+        else:
+            await poll(app.bot, router)
+    finally:
+        reporter.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        await router.close()
+        router.log_stats()
+        await app.bot.session.close()
+
+
+async def run_worker():
+    """Обработчик: bot.py без собственного приёма обновлений."""
+    from aiogram.types import Update
+    import bot as app
+
+    # Останавливает фронт закрытием stdin, а не Ctrl+C всей группы процессов
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    counters = {"processed": 0, "failed": 0}
+    tasks = set()
+    has_room = asyncio.Event()
+    has_room.set()
+
+    def report():
+        try:
+            sys.stdout.write(json.dumps({**counters, "in_flight": len(tasks), "pid": os.getpid()}) + "\n")
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Фронт уже не читает отчёты — он завершается раньше обработчика
+            pass
+
+    def done(task: asyncio.Task):
+        tasks.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            if not task.cancelled():
+                logger.error(f"Ошибка обработки обновления: {task.exception()}")
+            counters["failed"] += 1
+        else:
+            counters["processed"] += 1
+        if len(tasks) < SHARD_MAX_IN_FLIGHT:
+            has_room.set()
+
+    async def report_loop():
+        while True:
+            await asyncio.sleep(min(SHARD_REPORT_INTERVAL, 1.0))
+            report()
+
+    if await reader.readline() != START:
+        return
+    await app.dp.emit_startup(bot=app.bot, dispatcher=app.dp)
+    report()
+    reporter = asyncio.create_task(report_loop())
+    try:
+        while line := await reader.readline():
+            update = Update.model_validate_json(line, context={"bot": app.bot})
+            # Задачи стартуют в порядке создания, порядок внутри чата держит ChatScheduler
+            task = asyncio.create_task(app.dp.feed_update(app.bot, update))
+            tasks.add(task)
+            task.add_done_callback(done)
+            if len(tasks) >= SHARD_MAX_IN_FLIGHT:
+                has_room.clear()
+                await has_room.wait()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        reporter.cancel()
+        await app.dp.emit_shutdown(bot=app.bot, dispatcher=app.dp)
+        await app.bot.session.close()
+        report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=SHARD_WORKERS, help="число процессов-обработчиков")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    try:
+        asyncio.run(run_worker() if args.worker else run_front(args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
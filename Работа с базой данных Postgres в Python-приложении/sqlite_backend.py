@@ -0,0 +1,285 @@
+"""
+Встроенный бэкенд SQLite с интерфейсом пула asyncpg.
+
+SqlitePool и SqliteConnection повторяют ту часть asyncpg, которой
+пользуются репозиторий и обработчики бота: acquire(), fetch/fetchval/
+fetchrow/execute/executemany, transaction() и cursor(). Параметры $1, $2
+переводятся в нумерованные ?1, ?2, поэтому один и тот же текст запроса
+подходит обоим бэкендам, если в нём нет синтаксиса PostgreSQL.
+"""
+import re
+import json
+import asyncio
+import logging
+import sqlite3
+from decimal import Decimal
+from typing import Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+PARAM_RE = re.compile(r"\$(\d+)")
+
+# Столбцы NUMERIC (в поставляемом database.db курс объявлен как REAL) читаются
+# как Decimal, как из asyncpg. Преобразование делают параметры и фабрика строк
+# каждого соединения, а не sqlite3.register_adapter/register_converter: те
+# меняли бы типы для всех соединений sqlite3 в процессе
+DECIMAL_COLUMNS = frozenset({"rate", "threshold"})
+
+
+def adapt(args) -> tuple:
+    """Параметры запроса: Decimal — строкой, список — JSON-ом для json_each."""
+    return tuple(
+        str(arg) if isinstance(arg, Decimal) else json.dumps(arg) if isinstance(arg, list) else arg
+        for arg in args
+    )
+
+
+def decimal_row_factory(columns=DECIMAL_COLUMNS):
+    """Фабрика строк sqlite3.Row, в которой числа столбцов columns — Decimal."""
+    def factory(cursor: sqlite3.Cursor, row: tuple) -> sqlite3.Row:
+        return sqlite3.Row(cursor, tuple(
+            Decimal(str(value)) if isinstance(value, (int, float)) and column[0] in columns else value
+            for column, value in zip(cursor.description, row)
+        ))
+    return factory
+
+
+def sqlite_path(url: str) -> str:
+    """sqlite:///relative.db → relative.db, sqlite:////abs/path.db → /abs/path.db."""
+    path = url[len("sqlite://"):]
+    return path[1:] if path.startswith("/") else path
+
+
+def translate(sql: str) -> str:
+    return PARAM_RE.sub(r"?\1", sql)
+
+
+async def connect(path: str, mmap_size: int = 0, statement_cache_size: int = 100,
+                  busy_timeout: int = 5000) -> "SqliteConnection":
+    conn = await aiosqlite.connect(
+        path,
+        isolation_level=None,
+        cached_statements=statement_cache_size,
+    )
+    conn.row_factory = decimal_row_factory()
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    await conn.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    return SqliteConnection(conn)
+
+
+class SqliteTransaction:
+    """
+    Транзакция в духе asyncpg: async with или start()/commit()/rollback().
+    Пишущие транзакции открываются BEGIN IMMEDIATE, чтобы блокировка записи
+    бралась сразу и чтение с последующей записью не упиралось в SQLITE_BUSY.
+    """
+
+    def __init__(self, conn: "SqliteConnection", readonly: bool = False):
+        self._conn = conn
+        self._readonly = readonly
+
+    async def start(self):
+        await self._conn._raw.execute("BEGIN" if self._readonly else "BEGIN IMMEDIATE")
+
+    async def commit(self):
+        await self._conn._raw.execute("COMMIT")
+
+    async def rollback(self):
+        await self._conn._raw.execute("ROLLBACK")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.rollback()
+
+
+class SqliteCursor:
+    """Асинхронный итератор по результату запроса, читающий порциями по prefetch строк."""
+
+    def __init__(self, conn: "SqliteConnection", sql: str, args: tuple, prefetch: int):
+        self._conn = conn
+        self._sql = sql
+        self._args = args
+        self._prefetch = prefetch
+
+    async def __aiter__(self):
+        cursor = await self._conn._raw.execute(translate(self._sql), adapt(self._args))
+        try:
+            while True:
+                rows = await cursor.fetchmany(self._prefetch)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row
+        finally:
+            await cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, raw: aiosqlite.Connection):
+        self._raw = raw
+
+    async def fetch(self, sql: str, *args) -> list:
+        return await self._raw.execute_fetchall(translate(sql), adapt(args))
+
+    async def fetchrow(self, sql: str, *args) -> Optional[sqlite3.Row]:
+        async with self._raw.execute(translate(sql), adapt(args)) as cursor:
+            return await cursor.fetchone()
+
+    async def fetchval(self, sql: str, *args):
+        row = await self.fetchrow(sql, *args)
+        return row[0] if row is not None else None
+
+    async def execute(self, sql: str, *args):
+        if not args:
+            # Как в asyncpg: без аргументов можно передать несколько команд
+            await self._raw.executescript(sql)
+            return
+        cursor = await self._raw.execute(translate(sql), adapt(args))
+        await cursor.close()
+
+    async def script(self, sql: str):
+        """
+        Выполняет несколько команд по одной в текущей транзакции: executescript
+        перед началом делает COMMIT и транзакцию миграции не сохранил бы.
+        Каждая команда должна заканчиваться «;» в конце строки.
+        """
+        statement = ""
+        for line in sql.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                cursor = await self._raw.execute(statement)
+                await cursor.close()
+                statement = ""
+
+    async def executemany(self, sql: str, args):
+        await self._raw.executemany(translate(sql), (adapt(row) for row in args))
+
+    def transaction(self, readonly: bool = False) -> SqliteTransaction:
+        return SqliteTransaction(self, readonly)
+
+    def cursor(self, sql: str, *args, prefetch: int = 50) -> SqliteCursor:
+        return SqliteCursor(self, sql, args, prefetch)
+
+    async def close(self):
+        await self._raw.close()
+
+
+class _Acquire:
+    def __init__(self, pool: "SqlitePool"):
+        self._pool = pool
+        self._conn = None
+
+    async def __aenter__(self) -> SqliteConnection:
+        self._conn = await self._pool._idle.get()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._pool._idle.put_nowait(self._conn)
+
+
+class SqlitePool:
+    """
+    Пул соединений к файлу SQLite с интерфейсом asyncpg.Pool.
+
+    В режиме WAL читатели не блокируют друг друга и писателя, поэтому
+    несколько соединений дают параллельное чтение; запись сериализуется
+    самой SQLite (busy_timeout). У каждого соединения свой кэш
+    подготовленных запросов sqlite3 (cached_statements), а mmap_size
+    позволяет читать страницы файла без копирования через read().
+    """
+
+    def __init__(self, path: str, size: int = 4, mmap_size: int = 256 * 1024 * 1024,
+                 statement_cache_size: int = 100, init=None):
+        self.path = path
+        self._size = size
+        self._mmap_size = mmap_size
+        self._statement_cache_size = statement_cache_size
+        self._init = init
+        self._conns = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+
+    async def start(self) -> "SqlitePool":
+        for _ in range(self._size):
+            conn = await connect(self.path, self._mmap_size, self._statement_cache_size)
+            if self._init is not None:
+                await self._init(conn)
+            self._conns.append(conn)
+            self._idle.put_nowait(conn)
+        return self
+
+    def acquire(self) -> _Acquire:
+        return _Acquire(self)
+
+    def get_size(self) -> int:
+        return len(self._conns)
+
+    def get_idle_size(self) -> int:
+        return self._idle.qsize()
+
+    async def close(self):
+        for conn in self._conns:
+            await conn.close()
+        self._conns = []
+
+
+class SqliteListener:
+    """
+    Замена PgListener для SQLite: LISTEN/NOTIFY здесь нет, поэтому
+    отдельное соединение раз в interval секунд читает PRAGMA data_version
+    и, если файл изменило другое соединение (в том числе add_admin.py или
+    другой процесс), вызывает reload-колбэки подписчиков. Собственные
+    изменения бот и так записывает в кэши сразу.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self._path = path
+        self._interval = interval
+        self._reloads = []
+        self._conn: Optional[SqliteConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+        self.reloads = 0
+
+    def subscribe(self, channel: str, handler, reload=None):
+        if reload is not None:
+            self._reloads.append(reload)
+
+    async def start(self):
+        self._conn = await connect(self._path)
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._conn is not None:
+            await self._conn.close()
+
+    async def _watch(self):
+        version = await self._conn.fetchval("PRAGMA data_version")
+        while True:
+            await asyncio.sleep(self._interval)
+            current = await self._conn.fetchval("PRAGMA data_version")
+            if current == version:
+                continue
+            version = current
+            self.reloads += 1
+            for reload in self._reloads:
+                try:
+                    await reload()
+                except Exception as e:
+                    logger.error(f"Ошибка полной перезагрузки кэша: {e}")
+
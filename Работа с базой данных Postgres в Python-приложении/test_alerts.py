@@ -0,0 +1,130 @@
+"""
+Тесты для уведомлений о курсах AlertIndex с использованием pytest
+"""
+
+import json
+from decimal import Decimal
+
+from alerts import ABOVE, BELOW, Alert, AlertIndex, parse_alert
+
+
+def alert(alert_id, threshold, direction=ABOVE, name="USD", chat_id="1", bot_id=0):
+    return Alert(alert_id, bot_id, chat_id, name, direction, Decimal(threshold))
+
+
+def make_index(*alerts):
+    index = AlertIndex()
+    for a in alerts:
+        index.add(a)
+    return index
+
+
+def ids(alerts):
+    return sorted(a.id for a in alerts)
+
+
+class TestParseAlert:
+    """Тесты разбора уведомления"""
+
+    def test_above_and_below(self):
+        """Тест «выше» и «ниже» с запятой и без пробелов"""
+        assert parse_alert("usd > 100") == ("USD", ABOVE, Decimal("100"))
+        assert parse_alert("EUR<90,5") == ("EUR", BELOW, Decimal("90.5"))
+
+    def test_invalid(self):
+        """Тест некорректных уведомлений"""
+        for text in ("USD = 100", "USD >", "> 100", "USD > 0", "USD > -1"):
+            assert parse_alert(text) is None
+
+
+class TestCrossedAbove:
+    """Тесты порогов «выше»"""
+
+    def test_rise_crosses(self):
+        """Тест роста курса: срабатывают пороги из [old, new)"""
+        index = make_index(alert(1, "90"), alert(2, "95"), alert(3, "100"), alert(4, "105"))
+        assert ids(index.crossed("USD", Decimal("90"), Decimal("100"))) == [1, 2]
+
+    def test_new_equal_threshold(self):
+        """Тест: курс, ставший равным порогу, ещё не выше него"""
+        index = make_index(alert(1, "100"))
+        assert index.crossed("USD", Decimal("99"), Decimal("100")) == []
+        assert ids(index.crossed("USD", Decimal("100"), Decimal("100.01"))) == [1]
+
+    def test_fall_does_not_fire_above(self):
+        """Тест: падение курса не срабатывает для «выше»"""
+        index = make_index(alert(1, "95"))
+        assert index.crossed("USD", Decimal("100"), Decimal("90")) == []
+
+    def test_same_threshold_several_alerts(self):
+        """Тест нескольких уведомлений с одинаковым порогом"""
+        index = make_index(alert(1, "95"), alert(2, "95", chat_id="2"), alert(3, "95", chat_id="3"))
+        assert ids(index.crossed("USD", Decimal("94"), Decimal("96"))) == [1, 2, 3]
+
+
+class TestCrossedBelow:
+    """Тесты порогов «ниже»"""
+
+    def test_fall_crosses(self):
+        """Тест падения курса: срабатывают пороги из (new, old]"""
+        index = make_index(alert(1, "90", BELOW), alert(2, "95", BELOW), alert(3, "100", BELOW), alert(4, "85", BELOW))
+        assert ids(index.crossed("USD", Decimal("100"), Decimal("90"))) == [2, 3]
+
+    def test_same_threshold_several_alerts(self):
+        """Тест нескольких уведомлений с одинаковым порогом"""
+        index = make_index(alert(1, "95", BELOW), alert(2, "95", BELOW, chat_id="2"))
+        assert ids(index.crossed("USD", Decimal("96"), Decimal("94"))) == [1, 2]
+
+    def test_rise_does_not_fire_below(self):
+        """Тест: рост курса не срабатывает для «ниже»"""
+        index = make_index(alert(1, "95", BELOW))
+        assert index.crossed("USD", Decimal("90"), Decimal("100")) == []
+
+
+class TestCrossedOther:
+    """Тесты прочих случаев пересечения"""
+
+    def test_unchanged_rate(self):
+        """Тест неизменившегося курса"""
+        index = make_index(alert(1, "95"), alert(2, "95", BELOW))
+        assert index.crossed("USD", Decimal("95"), Decimal("95")) == []
+
+    def test_other_currency(self):
+        """Тест: уведомления другой валюты не срабатывают"""
+        index = make_index(alert(1, "95", name="EUR"))
+        assert index.crossed("USD", Decimal("90"), Decimal("100")) == []
+
+    def test_removed_alert(self):
+        """Тест удалённого уведомления"""
+        index = make_index(alert(1, "95"), alert(2, "95", chat_id="2"))
+        index.remove(1)
+        assert ids(index.crossed("USD", Decimal("90"), Decimal("100"))) == [2]
+        index.remove(2)
+        assert index.crossed("USD", Decimal("90"), Decimal("100")) == []
+        assert index.stats()["size"] == 0
+
+
+class TestAlertIndexMaintenance:
+    """Тесты добавления, удаления и уведомлений триггера"""
+
+    def test_add_idempotent(self):
+        """Тест повторного добавления того же уведомления"""
+        index = make_index(alert(1, "95"), alert(1, "95"))
+        assert ids(index.crossed("USD", Decimal("90"), Decimal("100"))) == [1]
+
+    def test_for_chat(self):
+        """Тест списка уведомлений чата в своём боте"""
+        index = make_index(alert(1, "95", name="USD"), alert(2, "90", name="EUR"),
+                           alert(3, "80", chat_id="2"), alert(4, "70", bot_id=5))
+        assert [a.id for a in index.for_chat(0, "1")] == [2, 1]
+        assert [a.id for a in index.for_chat(5, "1")] == [4]
+
+    def test_apply_insert_and_delete(self):
+        """Тест уведомлений триггера INSERT и DELETE"""
+        index = AlertIndex()
+        index.apply(json.dumps({"op": "INSERT", "id": 1, "bot_id": 0, "chat_id": "1",
+                                "currency_name": "USD", "direction": ABOVE, "threshold": 95.5}))
+        assert ids(index.crossed("USD", Decimal("95"), Decimal("96"))) == [1]
+        assert index.for_chat(0, "1")[0].threshold == Decimal("95.5")
+        index.apply(json.dumps({"op": "DELETE", "id": 1}))
+        assert index.crossed("USD", Decimal("95"), Decimal("96")) == []
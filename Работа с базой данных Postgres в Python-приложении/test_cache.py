@@ -0,0 +1,100 @@
+"""
+Тесты для кэшей RateCache и AdminCache с использованием pytest
+"""
+
+import json
+import asyncio
+from decimal import Decimal
+
+from cache import RateCache, AdminCache
+
+
+class FakeRepo:
+    """Репозиторий, который во время SELECT отдаёт управление и даёт прийти уведомлению"""
+
+    def __init__(self, currencies=(), admins=(), during=None):
+        self.currencies = list(currencies)
+        self.admins = list(admins)
+        self.during = during
+
+    async def _select(self, rows):
+        # Снимок сделан до того, как изменение из during закоммичено
+        snapshot = list(rows)
+        if self.during:
+            self.during()
+        await asyncio.sleep(0)
+        return snapshot
+
+    async def list_currencies(self):
+        return await self._select(self.currencies)
+
+    async def list_admins(self):
+        return await self._select(self.admins)
+
+
+def rate_event(op, name, rate=None, old_name=None):
+    return json.dumps({"op": op, "currency_name": name, "old_name": old_name, "rate": rate})
+
+
+class TestRateCacheLoad:
+    """Тесты загрузки RateCache"""
+
+    def test_load(self):
+        """Тест загрузки курсов"""
+        cache = RateCache()
+        repo = FakeRepo(currencies=[{"currency_name": "USD", "rate": Decimal("90.5")}])
+        asyncio.run(cache.load(repo))
+        assert cache.get("USD") == Decimal("90.5")
+        assert cache.reloads == 1
+
+    def test_notification_during_load_replayed(self):
+        """Тест изменения, пришедшего во время загрузки: оно не теряется"""
+        cache = RateCache()
+        repo = FakeRepo(currencies=[{"currency_name": "USD", "rate": Decimal("90")}])
+        repo.during = lambda: cache.apply(rate_event("UPDATE", "USD", 91, old_name="USD"))
+        asyncio.run(cache.load(repo))
+        assert cache.get("USD") == Decimal("91")
+
+    def test_insert_during_load_replayed(self):
+        """Тест валюты, добавленной во время загрузки"""
+        cache = RateCache()
+        repo = FakeRepo()
+        repo.during = lambda: cache.apply(rate_event("INSERT", "EUR", 100))
+        asyncio.run(cache.load(repo))
+        assert cache.get("EUR") == Decimal("100")
+
+    def test_delete_during_load_replayed(self):
+        """Тест валюты, удалённой во время загрузки"""
+        cache = RateCache()
+        repo = FakeRepo(currencies=[{"currency_name": "USD", "rate": Decimal("90")}])
+        repo.during = lambda: cache.apply(rate_event("DELETE", "USD", old_name="USD"))
+        asyncio.run(cache.load(repo))
+        assert cache.get("USD") is None
+
+    def test_no_buffer_after_load(self):
+        """Тест: после загрузки уведомления больше не копятся"""
+        cache = RateCache()
+        asyncio.run(cache.load(FakeRepo()))
+        cache.apply(rate_event("INSERT", "EUR", 100))
+        assert cache._pending is None
+        assert cache.get("EUR") == Decimal("100")
+
+
+class TestAdminCacheLoad:
+    """Тесты загрузки AdminCache"""
+
+    def test_grant_during_load_replayed(self):
+        """Тест права, выданного во время загрузки"""
+        cache = AdminCache()
+        repo = FakeRepo()
+        repo.during = lambda: cache.apply(json.dumps({"op": "INSERT", "bot_id": 0, "chat_id": "42"}))
+        asyncio.run(cache.load(repo))
+        assert cache.check("42")
+
+    def test_revoke_during_load_replayed(self):
+        """Тест права, отозванного во время загрузки"""
+        cache = AdminCache()
+        repo = FakeRepo(admins=[(0, "42")])
+        repo.during = lambda: cache.apply(json.dumps({"op": "DELETE", "bot_id": 0, "chat_id": "42"}))
+        asyncio.run(cache.load(repo))
+        assert not cache.check("42")
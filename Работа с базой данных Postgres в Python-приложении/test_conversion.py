@@ -0,0 +1,158 @@
+"""
+Тесты для пересчёта валют и разбора курсов с использованием pytest
+"""
+
+from decimal import Decimal, InvalidOperation
+
+import pytest
+
+from conversion import MAX_AMOUNT, parse_amount, parse_rate, parse_request, convert_many
+from currency_import import parse_rates
+
+RATES = {"USD": Decimal("90"), "EUR": Decimal("100"), "JPY": Decimal("0.6")}
+
+
+class TestParseAmount:
+    """Тесты разбора суммы"""
+
+    def test_valid(self):
+        """Тест корректной суммы, в том числе с запятой"""
+        assert parse_amount("100") == Decimal("100")
+        assert parse_amount(" 2,5 ") == Decimal("2.5")
+
+    def test_not_positive(self):
+        """Тест нулевой и отрицательной суммы"""
+        with pytest.raises(InvalidOperation):
+            parse_amount("0")
+        with pytest.raises(InvalidOperation):
+            parse_amount("-1")
+
+    def test_not_finite(self):
+        """Тест бесконечности и NaN"""
+        for text in ("Infinity", "NaN", "1e400000000"):
+            with pytest.raises(InvalidOperation):
+                parse_amount(text)
+
+    def test_too_large(self):
+        """Тест суммы больше MAX_AMOUNT"""
+        assert parse_amount(str(MAX_AMOUNT)) == MAX_AMOUNT
+        with pytest.raises(InvalidOperation):
+            parse_amount("1" + "0" * 30)
+
+
+class TestParseRate:
+    """Тесты разбора курса"""
+
+    def test_valid(self):
+        """Тест корректного курса"""
+        assert parse_rate("92,15") == Decimal("92.15")
+        assert parse_rate(Decimal("0.5")) == Decimal("0.5")
+
+    def test_invalid(self):
+        """Тест нулевого, отрицательного, бесконечного курса и не числа"""
+        for text in ("0", "-5", "NaN", "inf", "abc", ""):
+            with pytest.raises(InvalidOperation):
+                parse_rate(text)
+
+
+class TestParseRequest:
+    """Тесты разбора запроса конвертации"""
+
+    def test_amount_after_currency(self):
+        """Тест формы «USD 100 EUR»"""
+        assert parse_request("usd 100 eur") == (Decimal("100"), "USD", ["EUR"])
+
+    def test_amount_first_default_target(self):
+        """Тест формы «100 USD»: по умолчанию в рубли"""
+        assert parse_request("100 USD") == (Decimal("100"), "USD", ["RUB"])
+
+    def test_duplicate_targets(self):
+        """Тест повторов целевых валют"""
+        assert parse_request("USD 1 EUR JPY EUR")[2] == ["EUR", "JPY"]
+
+    def test_invalid(self):
+        """Тест некорректных запросов"""
+        assert parse_request("USD") is None
+        assert parse_request("USD EUR") is None
+        assert parse_request("USD 0") is None
+        assert parse_request("USD 1" + "0" * 30) is None
+
+
+class TestConvertMany:
+    """Тесты пересчёта в несколько валют"""
+
+    def test_to_rub(self):
+        """Тест пересчёта в рубли"""
+        assert convert_many(RATES, Decimal("2"), "USD", ["RUB"]) == (True, [("RUB", Decimal("180.00"))])
+
+    def test_cross(self):
+        """Тест кросс-курса через рубль с округлением до копеек"""
+        found, results = convert_many(RATES, Decimal("100"), "USD", ["EUR", "JPY"])
+        assert found
+        assert results == [("EUR", Decimal("90.00")), ("JPY", Decimal("15000.00"))]
+
+    def test_from_rub(self):
+        """Тест пересчёта из рублей"""
+        assert convert_many(RATES, Decimal("45"), "RUB", ["USD"]) == (True, [("USD", Decimal("0.50"))])
+
+    def test_unknown_source(self):
+        """Тест неизвестной исходной валюты"""
+        assert convert_many(RATES, Decimal("1"), "XXX", ["RUB"]) == (False, [])
+
+    def test_unknown_target(self):
+        """Тест неизвестной целевой валюты"""
+        assert convert_many(RATES, Decimal("1"), "USD", ["XXX", "EUR"]) == (True, [("XXX", None), ("EUR", Decimal("0.90"))])
+
+    def test_zero_rate(self):
+        """Тест нулевого курса целевой валюты"""
+        with pytest.raises(ArithmeticError):
+            convert_many({"USD": Decimal("90"), "BAD": Decimal("0")}, Decimal("1"), "USD", ["BAD"])
+
+    def test_overflow(self):
+        """Тест результата, который не округлить до копеек"""
+        with pytest.raises(ArithmeticError):
+            convert_many({"BIG": Decimal("1e20")}, MAX_AMOUNT, "BIG", ["RUB"])
+
+
+class TestParseRates:
+    """Тесты разбора списка курсов для импорта"""
+
+    def test_lines(self):
+        """Тест многострочного сообщения с разными разделителями"""
+        records, rejected = parse_rates("usd 92.1\nEUR;100,5\nJPY: 0.6\nCNY=12")
+        assert records == [("USD", Decimal("92.1")), ("EUR", Decimal("100.5")),
+                           ("JPY", Decimal("0.6")), ("CNY", Decimal("12"))]
+        assert rejected == []
+
+    def test_csv_header_skipped(self):
+        """Тест CSV с заголовком"""
+        records, rejected = parse_rates("currency_name,rate\nUSD,92.1\n")
+        assert records == [("USD", Decimal("92.1"))]
+        assert rejected == []
+
+    def test_json_list(self):
+        """Тест JSON-списка"""
+        records, rejected = parse_rates('[{"currency_name": "usd", "rate": 92.1}, {"rate": 1}]')
+        assert records == [("USD", Decimal("92.1"))]
+        assert rejected == ['{"rate": 1}']
+
+    def test_json_object(self):
+        """Тест JSON-объекта «валюта: курс»"""
+        records, rejected = parse_rates('{"USD": 92.1, "EUR": "100,5"}')
+        assert records == [("USD", Decimal("92.1")), ("EUR", Decimal("100.5"))]
+
+    def test_broken_json(self):
+        """Тест некорректного JSON"""
+        assert parse_rates("[{") == ([], ["[{"])
+
+    def test_rejected(self):
+        """Тест отклонённых строк: нулевой курс, длинное имя, мусор"""
+        long_name = "X" * 51
+        records, rejected = parse_rates(f"USD 0\n{long_name} 1\nпривет\nEUR 100")
+        assert records == [("EUR", Decimal("100"))]
+        assert rejected == ["USD 0", f"{long_name} 1", "привет"]
+
+    def test_last_duplicate_wins(self):
+        """Тест повтора валюты: побеждает последняя строка"""
+        records, _ = parse_rates("USD 90\nEUR 100\nUSD 91")
+        assert records == [("EUR", Decimal("100")), ("USD", Decimal("91"))]
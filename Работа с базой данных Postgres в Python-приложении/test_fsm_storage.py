@@ -0,0 +1,188 @@
+"""
+Тесты для хранилища FSM PgStorage с использованием pytest
+"""
+
+import asyncio
+from decimal import Decimal
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import PgStorage, _Record, encode_data, decode_data
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, sql, keys, states, blobs, versions, channel, origin):
+        self.pool.batches.append(dict(zip(keys, zip(states, blobs, versions))))
+        if self.pool.during:
+            self.pool.during()
+        await asyncio.sleep(0)
+        if self.pool.error:
+            raise self.pool.error
+        return [{"key": key} for key in keys if key not in self.pool.conflicts]
+
+
+class FakeAcquire:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        return FakeConnection(self.pool)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    """Пул, который запоминает пачки и отвечает на них без базы"""
+
+    def __init__(self):
+        self.batches = []
+        self.conflicts = set()
+        self.error = None
+        self.during = None
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+
+def make_storage():
+    storage = PgStorage()
+    storage._pool = FakePool()
+    return storage
+
+
+def storage_key(chat_id=1):
+    return StorageKey(bot_id=42, chat_id=chat_id, user_id=chat_id)
+
+
+def put(storage, key, state=None, data=None):
+    """Кладёт запись в локальный слой, как после чтения пустой строки из базы"""
+    storage._local[storage._key(key)] = _Record(state, data or {}, 0)
+
+
+class TestEncodeData:
+    """Тесты кодирования данных FSM"""
+
+    def test_empty(self):
+        """Тест пустого словаря: 0 байт"""
+        assert encode_data({}) == b""
+        assert decode_data(b"") == {}
+        assert decode_data(None) == {}
+
+    def test_scalars_roundtrip(self):
+        """Тест скалярных значений"""
+        data = {"none": None, "yes": True, "no": False, "int": 7, "negative": -300,
+                "big": 2 ** 70, "float": 1.25, "text": "привет", "bytes": b"\x00\xff",
+                "decimal": Decimal("90.123456")}
+        assert decode_data(encode_data(data)) == data
+
+    def test_nested_roundtrip(self):
+        """Тест вложенных списков и словарей"""
+        data = {"items": [1, "два", [3.0, None]], "inner": {"rate": Decimal("1.5"), "list": []}}
+        assert decode_data(encode_data(data)) == data
+
+    def test_tuple_becomes_list(self):
+        """Тест кортежа: читается обратно как список"""
+        assert decode_data(encode_data({"t": (1, 2)})) == {"t": [1, 2]}
+
+    def test_bool_not_int(self):
+        """Тест: True и False не превращаются в 1 и 0"""
+        decoded = decode_data(encode_data({"flag": True, "n": 1}))
+        assert decoded["flag"] is True
+        assert decoded["n"] == 1 and decoded["n"] is not True
+
+    def test_unsupported_type(self):
+        """Тест неподдерживаемого типа"""
+        with pytest.raises(TypeError):
+            encode_data({"set": {1, 2}})
+
+    def test_unknown_tag(self):
+        """Тест неизвестного тега при чтении"""
+        with pytest.raises(ValueError):
+            decode_data(b"\x63")
+
+
+class TestFlush:
+    """Тесты сброса изменений пачкой"""
+
+    def test_flush_writes_and_cleans(self):
+        """Тест записи пачки: записи становятся чистыми и получают новую версию"""
+        storage = make_storage()
+        key = storage_key()
+        put(storage, key)
+        asyncio.run(storage.set_data(key, {"amount": 5}))
+        asyncio.run(storage.flush())
+        record = storage._local[storage._key(key)]
+        assert not record.dirty
+        assert record.version == 1
+        assert storage._dirty == set()
+        state, blob, version = storage._pool.batches[0][storage._key(key)]
+        assert decode_data(blob) == {"amount": 5}
+
+    def test_failed_flush_keeps_dirty(self):
+        """Тест ошибки записи: записи остаются грязными и уходят в следующую пачку"""
+        storage = make_storage()
+        key = storage_key()
+        put(storage, key)
+        asyncio.run(storage.set_state(key, "Form:amount"))
+        storage._pool.error = ConnectionError("нет соединения")
+        with pytest.raises(ConnectionError):
+            asyncio.run(storage.flush())
+        record = storage._local[storage._key(key)]
+        assert record.dirty
+        assert record.version == 0
+        assert storage._key(key) in storage._dirty
+        storage._pool.error = None
+        asyncio.run(storage.flush())
+        assert not record.dirty
+        assert record.version == 1
+
+    def test_change_during_flush_stays_dirty(self):
+        """Тест изменения, сделанного, пока пачка пишется: оно не теряется"""
+        storage = make_storage()
+        key = storage_key()
+        put(storage, key)
+
+        async def scenario():
+            await storage.set_data(key, {"step": 1})
+            storage._pool.during = lambda: asyncio.ensure_future(storage.set_data(key, {"step": 2}))
+            await storage.flush()
+            storage._pool.during = None
+            await asyncio.sleep(0)
+
+        asyncio.run(scenario())
+        record = storage._local[storage._key(key)]
+        assert record.dirty
+        assert record.version == 1
+        assert storage._key(key) in storage._dirty
+        asyncio.run(storage.flush())
+        assert not record.dirty
+        assert decode_data(storage._pool.batches[-1][storage._key(key)][1]) == {"step": 2}
+
+    def test_encode_error_isolated(self):
+        """Тест некодируемых данных: отбрасывается только своя запись"""
+        storage = make_storage()
+        good, bad = storage_key(1), storage_key(2)
+        put(storage, good)
+        put(storage, bad)
+        asyncio.run(storage.set_data(good, {"ok": True}))
+        asyncio.run(storage.set_data(bad, {"bad": object()}))
+        asyncio.run(storage.flush())
+        assert list(storage._pool.batches[0]) == [storage._key(good)]
+        assert storage._key(bad) not in storage._local
+        assert not storage._local[storage._key(good)].dirty
+
+    def test_conflict_drops_local_copy(self):
+        """Тест конфликта версий: локальная копия отбрасывается"""
+        storage = make_storage()
+        key = storage_key()
+        put(storage, key)
+        asyncio.run(storage.set_state(key, "Form:amount"))
+        storage._pool.conflicts.add(storage._key(key))
+        asyncio.run(storage.flush())
+        assert storage._key(key) not in storage._local
+        assert storage.conflicts == 1
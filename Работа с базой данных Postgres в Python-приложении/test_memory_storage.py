@@ -0,0 +1,121 @@
+"""
+Тесты для хранилища FSM BoundedMemoryStorage с использованием pytest
+"""
+
+import asyncio
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+import memory_storage
+from memory_storage import BoundedMemoryStorage
+
+
+class Form(StatesGroup):
+    amount = State()
+
+
+def key(chat_id):
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Подменённое time.monotonic: тест сам двигает время"""
+    now = [0.0]
+    monkeypatch.setattr(memory_storage.time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestRoundTrip:
+    """Тесты записи и чтения состояния и данных"""
+
+    def test_state_and_data(self, clock):
+        """Тест: состояние и данные читаются такими, как записаны"""
+        storage = BoundedMemoryStorage()
+
+        async def scenario():
+            await storage.set_state(key(1), Form.amount)
+            await storage.set_data(key(1), {"currency": "USD", "rate": 90})
+            return await storage.get_state(key(1)), await storage.get_data(key(1))
+
+        assert asyncio.run(scenario()) == (Form.amount.state, {"currency": "USD", "rate": 90})
+        assert asyncio.run(storage.get_state(key(2))) is None
+        assert asyncio.run(storage.get_data(key(2))) == {}
+
+    def test_clear_removes_entry(self, clock):
+        """Тест: state.clear() удаляет запись целиком"""
+        storage = BoundedMemoryStorage()
+        state = FSMContext(storage, key(1))
+
+        async def scenario():
+            await state.set_state(Form.amount)
+            await state.update_data(currency="USD")
+            assert storage.stats()["live"] == 1
+            await state.clear()
+
+        asyncio.run(scenario())
+        assert storage.stats()["live"] == 0
+
+    def test_empty_writes_not_stored(self, clock):
+        """Тест: пустое состояние и пустые данные для нового ключа не создают запись"""
+        storage = BoundedMemoryStorage()
+
+        async def scenario():
+            await storage.set_state(key(1), None)
+            await storage.set_data(key(1), {})
+
+        asyncio.run(scenario())
+        assert storage.stats()["live"] == 0
+
+
+class TestExpiry:
+    """Тесты истечения простоя"""
+
+    def test_expired_from_head(self, clock):
+        """Тест: простоявшие дольше ttl записи снимаются, остальные остаются"""
+        storage = BoundedMemoryStorage(ttl=10)
+
+        async def scenario():
+            await storage.set_state(key(1), Form.amount)
+            clock[0] = 5
+            await storage.set_state(key(2), Form.amount)
+            clock[0] = 12
+            return await storage.get_state(key(1)), await storage.get_state(key(2))
+
+        assert asyncio.run(scenario()) == (None, Form.amount.state)
+        assert storage.stats() == {"live": 1, "expired": 1, "evicted": 0}
+
+    def test_access_extends_ttl(self, clock):
+        """Тест: чтение продлевает жизнь записи"""
+        storage = BoundedMemoryStorage(ttl=10)
+
+        async def scenario():
+            await storage.set_state(key(1), Form.amount)
+            clock[0] = 8
+            await storage.get_state(key(1))
+            clock[0] = 16
+            return await storage.get_state(key(1))
+
+        assert asyncio.run(scenario()) == Form.amount.state
+        assert storage.expired == 0
+
+
+class TestEviction:
+    """Тесты вытеснения сверх max_entries"""
+
+    def test_lru_evicted(self, clock):
+        """Тест: вытесняется давнее всего использованная запись"""
+        storage = BoundedMemoryStorage(max_entries=2)
+
+        async def scenario():
+            await storage.set_state(key(1), Form.amount)
+            await storage.set_state(key(2), Form.amount)
+            await storage.get_state(key(1))
+            await storage.set_state(key(3), Form.amount)
+            return [await storage.get_state(key(chat_id)) for chat_id in (1, 2, 3)]
+
+        assert asyncio.run(scenario()) == [Form.amount.state, None, Form.amount.state]
+        assert storage.stats() == {"live": 2, "expired": 0, "evicted": 1}
@@ -0,0 +1,104 @@
+"""
+Тесты для миграций схемы SQLite с использованием pytest
+"""
+
+import asyncio
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from migrations import SQLITE_MIGRATIONS, Migration, migrate_sqlite
+
+BUNDLED = Path(__file__).resolve().parent / "database.db"
+
+
+def applied(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT version, description FROM schema_version ORDER BY version").fetchall()
+    finally:
+        conn.close()
+
+
+def columns(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    finally:
+        conn.close()
+
+
+class TestMigrateSqlite:
+    """Тесты применения миграций SQLite"""
+
+    def test_fresh_file(self, tmp_path):
+        """Тест новой базы: применяются все миграции"""
+        path = str(tmp_path / "bot.db")
+        assert asyncio.run(migrate_sqlite(path)) == SQLITE_MIGRATIONS[-1].version
+        assert [version for version, _ in applied(path)] == [m.version for m in SQLITE_MIGRATIONS]
+        assert {"bot_id", "chat_id"} <= columns(path, "admins")
+        assert "threshold" in columns(path, "rate_alerts")
+
+    def test_second_run_applies_nothing(self, tmp_path):
+        """Тест повторного запуска: версия уже последняя, ни один шаг не выполняется"""
+        path = str(tmp_path / "bot.db")
+        calls = []
+
+        async def step(conn):
+            calls.append(2)
+            await conn.script("CREATE TABLE extra (id INTEGER PRIMARY KEY);")
+
+        migrations = SQLITE_MIGRATIONS + [Migration(2, "extra", step)]
+        assert asyncio.run(migrate_sqlite(path, migrations)) == 2
+        rows = applied(path)
+        assert asyncio.run(migrate_sqlite(path, migrations)) == 2
+        assert applied(path) == rows
+        assert calls == [2]
+
+    def test_only_new_steps_applied(self, tmp_path):
+        """Тест: на базе с версией 1 выполняется только новая миграция"""
+        path = str(tmp_path / "bot.db")
+        asyncio.run(migrate_sqlite(path))
+        calls = []
+
+        async def baseline(conn):
+            calls.append(1)
+
+        async def step(conn):
+            calls.append(2)
+
+        migrations = [Migration(1, SQLITE_MIGRATIONS[0].description, baseline), Migration(2, "extra", step)]
+        assert asyncio.run(migrate_sqlite(path, migrations)) == 2
+        assert calls == [2]
+        assert [version for version, _ in applied(path)] == [1, 2]
+
+    def test_failed_step_rolled_back(self, tmp_path):
+        """Тест: упавшая миграция не оставляет ни изменений, ни версии"""
+        path = str(tmp_path / "bot.db")
+        asyncio.run(migrate_sqlite(path))
+
+        async def broken(conn):
+            await conn.script("CREATE TABLE half (id INTEGER PRIMARY KEY);")
+            raise RuntimeError("ошибка миграции")
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(migrate_sqlite(path, SQLITE_MIGRATIONS + [Migration(2, "broken", broken)]))
+        assert [version for version, _ in applied(path)] == [1]
+        assert columns(path, "half") == set()
+
+    def test_bundled_database_upgraded(self, tmp_path):
+        """Тест поставляемого database.db: admins получает bot_id, данные сохраняются"""
+        path = str(tmp_path / "database.db")
+        shutil.copy(BUNDLED, path)
+        conn = sqlite3.connect(path)
+        admins = conn.execute("SELECT id, chat_id FROM admins ORDER BY id").fetchall()
+        conn.close()
+        asyncio.run(migrate_sqlite(path))
+        assert "bot_id" in columns(path, "admins")
+        conn = sqlite3.connect(path)
+        try:
+            assert conn.execute("SELECT id, chat_id FROM admins ORDER BY id").fetchall() == admins
+        finally:
+            conn.close()
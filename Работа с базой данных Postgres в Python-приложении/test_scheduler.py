@@ -0,0 +1,137 @@
+"""
+Тесты для очередей обновлений ChatScheduler с использованием pytest
+"""
+
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+
+from scheduler import ChatScheduler
+
+
+class Form(StatesGroup):
+    amount = State()
+
+
+class SlowStorage(MemoryStorage):
+    """Хранилище, чтение состояния из которого занимает время, как запрос к базе"""
+
+    def __init__(self, delays):
+        super().__init__()
+        self.delays = list(delays)
+
+    async def get_state(self, key):
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        return await super().get_state(key)
+
+
+def message(update_id, text, chat_id=7):
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "user"},
+            "text": text,
+        },
+    })
+
+
+def key(chat_id):
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+class TestChatOrder:
+    """Тесты порядка обновлений чата"""
+
+    def test_state_read_after_previous_update(self):
+        """Тест: второе сообщение видит состояние, установленное первым"""
+        seen = []
+
+        async def scenario():
+            # Первое чтение состояния медленнее второго: без очереди второе
+            # сообщение прочитало бы состояние раньше, чем первое его изменит
+            dp = Dispatcher(storage=SlowStorage([0.05, 0]), events_isolation=ChatScheduler())
+
+            @dp.message(Command("convert"))
+            async def start(msg: Message, state: FSMContext):
+                seen.append("start")
+                await state.set_state(Form.amount)
+
+            @dp.message(StateFilter(Form.amount))
+            async def amount(msg: Message, state: FSMContext):
+                seen.append("amount")
+                await state.clear()
+
+            @dp.message()
+            async def other(msg: Message):
+                seen.append("other")
+
+            bot = Bot("1:TEST")
+            await asyncio.gather(dp.feed_update(bot, message(1, "/convert")),
+                                 dp.feed_update(bot, message(2, "100")))
+            await bot.session.close()
+
+        asyncio.run(scenario())
+        assert seen == ["start", "amount"]
+
+
+class TestChatSchedulerLock:
+    """Тесты блокировки ChatScheduler"""
+
+    def test_fifo_within_chat(self):
+        """Тест: обновления одного чата выполняются по одному в порядке прихода"""
+        scheduler = ChatScheduler()
+        order = []
+
+        async def work(n, delay):
+            async with scheduler.lock(key(1)):
+                order.append(("start", n))
+                await asyncio.sleep(delay)
+                order.append(("end", n))
+
+        async def scenario():
+            await asyncio.gather(work(1, 0.02), work(2, 0), work(3, 0))
+
+        asyncio.run(scenario())
+        assert order == [("start", 1), ("end", 1), ("start", 2), ("end", 2), ("start", 3), ("end", 3)]
+        assert scheduler.stats()["processed"] == 3
+        assert scheduler.chat_stats(1)["max_depth"] == 3
+
+    def test_concurrency_limit(self):
+        """Тест общего лимита параллельности для разных чатов"""
+        scheduler = ChatScheduler(concurrency=2)
+        peak = []
+
+        async def work(chat_id):
+            async with scheduler.lock(key(chat_id)):
+                peak.append(scheduler.running)
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            await asyncio.gather(*(work(chat_id) for chat_id in range(6)))
+
+        asyncio.run(scenario())
+        assert max(peak) == 2
+        assert scheduler.stats()["running"] == 0
+
+    def test_idle_chats_evicted(self):
+        """Тест вытеснения пустых очередей сверх max_chats"""
+        scheduler = ChatScheduler(max_chats=2)
+
+        async def scenario():
+            for chat_id in range(5):
+                async with scheduler.lock(key(chat_id)):
+                    pass
+
+        asyncio.run(scenario())
+        assert scheduler.stats()["chats"] == 2
+        assert scheduler.chat_stats(0) is None
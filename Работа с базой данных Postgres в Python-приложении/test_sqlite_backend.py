@@ -0,0 +1,123 @@
+"""
+Тесты для бэкенда SQLite с интерфейсом asyncpg с использованием pytest
+"""
+
+import asyncio
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from sqlite_backend import SqlitePool, translate
+
+SCHEMA = """
+    CREATE TABLE currencies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        currency_name TEXT NOT NULL UNIQUE,
+        rate NUMERIC NOT NULL
+    );
+"""
+
+
+def run(scenario):
+    """Выполняет scenario(conn) на соединении пула к базе в памяти"""
+    async def main():
+        # У каждого соединения к :memory: своя база, поэтому соединение одно
+        pool = await SqlitePool(":memory:", size=1, mmap_size=0).start()
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA)
+                return await scenario(conn)
+        finally:
+            await pool.close()
+
+    return asyncio.run(main())
+
+
+class TestTranslate:
+    """Тесты перевода параметров"""
+
+    def test_numbered(self):
+        """Тест: $1, $2 становятся ?1, ?2"""
+        assert translate("SELECT $2, $1, $10") == "SELECT ?2, ?1, ?10"
+
+
+class TestSqliteConnection:
+    """Тесты fetch/execute/transaction соединения"""
+
+    def test_round_trip(self):
+        """Тест записи Decimal и чтения строк с Decimal, как из asyncpg"""
+        async def scenario(conn):
+            await conn.execute("INSERT INTO currencies(currency_name, rate) VALUES($1, $2)", "USD", Decimal("92.15"))
+            await conn.executemany("INSERT INTO currencies(currency_name, rate) VALUES($1, $2)",
+                                   [("EUR", Decimal("100")), ("JPY", Decimal("0.6"))])
+            rows = await conn.fetch("SELECT currency_name, rate FROM currencies ORDER BY currency_name")
+            row = await conn.fetchrow("SELECT id, rate FROM currencies WHERE currency_name = $1", "USD")
+            return rows, row, await conn.fetchval("SELECT count(*) FROM currencies")
+
+        rows, row, count = run(scenario)
+        assert [(r["currency_name"], r["rate"]) for r in rows] == [
+            ("EUR", Decimal("100")), ("JPY", Decimal("0.6")), ("USD", Decimal("92.15"))]
+        assert all(isinstance(r["rate"], Decimal) for r in rows)
+        assert row["id"] == 1 and row[1] == Decimal("92.15")
+        assert count == 3
+
+    def test_missing_row(self):
+        """Тест: fetchrow и fetchval без строк возвращают None"""
+        async def scenario(conn):
+            return (await conn.fetchrow("SELECT rate FROM currencies WHERE currency_name = $1", "XXX"),
+                    await conn.fetchval("SELECT rate FROM currencies WHERE currency_name = $1", "XXX"))
+
+        assert run(scenario) == (None, None)
+
+    def test_list_parameter(self):
+        """Тест: список передаётся JSON-ом для json_each"""
+        async def scenario(conn):
+            await conn.executemany("INSERT INTO currencies(currency_name, rate) VALUES($1, $2)",
+                                   [("USD", 90), ("EUR", 100), ("JPY", 0.6)])
+            return await conn.fetch(
+                "SELECT currency_name FROM currencies WHERE currency_name IN (SELECT value FROM json_each($1))"
+                " ORDER BY currency_name", ["USD", "JPY"])
+
+        assert [r[0] for r in run(scenario)] == ["JPY", "USD"]
+
+    def test_transaction(self):
+        """Тест фиксации и отката транзакции"""
+        async def scenario(conn):
+            async with conn.transaction():
+                await conn.execute("INSERT INTO currencies(currency_name, rate) VALUES($1, $2)", "USD", 90)
+            with pytest.raises(RuntimeError):
+                async with conn.transaction():
+                    await conn.execute("INSERT INTO currencies(currency_name, rate) VALUES($1, $2)", "EUR", 100)
+                    raise RuntimeError
+            return [r[0] for r in await conn.fetch("SELECT currency_name FROM currencies")]
+
+        assert run(scenario) == ["USD"]
+
+    def test_cursor(self):
+        """Тест курсора, читающего порциями"""
+        async def scenario(conn):
+            await conn.executemany("INSERT INTO currencies(currency_name, rate) VALUES($1, $2)",
+                                   [(f"C{i:02d}", i + 1) for i in range(7)])
+            async with conn.transaction(readonly=True):
+                return [row["rate"] async for row in conn.cursor(
+                    "SELECT rate FROM currencies WHERE rate > $1 ORDER BY rate", Decimal("2"), prefetch=3)]
+
+        assert run(scenario) == [Decimal(n) for n in range(3, 8)]
+
+
+class TestIsolation:
+    """Тесты: бэкенд не меняет типы для других соединений sqlite3"""
+
+    def test_global_sqlite3_untouched(self):
+        """Тест: у чужого соединения sqlite3 NUMERIC — число, а Decimal не адаптируется"""
+        run(lambda conn: conn.fetch("SELECT 1"))
+        conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+        try:
+            conn.execute("CREATE TABLE t (rate NUMERIC)")
+            conn.execute("INSERT INTO t VALUES (92.15)")
+            assert conn.execute("SELECT rate FROM t").fetchone()[0] == 92.15
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute("SELECT ?", (Decimal("1"),))
+        finally:
+            conn.close()
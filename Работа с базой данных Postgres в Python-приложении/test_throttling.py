@@ -0,0 +1,98 @@
+"""
+Тесты для троттлинга обновлений с использованием pytest
+"""
+
+from aiogram.types import Update
+
+from throttling import COMMAND, ThrottlingMiddleware, classify, parse_limits
+
+
+def message(text, chat_id=7):
+    return Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "user"},
+            "text": text,
+        },
+    })
+
+
+class TestClassify:
+    """Тесты определения вида обновления"""
+
+    def test_command(self):
+        """Тест команды с аргументами и с упоминанием бота"""
+        assert classify(message("/convert USD 100")) == (7, "convert")
+        assert classify(message("/get_currencies@fake_bot")) == (7, "get_currencies")
+
+    def test_plain_message(self):
+        """Тест обычного сообщения"""
+        assert classify(message("USD")) == (7, "message")
+
+    def test_empty_command(self):
+        """Тест «/», «/ » и «/@bot» без имени команды"""
+        for text in ("/", "/ ", "/   ", "/@fake_bot"):
+            assert classify(message(text)) == (7, "message")
+
+
+class TestParseLimits:
+    """Тесты разбора лимитов"""
+
+    def test_parse(self):
+        """Тест разбора нескольких лимитов с пробелами"""
+        assert parse_limits("convert=1/5, get_currencies=0.5/3") == {
+            "convert": (1.0, 5.0), "get_currencies": (0.5, 3.0)}
+
+    def test_empty(self):
+        """Тест пустой строки"""
+        assert parse_limits("") == {}
+
+
+class TestAllow:
+    """Тесты корзин токенов"""
+
+    def test_burst_then_refill(self):
+        """Тест: ёмкость корзины расходуется и пополняется со временем"""
+        throttling = ThrottlingMiddleware({"convert": (1, 2)}, {})
+        assert throttling.allow(7, "convert", now=0)
+        assert throttling.allow(7, "convert", now=0)
+        assert not throttling.allow(7, "convert", now=0)
+        assert throttling.allow(7, "convert", now=1)
+        assert throttling.throttled == {"convert": 1}
+
+    def test_chats_independent(self):
+        """Тест: у каждого чата своя корзина"""
+        throttling = ThrottlingMiddleware({"convert": (1, 1)}, {})
+        assert throttling.allow(1, "convert", now=0)
+        assert throttling.allow(2, "convert", now=0)
+
+    def test_global_limit(self):
+        """Тест общего лимита на вид обновления"""
+        throttling = ThrottlingMiddleware({}, {"convert": (1, 1)}, default=(100, 100))
+        assert throttling.allow(1, "convert", now=0)
+        assert not throttling.allow(2, "convert", now=0)
+
+    def test_global_reject_refunds_chat(self):
+        """Тест: обновление, отклонённое глобальной корзиной, не расходует лимит чата"""
+        throttling = ThrottlingMiddleware({"convert": (0, 1)}, {"convert": (1, 1)})
+        assert throttling.allow(1, "convert", now=0)
+        assert not throttling.allow(2, "convert", now=0)
+        assert throttling.allow(2, "convert", now=1)
+
+    def test_unknown_commands_share_bucket(self):
+        """Тест: разные неизвестные команды чата делят одну корзину"""
+        throttling = ThrottlingMiddleware({"convert": (1, 5)}, {}, default=(0, 10))
+        passed = sum(throttling.allow(7, f"x{i}", now=0) for i in range(1000))
+        assert passed == 10
+        assert throttling.stats()["buckets"] == 1
+        assert throttling.throttled == {COMMAND: 990}
+
+    def test_configured_command_own_bucket(self):
+        """Тест: команда с лимитом не делит корзину с неизвестными"""
+        throttling = ThrottlingMiddleware({"convert": (0, 1)}, {}, default=(0, 1))
+        assert throttling.allow(7, "junk", now=0)
+        assert throttling.allow(7, "convert", now=0)
+        assert not throttling.allow(7, "other_junk", now=0)
@@ -0,0 +1,162 @@
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+# (скорость пополнения в секунду, ёмкость корзины)
+Limit = Tuple[float, float]
+
+# Виды обновлений, которые classify возвращает помимо имён команд
+BASE_KINDS = ("message", "callback", "inline", "other")
+# Вид всех команд, для которых не задан свой лимит
+COMMAND = "command"
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, limit: Limit, now: float) -> bool:
+        rate, burst = limit
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def refund(self):
+        self.tokens += 1
+
+
+def parse_limits(text: str) -> Dict[str, Limit]:
+    """Разбирает «convert=1/5,get_currencies=0.5/3» в {вид: (скорость, ёмкость)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        kind, value = item.split("=", 1)
+        rate, burst = value.split("/", 1)
+        limits[kind.strip()] = (float(rate), float(burst))
+    return limits
+
+
+def classify(update: Update) -> Tuple[Optional[int], str]:
+    """Возвращает (чат или пользователь, вид обновления: имя команды, callback, inline, message)."""
+    if update.message is not None:
+        text = update.message.text or ""
+        # «/», «/ » и «/@bot» без имени команды считаются обычным сообщением
+        words = text[1:].split(maxsplit=1) if text.startswith("/") else []
+        kind = (words[0].split("@", 1)[0] if words else "") or "message"
+        return update.message.chat.id, kind
+    if update.callback_query is not None:
+        return update.callback_query.from_user.id, "callback"
+    if update.inline_query is not None:
+        return update.inline_query.from_user.id, "inline"
+    return None, "other"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware обновлений с корзинами токенов.
+
+    У каждого чата своя корзина на вид обновления (команду), и у каждого
+    вида есть общая глобальная корзина. Команды без своего лимита в per_chat
+    и global_limits делят один вид COMMAND, поэтому число видов, а с ним и
+    корзин на чат, ограничено настройками. Токен чата возвращается, если
+    обновление отклонила глобальная корзина. Обновление, для которого не нашлось
+    токена, отбрасывается до фильтров и обработчиков, поэтому не занимает
+    соединение пула. Корзины чатов хранятся в LRU-словаре: простаивающие
+    дольше idle_ttl удаляются с головы при каждом вызове, а при превышении
+    max_buckets вытесняются самые старые. Если задан on_throttled, он
+    вызывается с (чат, вид) для каждого отброшенного обновления.
+    """
+
+    def __init__(
+        self,
+        per_chat: Dict[str, Limit],
+        global_limits: Dict[str, Limit],
+        default: Limit = (2, 10),
+        max_buckets: int = 100_000,
+        idle_ttl: float = 300.0,
+        on_throttled: Optional[Callable[[Optional[int], str], None]] = None,
+    ):
+        self._per_chat = per_chat
+        self._global_limits = global_limits
+        self._default = default
+        self._max_buckets = max_buckets
+        self._idle_ttl = idle_ttl
+        self.on_throttled = on_throttled
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self._global: Dict[str, TokenBucket] = {}
+        self._kinds = set(per_chat) | set(global_limits) | set(BASE_KINDS)
+        self.passed = 0
+        self.throttled = defaultdict(int)
+        self.evicted = 0
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if len(buckets) <= self._max_buckets and now - bucket.updated < self._idle_ttl:
+                break
+            del buckets[key]
+            self.evicted += 1
+
+    def kind(self, kind: str) -> str:
+        """Вид корзины: настроенный вид или COMMAND для прочих команд."""
+        return kind if kind in self._kinds else COMMAND
+
+    def allow(self, chat_id: Optional[int], kind: str, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        kind = self.kind(kind)
+        chat_bucket = None
+        if chat_id is not None:
+            limit = self._per_chat.get(kind, self._default)
+            key = (chat_id, kind)
+            chat_bucket = self._buckets.get(key)
+            if chat_bucket is None:
+                chat_bucket = self._buckets[key] = TokenBucket(limit[1], now)
+            else:
+                self._buckets.move_to_end(key)
+            if not chat_bucket.take(limit, now):
+                self.throttled[kind] += 1
+                return False
+        global_limit = self._global_limits.get(kind)
+        if global_limit is not None:
+            bucket = self._global.get(kind)
+            if bucket is None:
+                bucket = self._global[kind] = TokenBucket(global_limit[1], now)
+            if not bucket.take(global_limit, now):
+                # Обновление не выполнится: чат не платит за него своим лимитом
+                if chat_bucket is not None:
+                    chat_bucket.refund()
+                self.throttled[kind] += 1
+                return False
+        self.passed += 1
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        chat_id, kind = classify(event)
+        if not self.allow(chat_id, kind):
+            if self.on_throttled is not None:
+                self.on_throttled(chat_id, self.kind(kind))
+            return None
+        return await handler(event, data)
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "passed": self.passed,
+            "throttled": dict(self.throttled),
+            "evicted": self.evicted,
+        }
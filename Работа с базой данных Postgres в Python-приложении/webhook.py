@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """
+    Приём обновлений Telegram по вебхуку.
+
+    Запрос подтверждается сразу, а обновление обрабатывается в отдельной
+    задаче. Одновременно обрабатывается не больше concurrency обновлений,
+    остальные ждут своей очереди, не задерживая ответ Telegram.
+    """
+
+    def __init__(
+        self,
+        feed: Callable[[dict], Awaitable[None]],
+        concurrency: int = 100,
+        secret_token: Optional[str] = None,
+    ):
+        self._feed = feed
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._secret_token = secret_token
+        self._tasks = set()
+        self.received = 0
+        self.failed = 0
+
+    def register(self, app: web.Application, path: str):
+        app.router.add_post(path, self.handle)
+        app.on_shutdown.append(self._drain)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._secret_token and request.headers.get(SECRET_HEADER) != self._secret_token:
+            return web.Response(status=401)
+        data = await request.json()
+        self.received += 1
+        task = asyncio.create_task(self._process(data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, data: dict):
+        async with self._semaphore:
+            try:
+                await self._feed(data)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {data.get('update_id')}: {e}")
+
+    async def _drain(self, app: web.Application):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+
+def dispatcher_feed(dp: Dispatcher, bot: Bot) -> Callable[[dict], Awaitable[None]]:
+    """Передаёт обновление из вебхука в диспетчер aiogram."""
+    async def feed(data: dict):
+        update = Update.model_validate(data, context={"bot": bot})
+        await dp.feed_update(bot, update)
+    return feed
@@ -1,26 +1,35 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel, condecimal, Field
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
+from pydantic import BaseModel, condecimal, Field, ValidationError
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Literal, Optional
+import os
+import asyncio
 import uvicorn
 import logging
 
 # Импорт конфигурации БД
-from database import Base, engine, get_db, Currency
+from database import AsyncSessionLocal, async_engine, get_async_db, migrate, Currency
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Сколько часов журнал изменений (/currencies/changes в data_manager) хранит записи
+CHANGE_LOG_RETENTION_HOURS = float(os.getenv("CHANGE_LOG_RETENTION_HOURS", "168"))
+# Как часто удалять из журнала устаревшие записи, секунды
+CHANGE_LOG_PRUNE_INTERVAL = float(os.getenv("CHANGE_LOG_PRUNE_INTERVAL", "3600"))
+
 
 # Pydantic-схемы для запросов
+# Ограничения столбцов currencies: currency_name VARCHAR(50), rate NUMERIC(18, 6)
 class CurrencyCreate(BaseModel):
-    currency_name: str = Field(..., examples=["USD"])
-    rate: condecimal(max_digits=18, decimal_places=6) = Field(..., examples=[75.50])
+    currency_name: str = Field(..., max_length=50, examples=["USD"])
+    rate: condecimal(max_digits=18, decimal_places=6, gt=0) = Field(..., examples=[75.50])
 
 
 class CurrencyUpdate(BaseModel):
-    currency_name: str = Field(..., examples=["USD"])
-    rate: condecimal(max_digits=18, decimal_places=6) = Field(..., examples=[76.00])
+    currency_name: str = Field(..., max_length=50, examples=["USD"])
+    rate: condecimal(max_digits=18, decimal_places=6, gt=0) = Field(..., examples=[76.00])
 
 
 class CurrencyDelete(BaseModel):
@@ -31,21 +40,160 @@ class StatusResponse(BaseModel):
     status: str
     message: str
     currency_id: Optional[int] = None
+    version: Optional[int] = None
+
+
+class BulkLoadEntry(BaseModel):
+    # Позиция пакета проверяется по CurrencyCreate отдельно, чтобы одна ошибка
+    # не отклоняла весь пакет
+    currency_name: Any = Field(None, examples=["USD"])
+    rate: Any = Field(None, examples=[75.50])
+
+
+class CurrencyBulkLoad(BaseModel):
+    items: List[BulkLoadEntry] = Field(..., max_length=int(os.getenv("LOAD_BULK_MAX_ITEMS", "100000")))
+    # insert — существующие валюты не меняются, upsert — их курс обновляется
+    mode: Literal["insert", "upsert"] = "upsert"
+
+
+class BulkLoadItem(BaseModel):
+    currency_name: Optional[str] = None
+    # inserted, updated, unchanged (курс тот же), exists (режим insert),
+    # duplicate (валюта повторяется ниже в том же запросе, применена последняя),
+    # invalid (позиция не прошла проверку, причина — в error)
+    outcome: str
+    currency_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkLoadResponse(BaseModel):
+    status: str
+    inserted: int
+    updated: int
+    unchanged: int
+    exists: int
+    invalid: int
+    items: List[BulkLoadItem]
+
+
+def validate_bulk_entry(entry: BulkLoadEntry):
+    """Позиция пакета как CurrencyCreate или текст ошибки проверки"""
+    try:
+        return CurrencyCreate.model_validate(entry.model_dump()), None
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+# Пакет уходит двумя массивами через unnest: одна команда и два параметра при любом
+# размере пакета. xmax = 0 только у строк, вставленных этой командой
+BULK_INSERT_SQL = """
+    INSERT INTO currencies (currency_name, rate)
+    SELECT * FROM unnest(CAST(:names AS VARCHAR[]), CAST(:rates AS NUMERIC[]))
+    ON CONFLICT (currency_name) DO NOTHING
+    RETURNING id, currency_name, TRUE AS inserted
+"""
+# Строки с тем же курсом не переписываются и не возвращаются
+BULK_UPSERT_SQL = """
+    INSERT INTO currencies (currency_name, rate)
+    SELECT * FROM unnest(CAST(:names AS VARCHAR[]), CAST(:rates AS NUMERIC[]))
+    ON CONFLICT (currency_name) DO UPDATE SET rate = EXCLUDED.rate, version = currencies.version + 1
+        WHERE currencies.rate IS DISTINCT FROM EXCLUDED.rate
+    RETURNING id, currency_name, xmax = 0 AS inserted
+"""
+
+
+# Обновление и удаление — одна команда. target блокирует строку валюты (FOR UPDATE
+# дожидается параллельной записи и видит её версию), изменение выполняется, только
+# если версия совпала с If-Match. Нет строки — валюты нет (404); строка есть, но
+# изменения не было — версия не совпала (409)
+UPDATE_RATE_SQL = """
+    WITH target AS (
+        SELECT id, rate, version FROM currencies WHERE currency_name = :currency_name FOR UPDATE
+    ), updated AS (
+        UPDATE currencies AS c SET rate = :rate, version = c.version + 1
+        FROM target AS t
+        WHERE c.id = t.id AND (CAST(:expected AS INTEGER) IS NULL OR t.version = :expected)
+        RETURNING c.id, c.version
+    )
+    SELECT t.id, t.rate AS old_rate, t.version AS current_version, u.version AS new_version
+    FROM target AS t LEFT JOIN updated AS u ON u.id = t.id
+"""
+DELETE_SQL = """
+    WITH target AS (
+        SELECT id, version FROM currencies WHERE currency_name = :currency_name FOR UPDATE
+    ), deleted AS (
+        DELETE FROM currencies AS c
+        USING target AS t
+        WHERE c.id = t.id AND (CAST(:expected AS INTEGER) IS NULL OR t.version = :expected)
+        RETURNING c.id
+    )
+    SELECT t.id, t.version AS current_version, d.id IS NOT NULL AS deleted
+    FROM target AS t LEFT JOIN deleted AS d ON d.id = t.id
+"""
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def expected_version(if_match: Optional[str]) -> Optional[int]:
+    """Версия из If-Match: "3", W/"3" или 3; без заголовка и для * версия не проверяется"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid If-Match header: {if_match}")
+
+
+def version_conflict(currency_name: str, current: int, expected: int) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Currency {currency_name} is at version {current}, If-Match expected {expected}",
+        headers={"ETag": etag(current)},
+    )
 
 
 # Создаём приложение FastAPI
 app = FastAPI(title="Currency Manager Service", version="1.0.0")
 
 
-# Создание таблицы при старте приложения
+# Миграции схемы при старте: на актуальной базе — один запрос версии
 @app.on_event("startup")
 async def startup_event():
     try:
-        logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("✅ Database tables created successfully.")
+        version = migrate()
+        logger.info(f"✅ Database schema is at version {version}.")
     except Exception as e:
-        logger.error(f"❌ Error creating database tables: {e}")
+        logger.error(f"❌ Error migrating database schema: {e}")
+    app.state.prune_task = asyncio.create_task(prune_change_log())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.prune_task.cancel()
+    await asyncio.gather(app.state.prune_task, return_exceptions=True)
+    await async_engine.dispose()
+
+
+async def prune_change_log():
+    """Удаляет из журнала изменений записи старше CHANGE_LOG_RETENTION_HOURS"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                pruned = await db.scalar(
+                    text("SELECT prune_currency_changes(CAST(:hours AS DOUBLE PRECISION) * INTERVAL '1 hour')"),
+                    {"hours": CHANGE_LOG_RETENTION_HOURS},
+                )
+                await db.commit()
+            if pruned is not None:
+                logger.info(f"✅ Change log pruned through version {pruned}")
+        except Exception as e:
+            logger.error(f"❌ Change log pruning failed: {e}")
+        await asyncio.sleep(CHANGE_LOG_PRUNE_INTERVAL)
 
 
 @app.get("/")
@@ -55,14 +203,14 @@ async def root():
 
 # Эндпоинт POST /load
 @app.post("/load", response_model=StatusResponse, status_code=200)
-def load_currency(data: CurrencyCreate, db: Session = Depends(get_db)):
+async def load_currency(data: CurrencyCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Добавление новой валюты в базу данных"""
     currency_name_upper = data.currency_name.upper()
     try:
         # 1. Проверка того, что такой валюты нет в БД
-        existing_currency = db.query(Currency).filter(
+        existing_currency = await db.scalar(select(Currency).where(
             Currency.currency_name == currency_name_upper
-        ).first()
+        ))
 
         if existing_currency:
             raise HTTPException(
@@ -77,91 +225,156 @@ def load_currency(data: CurrencyCreate, db: Session = Depends(get_db)):
         )
 
         db.add(new_currency)
-        db.commit()
-        db.refresh(new_currency)
+        await db.commit()
 
         # 3. Возвращается ответ 200 ОК
+        response.headers["ETag"] = etag(new_currency.version)
         return {
             "status": "OK",
             "message": f"Currency {currency_name_upper} successfully added",
-            "currency_id": new_currency.id
+            "currency_id": new_currency.id,
+            "version": new_currency.version
         }
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
-# Эндпоинт POST /update_currency
-@app.post("/update_currency", response_model=StatusResponse, status_code=200)
-def update_currency_rate(data: CurrencyUpdate, db: Session = Depends(get_db)):
-    """Обновление курса существующей валюты"""
-    currency_name_upper = data.currency_name.upper()
+# Эндпоинт POST /load/bulk
+@app.post("/load/bulk", response_model=BulkLoadResponse, status_code=200)
+async def load_currencies_bulk(data: CurrencyBulkLoad, db: AsyncSession = Depends(get_async_db)):
+    """
+    Добавление или обновление пакета валют одной командой INSERT ... ON CONFLICT.
+    Конфликт по currency_name разрешает сама база, поэтому параллельные
+    загрузки не гоняются между проверкой и вставкой.
+    """
+    # 1. Каждая позиция проверяется отдельно: ошибочные не попадают в команду
+    checked = [validate_bulk_entry(entry) for entry in data.items]
+    names = [item.currency_name.upper() if item is not None else None for item, _ in checked]
+    # Одна строка на валюту: ON CONFLICT DO UPDATE не может менять строку дважды,
+    # из повторов применяется последний
+    last = {name: i for i, name in enumerate(names) if name is not None}
+    rates = {name: checked[i][0].rate for name, i in last.items()}
     try:
-        # 1. Проверка того, что такая валюта существует в БД
-        currency = db.query(Currency).filter(
-            Currency.currency_name == currency_name_upper
-        ).first()
-
-        if not currency:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Currency {currency_name_upper} not found"
+        # 2. Выполняется вставка пакета в таблицу currencies
+        applied = {}
+        if rates:
+            result = await db.execute(
+                text(BULK_INSERT_SQL if data.mode == "insert" else BULK_UPSERT_SQL),
+                {"names": list(rates), "rates": list(rates.values())},
             )
+            applied = {row.currency_name: row for row in result}
+            await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Database error: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-        # 2. Выполняется обновление данных валюты в таблицу currencies
-        old_rate = currency.rate
-        currency.rate = data.rate
-        db.commit()
+    # 3. Возвращается ответ 200 ОК с итогом по каждой позиции в порядке запроса
+    items = []
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "exists": 0, "invalid": 0}
+    for i, currency_name_upper in enumerate(names):
+        error = checked[i][1]
+        if error is not None:
+            counts["invalid"] += 1
+            name = data.items[i].currency_name
+            items.append(BulkLoadItem(currency_name=name if isinstance(name, str) else None,
+                                      outcome="invalid", error=error))
+            continue
+        row = applied.get(currency_name_upper)
+        if last[currency_name_upper] != i:
+            outcome, row = "duplicate", None
+        elif row is not None:
+            outcome = "inserted" if row.inserted else "updated"
+        else:
+            outcome = "exists" if data.mode == "insert" else "unchanged"
+        if outcome in counts:
+            counts[outcome] += 1
+        items.append(BulkLoadItem(
+            currency_name=currency_name_upper,
+            outcome=outcome,
+            currency_id=row.id if row is not None else None,
+        ))
+    return BulkLoadResponse(status="OK", items=items, **counts)
 
-        # 3. Возвращается ответ 200 ОК
-        return {
-            "status": "OK",
-            "message": f"Currency {currency_name_upper} rate updated from {old_rate} to {data.rate}"
-        }
-    except HTTPException:
-        raise
+
+# Эндпоинт POST /update_currency
+@app.post("/update_currency", response_model=StatusResponse, status_code=200)
+async def update_currency_rate(
+        data: CurrencyUpdate,
+        response: Response,
+        if_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """Обновление курса существующей валюты; с If-Match — только если версия не изменилась"""
+    currency_name_upper = data.currency_name.upper()
+    expected = expected_version(if_match)
+    try:
+        # 1-2. Проверка существования и обновление курса в таблице currencies одной командой
+        row = (await db.execute(text(UPDATE_RATE_SQL), {
+            "currency_name": currency_name_upper, "rate": data.rate, "expected": expected,
+        })).first()
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+    if row is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Currency {currency_name_upper} not found"
+        )
+    if row.new_version is None:
+        raise version_conflict(currency_name_upper, row.current_version, expected)
+
+    # 3. Возвращается ответ 200 ОК
+    response.headers["ETag"] = etag(row.new_version)
+    return {
+        "status": "OK",
+        "message": f"Currency {currency_name_upper} rate updated from {row.old_rate} to {data.rate}",
+        "version": row.new_version
+    }
+
 
 # Эндпоинт POST /delete
 @app.post("/delete", response_model=StatusResponse, status_code=200)
-def delete_currency_entry(data: CurrencyDelete, db: Session = Depends(get_db)):
-    """Удаление валюты из базы данных"""
+async def delete_currency_entry(
+        data: CurrencyDelete,
+        if_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """Удаление валюты из базы данных; с If-Match — только если версия не изменилась"""
     currency_name_upper = data.currency_name.upper()
+    expected = expected_version(if_match)
     try:
-        # 1. Проверка того, что такая валюта существует в БД
-        currency = db.query(Currency).filter(
-            Currency.currency_name == currency_name_upper
-        ).first()
-
-        if not currency:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Currency {currency_name_upper} not found"
-            )
-
-        # 2. Выполняется удаление валюты из таблицы currencies
-        db.delete(currency)
-        db.commit()
-
-        # 3. Возвращается ответ 200 ОК
-        return {
-            "status": "OK",
-            "message": f"Currency {currency_name_upper} successfully deleted"
-        }
-    except HTTPException:
-        raise
+        # 1-2. Проверка существования и удаление валюты из таблицы currencies одной командой
+        row = (await db.execute(text(DELETE_SQL), {
+            "currency_name": currency_name_upper, "expected": expected,
+        })).first()
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+    if row is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Currency {currency_name_upper} not found"
+        )
+    if not row.deleted:
+        raise version_conflict(currency_name_upper, row.current_version, expected)
+
+    # 3. Возвращается ответ 200 ОК
+    return {
+        "status": "OK",
+        "message": f"Currency {currency_name_upper} successfully deleted"
+    }
+
 
 if __name__ == "__main__":
     # Микросервис запускается на порту 5001
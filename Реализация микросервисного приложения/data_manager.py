@@ -1,13 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import FastAPI, HTTPException, Query, Header, Depends, Response
+from typing import List, Optional, Union
+import os
+import math
 import uvicorn
 import logging
 from decimal import Decimal
 
-# Импорт конфигурации БД и модели
-from database import Base, engine, get_db, Currency
-from pydantic import BaseModel
+# Импорт конфигурации БД
+from database import SQLALCHEMY_DATABASE_URL, async_engine, get_async_db, migrate
+from rate_snapshot import RateSnapshot, SnapshotCache
+from rate_matrix import BASE_CURRENCY, RateMatrix
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -17,11 +22,19 @@ class CurrencyResponse(BaseModel):
     id: int
     currency_name: str
     rate: Decimal
+    # Для If-Match при изменении валюты через currency_manager
+    version: int
 
     class Config:
         from_attributes = True
 
 
+class CurrencyChangesResponse(BaseModel):
+    version: int
+    upserted: List[CurrencyResponse]
+    deleted: List[str]
+
+
 class ConvertResponse(BaseModel):
     currency_name: str
     amount: float
@@ -29,18 +42,70 @@ class ConvertResponse(BaseModel):
     result: Decimal
 
 
+class CrossConvertResponse(BaseModel):
+    from_currency: str
+    to_currency: str
+    amount: float
+    rate: Decimal
+    result: Decimal
+
+
+# Предел суммы конвертации: больше неё результат теряет копейки в точности Decimal
+MAX_AMOUNT = 1e15
+
+
+class ConvertItem(BaseModel):
+    currency_name: str
+    # Сумма проверяется по каждой позиции отдельно (в том числе на MAX_AMOUNT),
+    # чтобы одна ошибка не отклоняла весь пакет
+    amount: float
+
+
+class ConvertBatchRequest(BaseModel):
+    items: List[ConvertItem] = Field(..., max_length=int(os.getenv("CONVERT_BATCH_MAX_ITEMS", "100000")))
+
+
+class ConvertBatchItem(BaseModel):
+    currency_name: str
+    amount: float
+    rate: Optional[Decimal] = None
+    result: Optional[Decimal] = None
+    error: Optional[str] = None
+
+
+class ConvertBatchResponse(BaseModel):
+    converted: int
+    failed: int
+    items: List[ConvertBatchItem]
+
+
+# Как часто сверять версию снимка курсов с базой (страховка от потерянных NOTIFY), секунды
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("SNAPSHOT_CHECK_INTERVAL", "30"))
+
 # Создаём приложение FastAPI
 app = FastAPI(title="Data Manager Service", version="1.0.0")
+# Курсы для чтения: data_manager отвечает из снимка, не открывая сессий БД
+snapshots = SnapshotCache(SQLALCHEMY_DATABASE_URL, check_interval=SNAPSHOT_CHECK_INTERVAL)
+# Кросс-курсы пересчитываются из каждого нового снимка
+matrix = RateMatrix()
+snapshots.subscribe(matrix.update)
 
 
 @app.on_event("startup")
 async def startup_event():
     try:
-        logger.info("Verifying database connection for data-manager...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("✅ Database connection verified.")
+        version = migrate()
+        logger.info(f"✅ Database connection verified, schema version {version}.")
     except Exception as e:
         logger.error(f"❌ Database connection error: {e}")
+    await snapshots.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info(f"Rate snapshot: {snapshots.stats()}, rate matrix: {matrix.stats()}")
+    await snapshots.close()
+    await async_engine.dispose()
 
 
 @app.get("/")
@@ -48,57 +113,199 @@ async def root():
     return {"message": "Data Manager Service is running"}
 
 
+def current_snapshot() -> RateSnapshot:
+    snapshot = snapshots.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Rate snapshot is not loaded yet")
+    return snapshot
+
+
+# Одним запросом: граница журнала и валюты, изменённые после since, из одного снимка базы.
+# Изменения берутся не новее версии снимка курсов, строки по ним — из него же
+CHANGES_SQL = """
+    SELECT pruned_version, ARRAY(
+        SELECT DISTINCT currency_name FROM currency_changes
+        WHERE version > :since AND version <= :upto
+    ) AS names
+    FROM currency_version
+"""
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [value.strip() for value in if_none_match.split(",")]
+    return "*" in tags or any(value.removeprefix("W/") == tag for value in tags)
+
+
 # Эндпоинт GET /currencies
 @app.get("/currencies", status_code=200, response_model=List[CurrencyResponse])
-def list_all_currencies(db: Session = Depends(get_db)):
-    """Возвращает все добавленные ранее в таблицу currencies"""
-    try:
-        currencies = db.query(Currency).order_by(Currency.currency_name).all()
-        return currencies
-    except Exception as e:
-        logger.error(f"Database error: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+async def list_all_currencies(response: Response, if_none_match: Optional[str] = Header(None)):
+    """
+    Возвращает все добавленные ранее в таблицу currencies. ETag — версия
+    данных; если она совпала с If-None-Match, ответ 304 без тела
+    """
+    snapshot = current_snapshot()
+    tag = etag(snapshot.version)
+    if etag_matches(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+    return snapshot.rows
+
+
+# Эндпоинт GET /currencies/changes
+@app.get("/currencies/changes", status_code=200, response_model=CurrencyChangesResponse)
+async def list_currency_changes(
+        response: Response,
+        since: int = Query(..., ge=0, description="Версия, полученная в прошлый раз (ETag /currencies или version)"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Валюты, добавленные, изменённые или удалённые после версии since.
+    Если журнал изменений уже не хранит версии после since, ответ 410:
+    клиент заново загружает /currencies
+    """
+    snapshot = current_snapshot()
+    response.headers["ETag"] = etag(snapshot.version)
+    if since >= snapshot.version:
+        return CurrencyChangesResponse(version=snapshot.version, upserted=[], deleted=[])
+
+    row = (await db.execute(text(CHANGES_SQL), {"since": since, "upto": snapshot.version})).one()
+    if since < row.pruned_version:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Changes since version {since} are no longer kept, reload /currencies"
+        )
+    names = sorted(row.names)
+    return CurrencyChangesResponse(
+        version=snapshot.version,
+        upserted=[snapshot.rates[name] for name in names if name in snapshot.rates],
+        deleted=[name for name in names if name not in snapshot.rates],
+    )
 
 
 # Эндпоинт GET /convert
-@app.get("/convert", status_code=200, response_model=ConvertResponse)
-def convert_currency_to_rub(
-        currency_name: str = Query(..., description="Наименование валюты"),
-        amount: float = Query(..., gt=0, description="Сумма для конвертации"),
-        db: Session = Depends(get_db)
+@app.get("/convert", status_code=200, response_model=Union[ConvertResponse, CrossConvertResponse])
+async def convert_currency_to_rub(
+        currency_name: Optional[str] = Query(None, description="Наименование валюты для конвертации в рубли"),
+        from_currency: Optional[str] = Query(None, alias="from", description="Исходная валюта"),
+        to_currency: Optional[str] = Query(None, alias="to", description=f"Целевая валюта, по умолчанию {BASE_CURRENCY}"),
+        amount: float = Query(..., gt=0, le=MAX_AMOUNT, description="Сумма для конвертации"),
 ):
-    """Конвертация суммы в указанной валюте в рубли"""
+    """
+    Конвертация суммы в указанной валюте в рубли (currency_name) или из
+    одной валюты в другую (from, to) по матрице кросс-курсов
+    """
+    if from_currency is not None or to_currency is not None:
+        return convert_cross(from_currency or currency_name, to_currency or BASE_CURRENCY, amount)
+    if currency_name is None:
+        raise HTTPException(status_code=422, detail="Either currency_name or from is required")
+
     currency_name_upper = currency_name.upper()
-    try:
-        # 1. Проверка, что такая валюта существует в БД
-        currency = db.query(Currency).filter(
-            Currency.currency_name == currency_name_upper
-        ).first()
-
-        if not currency:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Currency {currency_name_upper} not found"
-            )
-
-        # 2. Получение курса из БД для заданной валюты
-        rate = currency.rate
-
-        # 3. Конвертация и ответ 200 ОК, в теле которого содержится JSON с конвертированным значением
-        amount_decimal = Decimal(str(amount))
-        result = (rate * amount_decimal).quantize(Decimal("0.01"))
-
-        return ConvertResponse(
-            currency_name=currency.currency_name,
-            amount=amount,
-            rate=rate,
-            result=result
+    # 1. Курс берётся из снимка в памяти: запрос не обращается к базе
+    rate = current_snapshot().rate(currency_name_upper)
+    if rate is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Currency {currency_name_upper} not found"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error during conversion: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    # 2. Конвертация и ответ 200 ОК, в теле которого содержится JSON с конвертированным значением
+    return ConvertResponse(
+        currency_name=currency_name_upper,
+        amount=amount,
+        rate=rate,
+        result=convert_or_422(rate, amount)
+    )
+
+
+def convert_cross(from_currency: Optional[str], to_currency: str, amount: float) -> CrossConvertResponse:
+    if from_currency is None:
+        raise HTTPException(status_code=422, detail="Parameter from is required")
+    current_snapshot()
+    from_upper, to_upper = from_currency.upper(), to_currency.upper()
+    rate = matrix.rate(from_upper, to_upper)
+    if rate is None:
+        missing = from_upper if from_upper not in matrix.index else to_upper
+        raise HTTPException(status_code=404, detail=f"Currency {missing} not found")
+    return CrossConvertResponse(
+        from_currency=from_upper,
+        to_currency=to_upper,
+        amount=amount,
+        rate=rate,
+        result=convert_or_422(rate, amount)
+    )
+
+
+def convert_amount(rate: Decimal, amount: float) -> Decimal:
+    """
+    Сумма по курсу с тем же округлением до копеек, что и в /convert.
+    Если результат не округлить до копеек, InvalidOperation (ArithmeticError)
+    """
+    return (rate * Decimal(str(amount))).quantize(Decimal("0.01"))
+
+
+def convert_or_422(rate: Decimal, amount: float) -> Decimal:
+    try:
+        return convert_amount(rate, amount)
+    except ArithmeticError:
+        raise HTTPException(status_code=422, detail="Conversion result is out of range")
+
+
+# Эндпоинт GET /matrix
+@app.get("/matrix", status_code=200)
+async def get_rate_matrix(
+        currencies: Optional[str] = Query(None, description="Валюты через запятую; по умолчанию все"),
+):
+    """Матрица кросс-курсов: rates[i][j] — цена единицы currencies[i] в единицах currencies[j]"""
+    current_snapshot()
+    if currencies is None:
+        return matrix.render()
+    names = [name.strip().upper() for name in currencies.split(",") if name.strip()]
+    missing = [name for name in names if name not in matrix.index]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Currency {', '.join(missing)} not found")
+    return matrix.render(names)
+
+
+# Эндпоинт POST /convert/batch
+@app.post("/convert/batch", status_code=200, response_model=ConvertBatchResponse)
+async def convert_batch_to_rub(request: ConvertBatchRequest):
+    """
+    Конвертация пакета сумм в рубли за один запрос. Все курсы берутся из
+    одного снимка, поэтому позиции пакета считаются по согласованным курсам;
+    ошибки (неизвестная валюта, неположительная или слишком большая сумма)
+    возвращаются в позиции, остальные позиции конвертируются.
+    """
+    snapshot = current_snapshot()
+    items = []
+    failed = 0
+    for item in request.items:
+        currency_name_upper = item.currency_name.upper()
+        rate = snapshot.rate(currency_name_upper)
+        if not math.isfinite(item.amount) or item.amount <= 0:
+            error = "Amount must be greater than 0"
+        elif item.amount > MAX_AMOUNT:
+            error = f"Amount must not exceed {MAX_AMOUNT:g}"
+        elif rate is None:
+            error = f"Currency {currency_name_upper} not found"
+        else:
+            try:
+                result = convert_amount(rate, item.amount)
+            except ArithmeticError:
+                error = "Conversion result is out of range"
+            else:
+                items.append(ConvertBatchItem(currency_name=currency_name_upper, amount=item.amount,
+                                              rate=rate, result=result))
+                continue
+        failed += 1
+        items.append(ConvertBatchItem(currency_name=currency_name_upper, amount=item.amount, error=error))
+
+    return ConvertBatchResponse(converted=len(items) - failed, failed=failed, items=items)
 
 
 if __name__ == "__main__":
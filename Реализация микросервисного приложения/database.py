@@ -1,12 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, Numeric
+from sqlalchemy import create_engine, Column, Integer, String, Numeric, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import logging
 from dotenv import load_dotenv
 
 # Загрузка переменных окружения
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Настройки подключения к PostgreSQL
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5433")
@@ -16,6 +21,13 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
 
 # Строка подключения к PostgreSQL
 SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Та же база через asyncpg для асинхронного движка
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Размер пула асинхронного движка: сколько запросов одновременно работают с базой,
+# остальные ждут свободного соединения в пуле, а не потока
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 
 # Создаём движок и сессии
 engine = create_engine(
@@ -27,6 +39,20 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для эндпоинтов; синхронный остаётся для миграций и скриптов.
+# Без pool_pre_ping: проверка соединения — лишний запрос к базе на каждый HTTP-запрос,
+# а разорванные соединения отсеивает pool_recycle и ошибка с откатом в эндпоинте
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=3600,
+    echo=False
+)
+
+# expire_on_commit=False: после коммита атрибуты объектов читаются без нового запроса
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Базовый класс для моделей
 Base = declarative_base()
 
@@ -38,6 +64,8 @@ class Currency(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     currency_name = Column(String(50), unique=True, index=True, nullable=False)
     rate = Column(Numeric(18, 6), nullable=False)
+    # Версия строки для If-Match: растёт с каждым изменением курса
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
 
 # Функция для получения сессии БД
@@ -46,4 +74,184 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Функция для получения асинхронной сессии БД
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Ключ pg_advisory_xact_lock миграций, общий для всех сервисов и реплик
+MIGRATION_LOCK = 5_002_018
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+# (версия, описание, шаг): шаг — текст SQL или функция, принимающая соединение.
+# Новые миграции добавляются в конец, применённые не меняются
+MIGRATIONS = [
+    # Исходная таблица currencies в том виде, в каком её создавал create_all
+    # до появления миграций; IF NOT EXISTS — на таких базах только ставится версия
+    (1, "create currencies table", """
+        CREATE TABLE IF NOT EXISTS currencies (
+            id SERIAL NOT NULL,
+            currency_name VARCHAR(50) NOT NULL,
+            rate NUMERIC(18, 6) NOT NULL,
+            PRIMARY KEY (id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_currencies_id ON currencies (id);
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_currencies_currency_name ON currencies (currency_name);
+    """),
+    # Версия данных currencies: растёт с каждой записывающей командой и после
+    # коммита рассылается NOTIFY currencies_changed (снимок курсов data_manager)
+    (2, "currency version counter with change notifications", """
+        CREATE TABLE IF NOT EXISTS currency_version (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version BIGINT NOT NULL
+        );
+        INSERT INTO currency_version(id, version) VALUES (TRUE, 0) ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION bump_currency_version() RETURNS trigger AS $$
+        DECLARE
+            new_version BIGINT;
+        BEGIN
+            UPDATE currency_version SET version = version + 1 RETURNING version INTO new_version;
+            PERFORM pg_notify('currencies_changed', new_version::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER currencies_version
+            AFTER INSERT OR UPDATE OR DELETE ON currencies
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_currency_version();
+    """),
+    # IF NOT EXISTS: в базах, где миграция 1 создавала таблицу по текущей модели,
+    # столбец уже есть
+    (3, "currency row version for optimistic locking", """
+        ALTER TABLE currencies ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+    """),
+    # Журнал изменений для /currencies/changes: каждая команда, изменившая строки,
+    # получает следующую версию currency_version и записывает имена затронутых валют
+    # (прежнее имя переименованной валюты — как удалённое). Таблицы переходов
+    # допустимы только у триггеров на одно событие, поэтому триггеров три, а
+    # функция общая. Журнал хранится ограниченное время: prune_currency_changes
+    # удаляет префикс по версии, а не по времени, потому что версии транзакций,
+    # начатых раньше, могут быть больше; pruned_version — последняя удалённая
+    # версия, изменения после неё журнал содержит полностью
+    (4, "currency change log", """
+        ALTER TABLE currency_version ADD COLUMN pruned_version BIGINT NOT NULL DEFAULT 0;
+
+        CREATE TABLE currency_changes (
+            version BIGINT NOT NULL,
+            currency_name VARCHAR(50) NOT NULL,
+            deleted BOOLEAN NOT NULL,
+            changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (version, currency_name)
+        );
+
+        DROP TRIGGER currencies_version ON currencies;
+        DROP FUNCTION bump_currency_version();
+
+        CREATE FUNCTION log_currency_changes() RETURNS trigger AS $$
+        DECLARE
+            new_version BIGINT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                IF NOT EXISTS (SELECT 1 FROM old_rows) THEN
+                    RETURN NULL;
+                END IF;
+            ELSIF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+                RETURN NULL;
+            END IF;
+            UPDATE currency_version SET version = version + 1 RETURNING version INTO new_version;
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO currency_changes(version, currency_name, deleted)
+                SELECT new_version, currency_name, TRUE FROM old_rows;
+            ELSE
+                INSERT INTO currency_changes(version, currency_name, deleted)
+                SELECT new_version, currency_name, FALSE FROM new_rows;
+            END IF;
+            IF TG_OP = 'UPDATE' THEN
+                INSERT INTO currency_changes(version, currency_name, deleted)
+                SELECT new_version, currency_name, TRUE FROM old_rows
+                WHERE currency_name NOT IN (SELECT currency_name FROM new_rows);
+            END IF;
+            PERFORM pg_notify('currencies_changed', new_version::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER currencies_inserted AFTER INSERT ON currencies
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION log_currency_changes();
+        CREATE TRIGGER currencies_updated AFTER UPDATE ON currencies
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION log_currency_changes();
+        CREATE TRIGGER currencies_deleted AFTER DELETE ON currencies
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION log_currency_changes();
+
+        CREATE FUNCTION prune_currency_changes(keep INTERVAL) RETURNS BIGINT AS $$
+            WITH horizon AS (
+                SELECT max(version) AS version FROM currency_changes WHERE changed_at < now() - keep
+            ), pruned AS (
+                DELETE FROM currency_changes WHERE version <= (SELECT version FROM horizon)
+            )
+            UPDATE currency_version
+            SET pruned_version = greatest(pruned_version, (SELECT version FROM horizon))
+            WHERE (SELECT version FROM horizon) IS NOT NULL
+            RETURNING pruned_version;
+        $$ LANGUAGE sql;
+    """),
+]
+
+
+def schema_version(conn) -> int:
+    try:
+        return conn.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+    except ProgrammingError:
+        conn.rollback()
+        return 0
+
+
+def migrate() -> int:
+    """
+    Приводит схему к последней версии и возвращает её номер.
+
+    На актуальной базе это один запрос версии: DDL выполняется, только если
+    есть новые миграции. Миграции применяются в одной транзакции под
+    pg_advisory_xact_lock, поэтому реплики, стартующие одновременно, не
+    выполняют DDL наперегонки: остальные дожидаются блокировки и видят,
+    что версия уже новая.
+    """
+    latest = MIGRATIONS[-1][0]
+    with engine.connect() as conn:
+        version = schema_version(conn)
+    if version >= latest:
+        return version
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK})
+        conn.execute(text(SCHEMA_VERSION_DDL))
+        version = schema_version(conn)
+        for number, description, step in MIGRATIONS:
+            if number <= version:
+                continue
+            logger.info(f"Applying migration {number}: {description}")
+            if callable(step):
+                step(conn)
+            else:
+                conn.exec_driver_sql(step)
+            conn.execute(
+                text("INSERT INTO schema_version(version, description) VALUES (:version, :description)"),
+                {"version": number, "description": description},
+            )
+            version = number
+    return version
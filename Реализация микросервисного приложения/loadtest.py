@@ -0,0 +1,119 @@
+"""
+Нагрузочный тест currency_manager и data_manager.
+
+Сервисы запускаются отдельно (python currency_manager.py, python
+data_manager.py). Тест добавляет --currencies валют через /load, затем
+--concurrency конкурентных клиентов выполняют --requests запросов в
+пропорциях MIX. В конце печатаются p50/p95/p99 по эндпоинтам, число
+ошибок и пропускная способность.
+
+    python loadtest.py --concurrency 500 --requests 20000
+    python loadtest.py --endpoints update_currency    # только currency_manager
+    python loadtest.py --manager http://localhost:5001 --data http://localhost:5002
+"""
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+import aiohttp
+
+PREFIX = "LT"
+# Доля эндпоинтов в смеси: чтение курсов преобладает над записью
+MIX = {
+    "update_currency": 30,
+    "convert": 50,
+    "currencies": 20,
+}
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def currency(n: int) -> str:
+    return f"{PREFIX}{n:03d}"
+
+
+async def seed(client: aiohttp.ClientSession, manager: str, currencies: int):
+    for n in range(currencies):
+        # 400 — валюта осталась от прошлого запуска
+        async with client.post(f"{manager}/load", json={"currency_name": currency(n), "rate": "1.5"}):
+            pass
+
+
+async def cleanup(manager: str, currencies: int):
+    # Своя сессия: простаивавшие соединения нагрузки сервер мог уже закрыть по keep-alive
+    async with aiohttp.ClientSession() as client:
+        for n in range(currencies):
+            async with client.post(f"{manager}/delete", json={"currency_name": currency(n)}):
+                pass
+
+
+async def request(client: aiohttp.ClientSession, kind: str, manager: str, data: str, currencies: int) -> int:
+    name = currency(random.randrange(currencies))
+    if kind == "update_currency":
+        rate = f"{random.uniform(1, 200):.2f}"
+        response = client.post(f"{manager}/update_currency", json={"currency_name": name, "rate": rate})
+    elif kind == "convert":
+        response = client.get(f"{data}/convert", params={"currency_name": name, "amount": random.randint(1, 1000)})
+    else:
+        response = client.get(f"{data}/currencies")
+    async with response as resp:
+        await resp.read()
+        return resp.status
+
+
+def print_table(samples: dict):
+    print(f"{'':<20}{'n':>8}{'p50,мс':>10}{'p95,мс':>10}{'p99,мс':>10}")
+    for name, values in sorted(samples.items()):
+        print(f"{name:<20}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manager", default="http://localhost:5001", help="адрес currency_manager")
+    parser.add_argument("--data", default="http://localhost:5002", help="адрес data_manager")
+    parser.add_argument("--concurrency", type=int, default=500, help="одновременных запросов")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--currencies", type=int, default=100)
+    parser.add_argument("--endpoints", default=",".join(MIX), help="эндпоинты смеси через запятую")
+    args = parser.parse_args()
+    mix = {kind: MIX[kind] for kind in args.endpoints.split(",")}
+
+    # Клиент на aiohttp: httpx на сотнях соединений сам упирается в процессор раньше сервисов
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as client:
+        await seed(client, args.manager, args.currencies)
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        kinds = random.choices(list(mix), weights=list(mix.values()), k=args.requests)
+        queue = iter(kinds)
+
+        async def worker():
+            for kind in queue:
+                started = time.perf_counter()
+                try:
+                    failed = await request(client, kind, args.manager, args.data, args.currencies) != 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    failed = True
+                samples[kind].append(time.perf_counter() - started)
+                if failed:
+                    errors[kind] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        try:
+            print_table(samples)
+            print(f"Ошибок: {dict(errors) or 0}")
+            print(f"{args.requests} запросов за {elapsed:.2f} с — {args.requests / elapsed:.0f} в секунду")
+        finally:
+            await cleanup(args.manager, args.currencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import logging
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from rate_snapshot import RateSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Курсы в таблице currencies заданы в рублях, сам рубль в таблице не хранится
+BASE_CURRENCY = "RUB"
+ONE = Decimal(1)
+
+
+class RateMatrix:
+    """
+    Матрица кросс-курсов: cross[i, j] — сколько единиц валюты j стоит одна
+    единица валюты i, то есть rate_i / rate_j.
+
+    Элементы — Decimal (массив dtype=object), поэтому конвертация через
+    матрицу считается в той же десятичной арифметике, что и /convert, а
+    пара валют находится двумя поисками в словаре и одним обращением к
+    массиву. Строка и столбец рубля — сами курсы из таблицы, без деления.
+
+    Матрица следует за снимком курсов: если набор валют не изменился,
+    пересчитываются только строки и столбцы валют с новым курсом; добавление
+    или удаление валюты перестраивает матрицу целиком.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.currencies: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.rates = np.empty(0, dtype=object)
+        self.cross = np.empty((0, 0), dtype=object)
+        self.rebuilds = 0
+        self.updated_rows = 0
+        # Отрисованный /matrix по всем валютам, сбрасывается при смене версии
+        self._rendered: Optional[dict] = None
+
+    def update(self, snapshot: RateSnapshot):
+        # Через нулевой курс пересчитать нельзя: такая валюта в матрицу не попадает
+        rates = {BASE_CURRENCY: ONE, **{name: row["rate"] for name, row in snapshot.rates.items() if row["rate"] > 0}}
+        if rates.keys() != self.index.keys():
+            self._rebuild(rates)
+        else:
+            changed = [self.index[name] for name, rate in rates.items() if rate != self.rates[self.index[name]]]
+            for i in changed:
+                self.rates[i] = rates[self.currencies[i]]
+            # Строки пересчитываются после записи всех новых курсов: иначе
+            # пересечения изменившихся валют остались бы на старых курсах
+            for i in changed:
+                self._update_row(i)
+            self.updated_rows += len(changed)
+        if snapshot.version != self.version:
+            self._rendered = None
+        self.version = snapshot.version
+
+    def _rebuild(self, rates: Dict[str, Decimal]):
+        self.currencies = sorted(rates)
+        self.index = {name: i for i, name in enumerate(self.currencies)}
+        self.rates = np.array([rates[name] for name in self.currencies], dtype=object)
+        self.cross = np.divide.outer(self.rates, self.rates)
+        self.rebuilds += 1
+        logger.info(f"Rate matrix rebuilt: {len(self.currencies)} currencies")
+
+    def _update_row(self, i: int):
+        self.cross[i, :] = self.rates[i] / self.rates
+        self.cross[:, i] = self.rates / self.rates[i]
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
+        i = self.index.get(from_currency)
+        j = self.index.get(to_currency)
+        if i is None or j is None:
+            return None
+        return self.cross[i, j]
+
+    def render(self, currencies: Optional[Iterable[str]] = None) -> dict:
+        """
+        Ответ /matrix: список валют и кросс-курсы строками Decimal, как курсы
+        в остальных ответах сервиса. Полная матрица отрисовывается один раз
+        на версию, подматрица выбирается из неё по индексам (np.ix_).
+        """
+        if currencies is None:
+            if self._rendered is None:
+                self._rendered = self._render(self.currencies, self.cross)
+            return self._rendered
+        idx = [self.index[name] for name in currencies]
+        return self._render([self.currencies[i] for i in idx], self.cross[np.ix_(idx, idx)])
+
+    def _render(self, currencies: List[str], cross: np.ndarray) -> dict:
+        return {
+            "version": self.version,
+            "currencies": currencies,
+            "rates": [[str(rate) for rate in row] for row in cross.tolist()],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "currencies": len(self.currencies),
+            "rebuilds": self.rebuilds,
+            "updated_rows": self.updated_rows,
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Канал, в который триггер currencies_version шлёт новую версию после каждой записи
+CURRENCIES_CHANNEL = "currencies_changed"
+
+
+class RateSnapshot:
+    """
+    Неизменяемый снимок таблицы currencies.
+
+    rows — строки, заранее отсортированные по currency_name (ответ
+    /currencies), rates — те же строки по имени валюты. Снимок никогда не
+    меняется: новый строится целиком и подменяет старый одним присваиванием,
+    поэтому запрос, начатый на старом снимке, дочитывает его без блокировок.
+    """
+
+    __slots__ = ("version", "rows", "rates")
+
+    def __init__(self, version: int, rows):
+        self.version = version
+        self.rows: Tuple[dict, ...] = tuple(
+            {"id": r["id"], "currency_name": r["currency_name"], "rate": r["rate"], "version": r["version"]} for r in rows
+        )
+        self.rates: Mapping[str, dict] = MappingProxyType({r["currency_name"]: r for r in self.rows})
+
+    def rate(self, currency_name: str) -> Optional[Decimal]:
+        row = self.rates.get(currency_name)
+        return row["rate"] if row is not None else None
+
+
+class SnapshotCache:
+    """
+    Снимок курсов в памяти data_manager.
+
+    Единственный писатель — currency_manager; каждая его запись увеличивает
+    currency_version и после коммита присылает NOTIFY с новой версией.
+    Уведомления будят одну фоновую задачу перезагрузки, поэтому пачка
+    изменений подряд стоит одного перечитывания таблицы. Раз в
+    check_interval секунд версия сверяется с базой — на случай потерянного
+    уведомления или оборванного соединения LISTEN, которое тогда
+    переоткрывается.
+    """
+
+    def __init__(self, dsn: str, check_interval: float = 30.0, retry_delay: float = 1.0):
+        self._dsn = dsn
+        self._check_interval = check_interval
+        self._retry_delay = retry_delay
+        self._conn: Optional[asyncpg.Connection] = None
+        self._changed = asyncio.Event()
+        # Перезагрузка и проверка версии идут через одно соединение
+        self._lock = asyncio.Lock()
+        self._tasks = []
+        self._subscribers = []
+        self.snapshot: Optional[RateSnapshot] = None
+        self.reloads = 0
+        self.reconnects = 0
+
+    def subscribe(self, callback):
+        """callback(snapshot) вызывается после каждой загрузки нового снимка."""
+        self._subscribers.append(callback)
+
+    async def start(self):
+        try:
+            await self._connect()
+            await self.reload()
+        except (OSError, asyncpg.PostgresError) as e:
+            # Сервис поднимается и без базы: снимок догрузит проверка версии
+            logger.error(f"❌ Rate snapshot is not loaded: {e}")
+            self._changed.set()
+        self._tasks = [asyncio.create_task(self._reloader()), asyncio.create_task(self._watch())]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+    async def _connect(self):
+        self._conn = await asyncpg.connect(self._dsn)
+        await self._conn.add_listener(CURRENCIES_CHANNEL, self._notify)
+
+    def _notify(self, conn, pid, channel, payload):
+        if self.snapshot is None or int(payload) > self.snapshot.version:
+            self._changed.set()
+
+    async def reload(self):
+        # Версия и строки читаются в одной транзакции, поэтому соответствуют друг другу
+        async with self._lock, self._conn.transaction(isolation="repeatable_read", readonly=True):
+            version = await self._conn.fetchval("SELECT version FROM currency_version")
+            rows = await self._conn.fetch("SELECT id, currency_name, rate, version FROM currencies ORDER BY currency_name")
+        self.snapshot = RateSnapshot(version, rows)
+        self.reloads += 1
+        logger.info(f"Rate snapshot v{version} loaded: {len(rows)} currencies")
+        for callback in self._subscribers:
+            try:
+                callback(self.snapshot)
+            except Exception as e:
+                logger.error(f"❌ Rate snapshot subscriber failed: {e}")
+
+    async def _reloader(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            if self._conn is None or self._conn.is_closed():
+                # Соединение переоткроет _watch и снова поднимет флаг
+                continue
+            try:
+                await self.reload()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.error(f"❌ Rate snapshot reload failed: {e}")
+
+    async def _watch(self):
+        while True:
+            # Пока снимка нет, база проверяется чаще
+            await asyncio.sleep(self._check_interval if self.snapshot is not None else self._retry_delay)
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    raise ConnectionError("LISTEN connection is closed")
+                async with self._lock:
+                    version = await self._conn.fetchval("SELECT version FROM currency_version")
+                if self.snapshot is None or version != self.snapshot.version:
+                    self._changed.set()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning(f"Rate snapshot version check failed, reconnecting: {e}")
+                if self._conn is not None:
+                    self._conn.terminate()
+                while True:
+                    try:
+                        await self._connect()
+                        break
+                    except (OSError, asyncpg.PostgresError) as e:
+                        logger.error(f"❌ Reconnect failed: {e}")
+                        await asyncio.sleep(self._retry_delay)
+                self.reconnects += 1
+                # Уведомления, пришедшие без соединения, потеряны
+                self._changed.set()
+
+    def stats(self) -> dict:
+        return {
+            "version": self.snapshot.version if self.snapshot is not None else None,
+            "currencies": len(self.snapshot.rows) if self.snapshot is not None else 0,
+            "reloads": self.reloads,
+            "reconnects": self.reconnects,
+        }
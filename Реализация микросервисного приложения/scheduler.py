@@ -0,0 +1,130 @@
+# Общий модуль двух приложений: одинаковые копии лежат в «Работа с базой данных
+# Postgres в Python-приложении» и «Реализация микросервисного приложения».
+# Каталоги приложений запускаются и разворачиваются отдельно, без общего пакета,
+# поэтому каждое держит свою копию. Менять обе вместе: расхождение ловит
+# test_shared_modules.py микросервисного приложения.
+
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Optional
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+
+class ChatQueue:
+    __slots__ = ("lock", "depth", "max_depth", "waits", "wait_total", "wait_max")
+
+    def __init__(self):
+        # asyncio.Lock будит ожидающих в порядке прихода — это и есть очередь чата
+        self.lock = asyncio.Lock()
+        self.depth = 0
+        self.max_depth = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "waits": self.waits,
+            "wait_avg_ms": round(self.wait_total / self.waits * 1000, 2) if self.waits else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+        }
+
+
+class ChatScheduler(BaseEventIsolation):
+    """
+    Изоляция событий FSM: строгий порядок внутри чата и общий лимит
+    параллельности.
+
+    Передаётся в Dispatcher(events_isolation=...), и FSMContextMiddleware
+    берёт блокировку до того, как прочитать состояние чата из хранилища,
+    поэтому следующее сообщение видит переход FSM предыдущего, даже если
+    чтение состояния идёт в базу. Обновления одного чата выполняются по
+    одному в порядке поступления, а разные чаты обрабатываются параллельно,
+    но не больше concurrency одновременно. Место в общем лимите занимается
+    только после своей очереди в чате, так что длинная очередь одного чата
+    не держит слоты других. Очереди чатов хранятся в LRU-словаре, пустые
+    вытесняются сверх max_chats. Обновления без чата и пользователя
+    (у них нет контекста FSM) проходят без очереди.
+    """
+
+    def __init__(self, concurrency: int = 50, max_chats: int = 100_000):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._concurrency = concurrency
+        self._max_chats = max_chats
+        self._chats: "OrderedDict[int, ChatQueue]" = OrderedDict()
+        self.running = 0
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _queue(self, chat_id: int) -> ChatQueue:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            self._evict()
+            queue = self._chats[chat_id] = ChatQueue()
+        else:
+            self._chats.move_to_end(chat_id)
+        return queue
+
+    def _evict(self):
+        excess = len(self._chats) + 1 - self._max_chats
+        if excess <= 0:
+            return
+        # Занятые очереди не трогаем: за ними стоят ожидающие обновления
+        idle = []
+        for chat_id, queue in self._chats.items():
+            if len(idle) == excess:
+                break
+            if queue.depth == 0:
+                idle.append(chat_id)
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        arrived = time.perf_counter()
+        queue = self._queue(key.chat_id)
+        queue.depth += 1
+        queue.max_depth = max(queue.max_depth, queue.depth)
+        try:
+            async with queue.lock, self._semaphore:
+                waited = time.perf_counter() - arrived
+                queue.waits += 1
+                queue.wait_total += waited
+                queue.wait_max = max(queue.wait_max, waited)
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            queue.depth -= 1
+
+    async def close(self):
+        pass
+
+    def chat_stats(self, chat_id: int) -> Optional[dict]:
+        queue = self._chats.get(chat_id)
+        return queue.stats() if queue is not None else None
+
+    def stats(self, top: int = 5) -> dict:
+        """Общие счётчики и top чатов с самой длинной очередью сейчас."""
+        busiest = sorted(((q.depth, c) for c, q in self._chats.items() if q.depth), reverse=True)[:top]
+        return {
+            "running": self.running,
+            "limit": self._concurrency,
+            "processed": self.processed,
+            "queued": sum(q.depth for q in self._chats.values()) - self.running,
+            "wait_avg_ms": round(self.wait_total / self.processed * 1000, 2) if self.processed else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "chats": len(self._chats),
+            "busiest": {c: self._chats[c].stats() for _, c in busiest},
+        }
@@ -3,16 +3,19 @@ import asyncio
 import logging
 from dotenv import load_dotenv
 from decimal import Decimal, InvalidOperation
+from typing import Optional
 
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, BotCommand
 
 import httpx
 
+from scheduler import ChatScheduler
+from memory_storage import BoundedMemoryStorage
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -22,6 +25,11 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CURRENCY_MANAGER_URL = os.getenv("CURRENCY_MANAGER_URL", "http://localhost:5001")
 DATA_MANAGER_URL = os.getenv("DATA_MANAGER_URL", "http://localhost:5002")
+# Сколько обновлений обрабатывается одновременно (обновления одного чата — строго по очереди)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "50"))
+# Брошенные разговоры в памяти: сколько секунд простоя хранить и сколько всего записей
+FSM_TTL = float(os.getenv("FSM_TTL", "900"))
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", "100000"))
 
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в переменных окружения")
@@ -41,8 +49,10 @@ class ConversionStates(StatesGroup):
 
 # Инициализация бота
 bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+storage = BoundedMemoryStorage(ttl=FSM_TTL, max_entries=FSM_MAX_ENTRIES)
+# Очередь чата берётся до чтения состояния FSM из хранилища
+scheduler = ChatScheduler(concurrency=UPDATE_CONCURRENCY)
+dp = Dispatcher(storage=storage, events_isolation=scheduler)
 
 # Клавиатуры
 main_menu_keyboard = ReplyKeyboardMarkup(
@@ -224,16 +234,42 @@ async def attempt_delete_currency(message: types.Message, state: FSMContext, cur
         await state.clear()
 
 
+class CurrencyListCache:
+    """
+    Последний полученный список валют и его ETag. Запрос уходит с
+    If-None-Match, и пока данные не менялись, data_manager отвечает 304
+    без тела, а список берётся отсюда.
+    """
+
+    def __init__(self):
+        self.etag = None
+        self.data = None
+
+    async def fetch(self, client: httpx.AsyncClient) -> Optional[list]:
+        """Список валют или None, если сервис ответил ошибкой"""
+        headers = {"If-None-Match": self.etag} if self.data is not None and self.etag else {}
+        response = await client.get(f"{DATA_MANAGER_URL}/currencies", headers=headers)
+        if response.status_code == 304:
+            return self.data
+        if response.status_code != 200:
+            return None
+        self.etag = response.headers.get("ETag")
+        self.data = response.json()
+        return self.data
+
+
+currency_list = CurrencyListCache()
+
+
 # Команда /get_currencies
 @dp.message(F.text.in_(["📋 Список валют", "/get_currencies"]))
 async def get_all_currencies(message: types.Message, state: FSMContext):
     await state.clear()
     try:
         async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{DATA_MANAGER_URL}/currencies")
+            currencies_data = await currency_list.fetch(client)
 
-            if response.status_code == 200:
-                currencies_data = response.json()
+            if currencies_data is not None:
                 if not currencies_data:
                     await message.answer("ℹ️ Список валют пуст")
                     return
@@ -327,6 +363,8 @@ async def main():
     except Exception as e:
         logger.critical(f"Ошибка при запуске: {e}")
     finally:
+        logger.info(f"Очереди обновлений: {scheduler.stats()}")
+        logger.info(f"Хранилище FSM: {storage.stats()}")
         await bot.session.close()
 
 
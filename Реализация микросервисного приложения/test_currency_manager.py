@@ -0,0 +1,194 @@
+"""
+Тесты для эндпоинтов currency_manager с использованием pytest
+
+Вместо сессии базы подставляется FakeSession, которая запоминает команды и
+возвращает заранее заданные строки, поэтому база не нужна.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from currency_manager import app, expected_version
+from database import get_async_db
+
+
+class FakeSession:
+    """Сессия, которая вставляет каждую переданную валюту как новую"""
+
+    def __init__(self):
+        self.executed = []
+
+    async def execute(self, statement, params=None):
+        self.executed.append(params)
+        return [SimpleNamespace(id=i, currency_name=name, inserted=True)
+                for i, name in enumerate(params["names"], start=1)]
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakeRowSession(FakeSession):
+    """Сессия, которая на любую команду возвращает одну заданную строку"""
+
+    def __init__(self, row):
+        super().__init__()
+        self.row = row
+
+    async def execute(self, statement, params=None):
+        self.executed.append(params)
+        return SimpleNamespace(first=lambda: self.row)
+
+
+def override_db(session):
+    async def get_fake_db():
+        yield session
+
+    app.dependency_overrides[get_async_db] = get_fake_db
+
+
+@pytest.fixture
+def session():
+    session = FakeSession()
+    override_db(session)
+    yield session
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(session):
+    return TestClient(app)
+
+
+class TestLoadBulk:
+    """Тесты POST /load/bulk"""
+
+    def test_invalid_items_reported(self, client, session):
+        """Тест: ошибочные позиции получают invalid, остальные загружаются"""
+        response = client.post("/load/bulk", json={"items": [
+            {"currency_name": "usd", "rate": 90},
+            {"currency_name": "X" * 51, "rate": 1},
+            {"currency_name": "EUR", "rate": 0},
+            {"currency_name": "JPY", "rate": -1},
+            {"currency_name": "CNY"},
+            {"currency_name": "GBP", "rate": "abc"},
+            {"currency_name": "BIG", "rate": 1e20},
+            {"currency_name": "CHF", "rate": 80.5},
+        ]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["inserted"] == 2
+        assert body["invalid"] == 6
+        assert [item["outcome"] for item in body["items"]] == [
+            "inserted", "invalid", "invalid", "invalid", "invalid", "invalid", "invalid", "inserted",
+        ]
+        assert body["items"][1]["currency_name"] == "X" * 51
+        assert body["items"][2]["error"].startswith("rate:")
+        assert body["items"][0]["error"] is None
+        assert session.executed == [{"names": ["USD", "CHF"], "rates": [90, 80.5]}]
+
+    def test_all_invalid(self, client, session):
+        """Тест пакета без корректных позиций: команда не выполняется"""
+        response = client.post("/load/bulk", json={"items": [{"currency_name": None, "rate": 1}]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["invalid"] == 1
+        assert body["items"][0]["currency_name"] is None
+        assert session.executed == []
+
+    def test_duplicate_of_invalid_item(self, client, session):
+        """Тест: ошибочный повтор не отменяет корректную позицию той же валюты"""
+        response = client.post("/load/bulk", json={"items": [
+            {"currency_name": "USD", "rate": 90},
+            {"currency_name": "USD", "rate": 0},
+        ]})
+        body = response.json()
+        assert [item["outcome"] for item in body["items"]] == ["inserted", "invalid"]
+        assert session.executed[0]["names"] == ["USD"]
+
+
+class TestLoad:
+    """Тесты проверки POST /load"""
+
+    def test_invalid_rejected(self, client, session):
+        """Тест: длинное имя и неположительный курс отклоняются до базы"""
+        for item in ({"currency_name": "X" * 51, "rate": 1}, {"currency_name": "USD", "rate": 0}):
+            assert client.post("/load", json=item).status_code == 422
+        assert session.executed == []
+
+
+class TestExpectedVersion:
+    """Тесты разбора заголовка If-Match"""
+
+    def test_forms(self):
+        """Тест строгого, слабого и голого тега"""
+        assert expected_version('"3"') == 3
+        assert expected_version('W/"3"') == 3
+        assert expected_version(" 3 ") == 3
+
+    def test_no_check(self):
+        """Тест: без заголовка и для * версия не проверяется"""
+        assert expected_version(None) is None
+        assert expected_version("*") is None
+        assert expected_version(" * ") is None
+
+    def test_invalid(self):
+        """Тест некорректного заголовка: 400"""
+        for value in ("", '"abc"', 'W/"', '"1", "2"'):
+            with pytest.raises(HTTPException) as exc:
+                expected_version(value)
+            assert exc.value.status_code == 400
+
+
+class TestUpdateIfMatch:
+    """Тесты POST /update_currency с If-Match"""
+
+    def request(self, row, if_match=None):
+        session = FakeRowSession(row)
+        override_db(session)
+        headers = {"If-Match": if_match} if if_match is not None else {}
+        try:
+            response = TestClient(app).post(
+                "/update_currency", json={"currency_name": "usd", "rate": 91}, headers=headers)
+        finally:
+            app.dependency_overrides.clear()
+        return response, session
+
+    def test_updated(self):
+        """Тест совпавшей версии: 200 и ETag новой версии"""
+        row = SimpleNamespace(id=1, old_rate=90, current_version=3, new_version=4)
+        response, session = self.request(row, 'W/"3"')
+        assert response.status_code == 200
+        assert response.headers["ETag"] == '"4"'
+        assert response.json()["version"] == 4
+        assert session.executed[0]["expected"] == 3
+
+    def test_without_if_match(self):
+        """Тест без заголовка: версия в команду не передаётся"""
+        row = SimpleNamespace(id=1, old_rate=90, current_version=3, new_version=4)
+        response, session = self.request(row)
+        assert response.status_code == 200
+        assert session.executed[0]["expected"] is None
+
+    def test_conflict(self):
+        """Тест несовпавшей версии: 409 и ETag текущей версии"""
+        row = SimpleNamespace(id=1, old_rate=90, current_version=5, new_version=None)
+        response, _ = self.request(row, '"3"')
+        assert response.status_code == 409
+        assert response.headers["ETag"] == '"5"'
+
+    def test_not_found(self):
+        """Тест отсутствующей валюты: 404"""
+        response, _ = self.request(None, '"3"')
+        assert response.status_code == 404
+
+    def test_invalid_header(self):
+        """Тест некорректного If-Match: 400 без обращения к базе"""
+        response, session = self.request(None, "abc")
+        assert response.status_code == 400
+        assert session.executed == []
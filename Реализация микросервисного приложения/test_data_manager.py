@@ -0,0 +1,199 @@
+"""
+Тесты для эндпоинтов data_manager с использованием pytest
+
+Курсы берутся из снимка, который тесты подставляют сами, поэтому ни база,
+ни события запуска приложения не нужны. Журнал изменений для /currencies/changes
+подставляет FakeSession.
+"""
+
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import data_manager
+from data_manager import MAX_AMOUNT, app, convert_amount, etag_matches
+from database import get_async_db
+from rate_snapshot import RateSnapshot
+
+
+def install_snapshot(version=1, **rates):
+    rows = [{"id": i, "currency_name": name, "rate": Decimal(rate), "version": 1}
+            for i, (name, rate) in enumerate(sorted(rates.items()), start=1)]
+    snapshot = RateSnapshot(version, rows)
+    data_manager.snapshots.snapshot = snapshot
+    data_manager.matrix.update(snapshot)
+    return snapshot
+
+
+class FakeSession:
+    """Сессия, которая на запрос журнала возвращает заданную границу и валюты"""
+
+    def __init__(self, pruned_version, names):
+        self.row = SimpleNamespace(pruned_version=pruned_version, names=names)
+        self.executed = []
+
+    async def execute(self, statement, params=None):
+        self.executed.append(params)
+        return SimpleNamespace(one=lambda: self.row)
+
+
+@pytest.fixture
+def client():
+    install_snapshot(USD="90", EUR="100", BIG="999999999999.999999")
+    yield TestClient(app)
+    data_manager.snapshots.snapshot = None
+
+
+@pytest.fixture
+def change_log():
+    """Журнал изменений версий 3-5: в версии 4 изменён USD, в версии 5 удалён JPY"""
+    session = FakeSession(pruned_version=3, names=["USD", "JPY"])
+
+    async def get_fake_db():
+        yield session
+
+    install_snapshot(version=5, USD="91", EUR="100")
+    app.dependency_overrides[get_async_db] = get_fake_db
+    yield session
+    app.dependency_overrides.clear()
+    data_manager.snapshots.snapshot = None
+
+
+class TestConvertAmount:
+    """Тесты пересчёта суммы по курсу"""
+
+    def test_rounding(self):
+        """Тест округления до копеек"""
+        assert convert_amount(Decimal("90.123"), 1.5) == Decimal("135.18")
+
+    def test_overflow(self):
+        """Тест результата, который не округлить до копеек"""
+        with pytest.raises(ArithmeticError):
+            convert_amount(Decimal("999999999999.999999"), 1e30)
+
+
+class TestConvert:
+    """Тесты GET /convert"""
+
+    def test_to_rub(self, client):
+        """Тест конвертации в рубли"""
+        response = client.get("/convert", params={"currency_name": "usd", "amount": 2})
+        assert response.status_code == 200
+        assert Decimal(response.json()["result"]) == Decimal("180.00")
+
+    def test_amount_bound(self, client):
+        """Тест суммы больше MAX_AMOUNT"""
+        response = client.get("/convert", params={"currency_name": "USD", "amount": MAX_AMOUNT * 10})
+        assert response.status_code == 422
+
+    def test_result_out_of_range(self, client):
+        """Тест результата вне точности Decimal: 422, а не 500"""
+        response = client.get("/convert", params={"currency_name": "BIG", "amount": MAX_AMOUNT})
+        assert response.status_code == 422
+
+
+class TestConvertBatch:
+    """Тесты POST /convert/batch"""
+
+    def test_mixed_batch(self, client):
+        """Тест пакета с корректными и ошибочными позициями"""
+        response = client.post("/convert/batch", json={"items": [
+            {"currency_name": "usd", "amount": 2},
+            {"currency_name": "XXX", "amount": 1},
+            {"currency_name": "USD", "amount": 0},
+            {"currency_name": "USD", "amount": 1e30},
+            {"currency_name": "BIG", "amount": MAX_AMOUNT},
+            {"currency_name": "EUR", "amount": 1.5},
+        ]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["converted"] == 2
+        assert body["failed"] == 4
+        results = [item["result"] and Decimal(item["result"]) for item in body["items"]]
+        assert results == [Decimal("180.00"), None, None, None, None, Decimal("150.00")]
+        errors = [item["error"] for item in body["items"]]
+        assert errors[0] is None and errors[5] is None
+        assert errors[1] == "Currency XXX not found"
+        assert errors[2] == "Amount must be greater than 0"
+        assert errors[3].startswith("Amount must not exceed")
+        assert errors[4] == "Conversion result is out of range"
+
+    def test_empty_batch(self, client):
+        """Тест пустого пакета"""
+        response = client.post("/convert/batch", json={"items": []})
+        assert response.json() == {"converted": 0, "failed": 0, "items": []}
+
+    def test_no_snapshot(self, client):
+        """Тест запроса до загрузки снимка курсов"""
+        data_manager.snapshots.snapshot = None
+        response = client.post("/convert/batch", json={"items": [{"currency_name": "USD", "amount": 1}]})
+        assert response.status_code == 503
+
+
+class TestEtagMatches:
+    """Тесты сравнения If-None-Match с ETag"""
+
+    def test_matches(self):
+        """Тест строгого, слабого тега, списка тегов и *"""
+        assert etag_matches('"5"', '"5"')
+        assert etag_matches('W/"5"', '"5"')
+        assert etag_matches('"4", "5"', '"5"')
+        assert etag_matches("*", '"5"')
+
+    def test_not_matches(self):
+        """Тест отсутствующего заголовка и другой версии"""
+        assert not etag_matches(None, '"5"')
+        assert not etag_matches('"4"', '"5"')
+        assert not etag_matches("5", '"5"')
+
+
+class TestCurrencies:
+    """Тесты GET /currencies с If-None-Match"""
+
+    def test_not_modified(self, client):
+        """Тест совпавшей версии: 304 без тела"""
+        response = client.get("/currencies", headers={"If-None-Match": '"1"'})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == '"1"'
+        assert response.content == b""
+
+    def test_modified(self, client):
+        """Тест другой версии: полный список"""
+        response = client.get("/currencies", headers={"If-None-Match": '"0"'})
+        assert response.status_code == 200
+        assert sorted(row["currency_name"] for row in response.json()) == ["BIG", "EUR", "USD"]
+
+
+class TestCurrencyChanges:
+    """Тесты GET /currencies/changes"""
+
+    def test_changes(self, change_log):
+        """Тест изменённой и удалённой валюты после since"""
+        response = TestClient(app).get("/currencies/changes", params={"since": 3})
+        assert response.status_code == 200
+        assert response.headers["ETag"] == '"5"'
+        body = response.json()
+        assert body["version"] == 5
+        assert [row["currency_name"] for row in body["upserted"]] == ["USD"]
+        assert body["deleted"] == ["JPY"]
+        assert change_log.executed == [{"since": 3, "upto": 5}]
+
+    def test_pruned(self, change_log):
+        """Тест since раньше границы журнала: 410"""
+        response = TestClient(app).get("/currencies/changes", params={"since": 2})
+        assert response.status_code == 410
+
+    def test_up_to_date(self, change_log):
+        """Тест since не меньше версии снимка: пустой ответ без запроса к базе"""
+        for since in (5, 6):
+            response = TestClient(app).get("/currencies/changes", params={"since": since})
+            assert response.status_code == 200
+            assert response.json() == {"version": 5, "upserted": [], "deleted": []}
+        assert change_log.executed == []
+
+    def test_negative_since(self, change_log):
+        """Тест отрицательной версии: 422"""
+        response = TestClient(app).get("/currencies/changes", params={"since": -1})
+        assert response.status_code == 422
@@ -0,0 +1,103 @@
+"""
+Тесты для миграций схемы migrate с использованием pytest
+
+Вместо движка SQLAlchemy подставляется FakeEngine, который хранит номер
+версии схемы и запоминает выполненные команды, поэтому база не нужна.
+"""
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from database import MIGRATIONS, migrate
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.engine.executed.append(sql)
+        if "max(version)" in sql:
+            return SimpleNamespace(scalar=lambda: self.engine.version)
+        if sql.startswith("INSERT INTO schema_version"):
+            self.engine.version = params["version"]
+        return None
+
+    def exec_driver_sql(self, sql):
+        self.engine.executed.append(sql)
+
+    def rollback(self):
+        pass
+
+
+class FakeEngine:
+    """Движок, у которого схема уже на версии version"""
+
+    def __init__(self, version):
+        self.version = version
+        self.executed = []
+        self.transactions = 0
+
+    @contextmanager
+    def connect(self):
+        yield FakeConnection(self)
+
+    @contextmanager
+    def begin(self):
+        self.transactions += 1
+        yield FakeConnection(self)
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    def install(version, migrations=MIGRATIONS):
+        engine = FakeEngine(version)
+        monkeypatch.setattr(database, "engine", engine)
+        monkeypatch.setattr(database, "MIGRATIONS", migrations)
+        return engine
+
+    return install
+
+
+class TestMigrate:
+    """Тесты применения миграций"""
+
+    def test_up_to_date(self, fake_engine):
+        """Тест актуальной схемы: один запрос версии, без транзакции и DDL"""
+        engine = fake_engine(MIGRATIONS[-1][0])
+        assert migrate() == MIGRATIONS[-1][0]
+        assert engine.transactions == 0
+        assert len(engine.executed) == 1
+
+    def test_only_new_steps_applied(self, fake_engine):
+        """Тест: применяются только миграции новее текущей версии, по порядку"""
+        calls = []
+        migrations = [
+            (1, "first", "CREATE TABLE first ()"),
+            (2, "second", lambda conn: calls.append(2)),
+            (3, "third", "CREATE TABLE third ()"),
+        ]
+        engine = fake_engine(1, migrations)
+        assert migrate() == 3
+        assert engine.transactions == 1
+        assert calls == [2]
+        assert "CREATE TABLE first ()" not in engine.executed
+        assert "CREATE TABLE third ()" in engine.executed
+        assert any("pg_advisory_xact_lock" in sql for sql in engine.executed)
+
+    def test_second_run_applies_nothing(self, fake_engine):
+        """Тест повторного запуска на той же базе"""
+        engine = fake_engine(0)
+        assert migrate() == MIGRATIONS[-1][0]
+        executed = len(engine.executed)
+        assert migrate() == MIGRATIONS[-1][0]
+        assert engine.transactions == 1
+        assert len(engine.executed) == executed + 1
+
+    def test_versions_increasing(self):
+        """Тест: номера миграций идут подряд с 1"""
+        assert [number for number, _, _ in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
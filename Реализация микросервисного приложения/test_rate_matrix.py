@@ -0,0 +1,125 @@
+"""
+Тесты для матрицы кросс-курсов RateMatrix с использованием pytest
+"""
+
+import random
+from decimal import Decimal
+
+import numpy as np
+
+from rate_matrix import BASE_CURRENCY, RateMatrix
+from rate_snapshot import RateSnapshot
+
+
+def snapshot(version, **rates):
+    rows = [{"id": i, "currency_name": name, "rate": Decimal(rate), "version": 1}
+            for i, (name, rate) in enumerate(sorted(rates.items()), start=1)]
+    return RateSnapshot(version, rows)
+
+
+def rebuilt(snap):
+    """Матрица, построенная по снимку с нуля"""
+    matrix = RateMatrix()
+    matrix.update(snap)
+    return matrix
+
+
+def assert_same(matrix, expected):
+    assert matrix.currencies == expected.currencies
+    assert matrix.index == expected.index
+    assert list(matrix.rates) == list(expected.rates)
+    assert np.array_equal(matrix.cross, expected.cross)
+
+
+class TestRateMatrixBuild:
+    """Тесты построения матрицы"""
+
+    def test_cross_rates(self):
+        """Тест кросс-курсов и строк рубля"""
+        matrix = rebuilt(snapshot(1, USD="90", EUR="100"))
+        assert matrix.currencies == ["EUR", BASE_CURRENCY, "USD"]
+        assert matrix.rate("USD", "EUR") == Decimal("0.9")
+        assert matrix.rate("EUR", "USD") == Decimal("100") / Decimal("90")
+        assert matrix.rate("USD", BASE_CURRENCY) == Decimal("90")
+        assert matrix.rate(BASE_CURRENCY, BASE_CURRENCY) == Decimal("1")
+        assert matrix.rate("USD", "XXX") is None
+
+    def test_zero_rate_skipped(self):
+        """Тест: валюта с нулевым курсом в матрицу не попадает"""
+        matrix = rebuilt(snapshot(1, USD="90", BAD="0"))
+        assert "BAD" not in matrix.index
+        assert matrix.rate("BAD", "USD") is None
+
+
+class TestRateMatrixIncremental:
+    """Тесты пересчёта изменившихся строк против полной перестройки"""
+
+    def test_one_rate_changed(self):
+        """Тест изменения одного курса: пересчитывается одна строка"""
+        matrix = rebuilt(snapshot(1, USD="90", EUR="100", JPY="0.6"))
+        new = snapshot(2, USD="91", EUR="100", JPY="0.6")
+        matrix.update(new)
+        assert matrix.rebuilds == 1
+        assert matrix.updated_rows == 1
+        assert_same(matrix, rebuilt(new))
+
+    def test_several_rates_changed(self):
+        """Тест изменения нескольких курсов: их пересечения считаются по новым курсам"""
+        matrix = rebuilt(snapshot(1, USD="90", EUR="100", JPY="0.6"))
+        new = snapshot(2, USD="91", EUR="101", JPY="0.6")
+        matrix.update(new)
+        assert matrix.rebuilds == 1
+        assert matrix.updated_rows == 2
+        assert matrix.rate("USD", "EUR") == Decimal("91") / Decimal("101")
+        assert_same(matrix, rebuilt(new))
+
+    def test_currency_added_rebuilds(self):
+        """Тест добавления валюты: матрица перестраивается целиком"""
+        matrix = rebuilt(snapshot(1, USD="90"))
+        new = snapshot(2, USD="90", EUR="100")
+        matrix.update(new)
+        assert matrix.rebuilds == 2
+        assert_same(matrix, rebuilt(new))
+
+    def test_currency_removed_rebuilds(self):
+        """Тест удаления валюты: матрица перестраивается целиком"""
+        matrix = rebuilt(snapshot(1, USD="90", EUR="100"))
+        new = snapshot(2, USD="90")
+        matrix.update(new)
+        assert matrix.rebuilds == 2
+        assert "EUR" not in matrix.index
+        assert_same(matrix, rebuilt(new))
+
+    def test_random_updates_match_rebuild(self):
+        """Тест серии случайных изменений: результат совпадает с перестройкой с нуля"""
+        rng = random.Random(21)
+        rates = {f"C{i:02d}": f"{rng.uniform(0.01, 200):.6f}" for i in range(20)}
+        matrix = rebuilt(snapshot(1, **rates))
+        for version in range(2, 30):
+            for name in rng.sample(sorted(rates), rng.randint(0, 5)):
+                rates[name] = f"{rng.uniform(0.01, 200):.6f}"
+            new = snapshot(version, **rates)
+            matrix.update(new)
+            assert_same(matrix, rebuilt(new))
+        assert matrix.rebuilds == 1
+
+
+class TestRateMatrixRender:
+    """Тесты отрисовки /matrix"""
+
+    def test_rendered_cached_per_version(self):
+        """Тест: полная матрица отрисовывается один раз на версию"""
+        matrix = rebuilt(snapshot(1, USD="90"))
+        first = matrix.render()
+        assert matrix.render() is first
+        matrix.update(snapshot(2, USD="91"))
+        second = matrix.render()
+        assert second is not first
+        assert second["version"] == 2
+
+    def test_submatrix(self):
+        """Тест подматрицы выбранных валют в заданном порядке"""
+        matrix = rebuilt(snapshot(1, USD="90", EUR="100"))
+        rendered = matrix.render(["USD", BASE_CURRENCY])
+        assert rendered["currencies"] == ["USD", BASE_CURRENCY]
+        assert rendered["rates"] == [["1", "90"], [str(Decimal(1) / Decimal(90)), "1"]]
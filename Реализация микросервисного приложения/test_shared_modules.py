@@ -0,0 +1,22 @@
+"""
+Тесты совпадения общих модулей с копиями в соседнем приложении с использованием pytest
+"""
+
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+SIBLING = HERE.parent / "Работа с базой данных Postgres в Python-приложении"
+SHARED = ["scheduler.py", "memory_storage.py"]
+
+
+@pytest.mark.skipif(not SIBLING.is_dir(), reason="соседнее приложение не развёрнуто рядом")
+class TestSharedModules:
+    """Тесты одинаковых копий общих модулей"""
+
+    @pytest.mark.parametrize("name", SHARED)
+    def test_copies_identical(self, name):
+        """Тест: копии модуля в обоих приложениях совпадают побайтно"""
+        assert (HERE / name).read_bytes() == (SIBLING / name).read_bytes(), \
+            f"{name} расходится с копией в {SIBLING.name}: изменения вносятся в обе"